@@ -0,0 +1,160 @@
+from django.conf import settings
+from django.db import connection, transaction
+
+from activities.models import PostStats
+from custom_lib.redis_client import get_redis_connection
+
+
+class WriteBehindCounters:
+    """
+    counter columns of `model`, a table with one row per owner (a post...) keyed by a one-to-one primary key.
+
+    increments are buffered in one redis hash per owner and a set of dirty owners, so hot rows are never
+    locked by the requests. `flush` moves the buffered deltas to the table in batched upserts, readers
+    add the deltas not flushed yet to the stored values.
+    """
+
+    def __init__(self, name, model, fields):
+        self.name = name
+        self.model = model
+        self.fields = tuple(fields)
+
+    @property
+    def connection(self):
+        return get_redis_connection()
+
+    def key(self, owner_id):
+        return f'counters:{self.name}:{owner_id}'
+
+    @property
+    def dirty_key(self):
+        return f'counters:{self.name}:dirty'
+
+    @property
+    def lock_key(self):
+        return f'counters:{self.name}:lock'
+
+    def lock(self):
+        """the lock held while deltas are moved to the table, flushes and recounts never interleave"""
+        return self.connection.lock(self.lock_key, timeout=settings.COUNTERS_LOCK_TIMEOUT.total_seconds())
+
+    def incr(self, owner_id, field, amount=1):
+        pipe = self.connection.pipeline()
+        pipe.hincrby(self.key(owner_id), field, amount)
+        pipe.sadd(self.dirty_key, owner_id)
+        pipe.execute()
+
+    def get_many(self, owner_ids):
+        """{owner_id: {field: value}} for `owner_ids`, one query and one redis round trip"""
+        owner_ids = list(owner_ids)
+        stored = {
+            row[0]: dict(zip(self.fields, row[1:]))
+            for row in self.model.objects.filter(pk__in=owner_ids).values_list('pk', *self.fields)
+        }
+
+        pipe = self.connection.pipeline(transaction=False)
+        for owner_id in owner_ids:
+            pipe.hgetall(self.key(owner_id))
+
+        counters = {}
+        for owner_id, pending in zip(owner_ids, pipe.execute()):
+            values = stored.get(owner_id) or dict.fromkeys(self.fields, 0)
+            for field, delta in pending.items():
+                values[field.decode()] += int(delta)
+            counters[owner_id] = values
+        return counters
+
+    def get(self, owner_id):
+        return self.get_many((owner_id,))[owner_id]
+
+    def flush(self):
+        """write the buffered deltas to the table, FLUSH_BATCH_SIZE owners per statement, return how many"""
+        flushed = 0
+        while True:
+            with self.lock():
+                owner_ids = self.connection.spop(self.dirty_key, settings.COUNTERS_FLUSH_BATCH_SIZE)
+                if not owner_ids:
+                    return flushed
+                flushed += self._flush_batch([int(owner_id) for owner_id in owner_ids])
+
+    def _flush_batch(self, owner_ids):
+        # take the deltas and reset them in one transaction, new increments start from zero
+        pipe = self.connection.pipeline()
+        for owner_id in owner_ids:
+            pipe.hgetall(self.key(owner_id))
+            pipe.delete(self.key(owner_id))
+        results = pipe.execute()[::2]
+
+        rows = []
+        for owner_id, pending in zip(owner_ids, results):
+            deltas = {field.decode(): int(delta) for field, delta in pending.items()}
+            if any(deltas.values()):
+                rows.append((owner_id, *(deltas.get(field, 0) for field in self.fields)))
+
+        try:
+            if rows:
+                self._upsert(rows)
+        except Exception:
+            # put the deltas back, they are flushed again next time
+            pipe = self.connection.pipeline()
+            for owner_id, *deltas in rows:
+                for field, delta in zip(self.fields, deltas):
+                    pipe.hincrby(self.key(owner_id), field, delta)
+                pipe.sadd(self.dirty_key, owner_id)
+            pipe.execute()
+            raise
+        return len(rows)
+
+    def add_stored(self, field, deltas):
+        """add {owner_id: delta} `deltas` to the stored `field` at once, in the caller's transaction"""
+        rows = [
+            (owner_id, *(delta if name == field else 0 for name in self.fields))
+            for owner_id, delta in deltas.items() if delta
+        ]
+        if rows:
+            self._upsert(rows)
+
+    def _upsert(self, rows):
+        """add (owner_id, *deltas) rows to the counters, skipping owners that have been deleted"""
+        quote = connection.ops.quote_name
+        owner_meta = self.model._meta.pk.related_model._meta
+        columns = [quote(self.model._meta.get_field(field).column) for field in self.fields]
+        deltas = [f'd{i}' for i in range(len(self.fields))]
+
+        table = quote(self.model._meta.db_table)
+        values = ', '.join(['(%s)' % ', '.join(['%s'] * (len(self.fields) + 1))] * len(rows))
+        updates = ', '.join(f'{column} = {table}.{column} + EXCLUDED.{column}' for column in columns)
+        sql = (
+            f'WITH deltas (owner_id, {", ".join(deltas)}) AS (VALUES {values}) '
+            f'INSERT INTO {table} ({quote(self.model._meta.pk.column)}, {", ".join(columns)}) '
+            f'SELECT deltas.owner_id, {", ".join(f"deltas.{delta}" for delta in deltas)} FROM deltas '
+            f'JOIN {quote(owner_meta.db_table)} owner ON owner.{quote(owner_meta.pk.column)} = deltas.owner_id '
+            # the WHERE clause keeps sqlite from parsing ON CONFLICT as a join constraint
+            f'WHERE true '
+            f'ON CONFLICT ({quote(self.model._meta.pk.column)}) DO UPDATE SET {updates}'
+        )
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [value for row in rows for value in row])
+
+    def pending(self, owner_ids):
+        """{owner_id: {field: delta}}, the deltas of `owner_ids` not flushed yet"""
+        pipe = self.connection.pipeline(transaction=False)
+        for owner_id in owner_ids:
+            pipe.hgetall(self.key(owner_id))
+        return {
+            owner_id: {field.decode(): int(delta) for field, delta in pending.items()}
+            for owner_id, pending in zip(owner_ids, pipe.execute())
+        }
+
+    def subtract(self, pending):
+        """take `pending` deltas off the buffered ones, once the counters they were added to have been recomputed"""
+        pipe = self.connection.pipeline()
+        for owner_id, deltas in pending.items():
+            for field, delta in deltas.items():
+                pipe.hincrby(self.key(owner_id), field, -delta)
+        pipe.execute()
+
+
+# like and comment counts of each post
+post_counters = WriteBehindCounters('post', PostStats, ('like_count', 'comment_count'))
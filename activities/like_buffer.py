@@ -0,0 +1,179 @@
+"""
+buffered ingest of likes for bursts on viral posts, enabled with LIKE_BUFFER_ENABLED.
+
+likes and unlikes are appended to a redis stream and acknowledged at once, `flush` moves them to the
+database in batches: one bulk insert and one delete per batch, with the like counters and notifications
+of the whole batch. until an event is flushed the user's latest choice for the post is kept in a pending
+hash, read by `pending_likes` so the user sees their own likes right away. events the database keeps
+rejecting are moved to a dead letter stream so they can't hold up the others.
+"""
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from redis.exceptions import ResponseError
+
+from custom_lib import metrics
+from custom_lib.prefetch import forget_prefetched
+from custom_lib.redis_client import get_redis_connection
+
+STREAM_KEY = 'likes:stream'
+DEAD_STREAM_KEY = 'likes:dead'
+GROUP = 'flushers'
+CONSUMER = 'flusher'
+LOCK_KEY = 'likes:flush:lock'
+
+LIKE = b'like'
+UNLIKE = b'unlike'
+
+# forget a pending choice only if no newer event replaced it meanwhile
+FORGET_SCRIPT = """
+if redis.call('HGET', KEYS[1], ARGV[1]) == ARGV[2] then
+    return redis.call('HDEL', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+
+def pending_key(user_id):
+    return f'likes:pending:{user_id}'
+
+
+def buffer_like(user_id, post_id, liked=True):
+    """record that `user_id` liked (or unliked) `post_id`, to be written by the next flush"""
+    conn = get_redis_connection()
+    op = LIKE if liked else UNLIKE
+    entry_id = conn.xadd(STREAM_KEY, {'user': user_id, 'post': post_id, 'op': op})
+    conn.hset(pending_key(user_id), post_id, _pending_value(entry_id, op))
+    forget_prefetched((user_id,))
+
+
+def _pending_value(entry_id, op):
+    return entry_id + b' ' + op
+
+
+def pending_likes(user_id, post_ids):
+    """{post_id: liked} of the likes and unlikes of `user_id` among `post_ids` that are not flushed yet"""
+    post_ids = list(post_ids)
+    if not post_ids:
+        return {}
+
+    values = get_redis_connection().hmget(pending_key(user_id), post_ids)
+    return {
+        post_id: value.split(b' ')[1] == LIKE for post_id, value in zip(post_ids, values) if value is not None
+    }
+
+
+def _ensure_group(conn):
+    try:
+        conn.xgroup_create(STREAM_KEY, GROUP, id='0', mkstream=True)
+    except ResponseError:
+        # the group already exists
+        pass
+
+
+def flush():
+    """write the buffered likes to the database, LIKE_BUFFER_BATCH_SIZE events per batch, return how many"""
+    conn = get_redis_connection()
+    if not conn.set(LOCK_KEY, 1, nx=True, ex=settings.LIKE_BUFFER_LOCK_TIMEOUT):
+        return 0
+
+    try:
+        _ensure_group(conn)
+        flushed = 0
+        # entries read but not acknowledged by an interrupted flush come first
+        for stream_id in ('0', '>'):
+            while True:
+                result = conn.xreadgroup(
+                    GROUP, CONSUMER, {STREAM_KEY: stream_id}, count=settings.LIKE_BUFFER_BATCH_SIZE
+                )
+                entries = result[0][1] if result else []
+                if not entries:
+                    break
+                _flush_entries(conn, entries)
+                flushed += len(entries)
+        return flushed
+    finally:
+        conn.delete(LOCK_KEY)
+
+
+def _flush_entries(conn, entries):
+    try:
+        _flush_batch(conn, entries)
+    except DatabaseError:
+        if len(entries) == 1:
+            _bury(conn, entries[0])
+            return
+        # find the failing events one by one, the others are written
+        for entry in entries:
+            _flush_entries(conn, [entry])
+
+
+def _bury(conn, entry):
+    """move an event the database rejects to the dead letter stream"""
+    entry_id, fields = entry
+    pipe = conn.pipeline(transaction=False)
+    pipe.xadd(DEAD_STREAM_KEY, fields)
+    conn.register_script(FORGET_SCRIPT)(
+        keys=(pending_key(int(fields[b'user'])),), args=(fields[b'post'], _pending_value(entry_id, fields[b'op'])),
+        client=pipe
+    )
+    pipe.xack(STREAM_KEY, GROUP, entry_id)
+    pipe.xdel(STREAM_KEY, entry_id)
+    pipe.execute()
+    metrics.incr('like_buffer', 'dead')
+
+
+def _flush_batch(conn, entries):
+    from activities.counters import post_counters
+    from activities.models import Like
+    from activities.reactions import delete_reactions, insert_reactions
+    from contents.models import Post
+    from notifications.models import Notification
+    from users.models import User
+
+    # the latest event of each (user, post) pair wins
+    latest = {}
+    for entry_id, fields in entries:
+        latest[int(fields[b'user']), int(fields[b'post'])] = entry_id, fields[b'op']
+
+    pairs = list(latest)
+    condition = Q()
+    for user_id, post_id in pairs:
+        condition |= Q(user_id=user_id, post_id=post_id)
+    existing = set(Like.objects.filter(condition).values_list('user_id', 'post_id'))
+
+    likes = [pair for pair in pairs if latest[pair][1] == LIKE and pair not in existing]
+    unlikes = [pair for pair in pairs if latest[pair][1] == UNLIKE and pair in existing]
+    # posts and likers deleted since the event was buffered
+    owners = dict(Post.objects.filter(id__in={post_id for user_id, post_id in likes}).values_list('id', 'user_id'))
+    users = set(User.objects.filter(id__in={user_id for user_id, post_id in likes}).values_list('id', flat=True))
+    likes = [(user_id, post_id) for user_id, post_id in likes if post_id in owners and user_id in users]
+
+    # the counters are written with the rows in one transaction, from the rows actually inserted and deleted:
+    # a flush interrupted after the transaction is replayed harmlessly, its rows exist already and count nothing
+    with transaction.atomic():
+        inserted = insert_reactions(Like, likes) if likes else set()
+        deleted = delete_reactions(Like, unlikes) if unlikes else set()
+
+        deltas = {}
+        for user_id, post_id in inserted:
+            deltas[post_id] = deltas.get(post_id, 0) + 1
+        for user_id, post_id in deleted:
+            deltas[post_id] = deltas.get(post_id, 0) - 1
+        post_counters.add_stored('like_count', deltas)
+
+        Notification.objects.bulk_create([
+            Notification(
+                sender_id=user_id, receiver_id=owners[post_id], notification_type=Notification.LIKE, post_id=post_id
+            )
+            for user_id, post_id in likes if (user_id, post_id) in inserted
+        ])
+
+    script = conn.register_script(FORGET_SCRIPT)
+    pipe = conn.pipeline(transaction=False)
+    for (user_id, post_id), (entry_id, op) in latest.items():
+        script(keys=(pending_key(user_id),), args=(post_id, _pending_value(entry_id, op)), client=pipe)
+    entry_ids = [entry_id for entry_id, fields in entries]
+    pipe.xack(STREAM_KEY, GROUP, *entry_ids)
+    pipe.xdel(STREAM_KEY, *entry_ids)
+    pipe.execute()
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from activities.counters import post_counters
+from activities.models import Like, Comment, PostStats
+from contents.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Recount the likes and comments of every post and overwrite the denormalized counters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='posts recounted per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        # write pending deltas first, what is recounted afterwards replaces them
+        post_counters.flush()
+
+        post_ids = Post.objects.order_by('id').values_list('id', flat=True)
+        total, last_id = 0, 0
+        while batch := list(post_ids.filter(id__gt=last_id)[:batch_size]):
+            self.reconcile(batch)
+            total, last_id = total + len(batch), batch[-1]
+
+        self.stdout.write(self.style.SUCCESS(f'Reconciled the counters of {total} posts.'))
+
+    @staticmethod
+    def reconcile(post_ids):
+        # no flush moves deltas meanwhile: those buffered before the counts are included in them and are taken
+        # off the buffer, those buffered since are kept
+        with post_counters.lock(), transaction.atomic():
+            # likes flushed by the like buffer are added to the stored counters in their own transaction, with
+            # the rows locked first it runs entirely before or after the counts
+            list(PostStats.objects.select_for_update().filter(post_id__in=post_ids).values_list('pk', flat=True))
+            counted = post_counters.pending(post_ids)
+
+            likes = dict(
+                Like.objects.filter(post_id__in=post_ids).values('post_id').annotate(n=Count('id'))
+                .values_list('post_id', 'n')
+            )
+            comments = dict(
+                Comment.objects.filter(post_id__in=post_ids).values('post_id').annotate(n=Count('id'))
+                .values_list('post_id', 'n')
+            )
+
+            PostStats.objects.bulk_create(
+                [
+                    PostStats(post_id=post_id, like_count=likes.get(post_id, 0), comment_count=comments.get(post_id, 0))
+                    for post_id in post_ids
+                ],
+                update_conflicts=True,
+                unique_fields=('post',),
+                update_fields=('like_count', 'comment_count'),
+            )
+            post_counters.subtract(counted)
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.15 on 2026-10-18 20:38
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def count_post_stats(apps, schema_editor):
+    # the counters of the existing posts, batch by batch
+    Post = apps.get_model('contents', 'Post')
+    Like = apps.get_model('activities', 'Like')
+    Comment = apps.get_model('activities', 'Comment')
+    PostStats = apps.get_model('activities', 'PostStats')
+
+    post_ids = Post.objects.order_by('id').values_list('id', flat=True)
+    last_id = 0
+    while batch := list(post_ids.filter(id__gt=last_id)[:5000]):
+        likes = dict(
+            Like.objects.filter(post_id__in=batch).order_by().values('post_id').annotate(n=Count('id'))
+            .values_list('post_id', 'n')
+        )
+        comments = dict(
+            Comment.objects.filter(post_id__in=batch).order_by().values('post_id').annotate(n=Count('id'))
+            .values_list('post_id', 'n')
+        )
+        PostStats.objects.bulk_create([
+            PostStats(post_id=post_id, like_count=likes.get(post_id, 0), comment_count=comments.get(post_id, 0))
+            for post_id in batch
+        ])
+        last_id = batch[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0005_post_post_user_recent_idx'),
+        ('activities', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostStats',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='contents.post', verbose_name='post')),
+                ('like_count', models.IntegerField(default=0, verbose_name='like count')),
+                ('comment_count', models.IntegerField(default=0, verbose_name='comment count')),
+            ],
+            options={
+                'verbose_name': 'post stats',
+                'verbose_name_plural': 'posts stats',
+            },
+        ),
+        migrations.RunPython(count_post_stats, migrations.RunPython.noop),
+    ]
@@ -77,3 +77,19 @@ class Save(models.Model):
         verbose_name = _("save")
         verbose_name_plural = _("saves")
         unique_together = ('user', 'post')
+
+
+class PostStats(models.Model):
+    """denormalized counters of a post, kept up to date by activities.counters"""
+    post = models.OneToOneField(
+        Post, related_name="stats", on_delete=models.CASCADE, primary_key=True, verbose_name=_("post")
+    )
+    like_count = models.IntegerField(_("like count"), default=0)
+    comment_count = models.IntegerField(_("comment count"), default=0)
+
+    def __str__(self):
+        return f"{self.post_id}: {self.like_count} likes, {self.comment_count} comments"
+
+    class Meta:
+        verbose_name = _("post stats")
+        verbose_name_plural = _("posts stats")
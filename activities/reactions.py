@@ -0,0 +1,88 @@
+from django.db import connection
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+
+
+def add_reaction(model, user, post):
+    """
+    insert the like or save of `post` by `user` unless it already exists, in one statement that is safe
+    against concurrent duplicates. the save signals are sent for a new row, return whether it was new.
+    """
+    quote = connection.ops.quote_name
+    meta = model._meta
+    created_at = timezone.now()
+    sql = (
+        f'INSERT INTO {quote(meta.db_table)} '
+        f'({quote(meta.get_field("user").column)}, {quote(meta.get_field("post").column)}, '
+        f'{quote(meta.get_field("created_at").column)}) '
+        f'VALUES (%s, %s, %s) '
+        f'ON CONFLICT ({quote(meta.get_field("user").column)}, {quote(meta.get_field("post").column)}) DO NOTHING '
+        f'RETURNING {quote(meta.pk.column)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user.id, post.id, created_at])
+        row = cursor.fetchone()
+    if row is None:
+        return False
+
+    instance = model(pk=row[0], user=user, post=post, created_at=created_at)
+    post_save.send(sender=model, instance=instance, created=True, update_fields=None, raw=False, using=connection.alias)
+    return True
+
+
+def remove_reaction(model, user_id, post_id):
+    """delete the like or save of `post_id` by `user_id` and send the delete signals, return whether it existed"""
+    quote = connection.ops.quote_name
+    meta = model._meta
+    sql = (
+        f'DELETE FROM {quote(meta.db_table)} '
+        f'WHERE {quote(meta.get_field("user").column)} = %s AND {quote(meta.get_field("post").column)} = %s '
+        f'RETURNING {quote(meta.pk.column)}, {quote(meta.get_field("created_at").column)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, post_id])
+        row = cursor.fetchone()
+    if row is None:
+        return False
+
+    instance = model(pk=row[0], user_id=user_id, post_id=post_id, created_at=row[1])
+    post_delete.send(sender=model, instance=instance, origin=instance, using=connection.alias)
+    return True
+
+
+def insert_reactions(model, pairs):
+    """
+    insert the likes or saves of (user_id, post_id) `pairs` that don't exist yet in one statement, without
+    the save signals. return the pairs inserted.
+    """
+    quote = connection.ops.quote_name
+    meta = model._meta
+    user, post = quote(meta.get_field('user').column), quote(meta.get_field('post').column)
+    created_at = timezone.now()
+    sql = (
+        f'INSERT INTO {quote(meta.db_table)} ({user}, {post}, {quote(meta.get_field("created_at").column)}) '
+        f'VALUES {", ".join(["(%s, %s, %s)"] * len(pairs))} '
+        f'ON CONFLICT ({user}, {post}) DO NOTHING '
+        f'RETURNING {user}, {post}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [value for user_id, post_id in pairs for value in (user_id, post_id, created_at)])
+        return {tuple(row) for row in cursor.fetchall()}
+
+
+def delete_reactions(model, pairs):
+    """
+    delete the likes or saves of (user_id, post_id) `pairs` in one statement, without the delete signals.
+    return the pairs deleted.
+    """
+    quote = connection.ops.quote_name
+    meta = model._meta
+    user, post = quote(meta.get_field('user').column), quote(meta.get_field('post').column)
+    sql = (
+        f'DELETE FROM {quote(meta.db_table)} '
+        f'WHERE {" OR ".join([f"({user} = %s AND {post} = %s)"] * len(pairs))} '
+        f'RETURNING {user}, {post}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [value for pair in pairs for value in pair])
+        return {tuple(row) for row in cursor.fetchall()}
@@ -6,7 +6,9 @@ from rest_framework.exceptions import ValidationError
 from activities.models import Comment, Like, Save
 from contents.models import Post
 from contents.serializers import PostSerializer
-from relations.models import FollowRelation, BlockRelation
+from custom_lib.preload import PreloadListSerializer
+from custom_lib.viewer import get_viewer
+from relations.models import FollowRelation
 from users.serializers import UserLightSerializer
 
 
@@ -30,31 +32,21 @@ class CommentCreateSerializer(serializers.ModelSerializer):
     def validate(self, attrs):
         request = self.context['request']
         user = request.user
+        viewer = get_viewer(request)
 
         # retrieve the post object
         post = get_object_or_404(Post, pk=attrs['post'].id)
 
         # check if the post is public or if the user follows the post owner or if it is the user page
         if post.user.is_private and user != post.user:
-            follows = FollowRelation.objects.filter(
-                from_user=user,
-                to_user=post.user,
-                is_accepted=True
-            ).exists()
-
-            if not follows:
+            if not viewer.follows(post.user_id):
                 raise ValidationError(
                     _("You can't comment on this post because the user is private and you don't follow them.")
                 )
 
         # if the account is public, check if the user is blocked
         elif not post.user.is_private and post.user != user:
-            blocked = BlockRelation.objects.filter(
-                blocker=post.user,
-                blocked=user
-            ).exists()
-
-            if blocked:
+            if post.user_id in viewer.blocker_ids:
                 raise ValidationError(
                     _("You can't comment on this post.")
                 )
@@ -73,14 +65,14 @@ class CommentCreateSerializer(serializers.ModelSerializer):
             if reply_to.reply_to is not None:
                 raise ValidationError(_("Recursive replies are not allowed."))
 
-        # only followers and post owner can send and see comments
+        # only followers and post owner can send and see comments, a pending follow request counts here
         if (
                 request.user != attrs['post'].user
                 and not FollowRelation.objects.filter(from_user=request.user, to_user=attrs['post'].user).exists()):
             raise ValidationError(_("You are not allowed to perform this action"))
 
         # check if the user has been blocked by the post owner
-        if BlockRelation.objects.filter(blocker=attrs['post'].user, blocked=request.user).exists():
+        if attrs['post'].user_id in viewer.blocker_ids:
             raise ValidationError(_("You have been blocked by the post owner"))
 
         # ensure the user is commenting on behalf of themselves
@@ -136,6 +128,7 @@ class CommentListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = ('id', 'user', 'text', 'reply_to', 'post')
+        read_fields = ('reply_to__text', 'reply_to__user__username')
 
     @staticmethod
     def get_reply_to(obj):
@@ -163,30 +156,20 @@ class LikeCreateSerializer(serializers.ModelSerializer):
     def validate(self, attrs):
         request = self.context['request']
         user = request.user
+        viewer = get_viewer(request)
 
         # retrieve the post object
         post = get_object_or_404(Post, pk=attrs['post'].id)
 
         # check if the post is public or if the user follows the post owner or if it is the user page
         if post.user.is_private and user != post.user:
-            follows = FollowRelation.objects.filter(
-                from_user=user,
-                to_user=post.user,
-                is_accepted=True
-            ).exists()
-
-            if not follows:
+            if not viewer.follows(post.user_id):
                 raise ValidationError(
                     _("You can't like this post because the user is private and you don't follow them.")
                 )
         # if the account is public, check if the user is blocked
         elif post.user != user:
-            blocked = BlockRelation.objects.filter(
-                blocker=post.user,
-                blocked=user
-            ).exists()
-
-            if blocked:
+            if post.user_id in viewer.blocker_ids:
                 raise ValidationError(
                     _("You can't like this post.")
                 )
@@ -214,30 +197,20 @@ class LikeCreateLightSerializer(serializers.ModelSerializer):
     def validate(self, attrs):
         request = self.context['request']
         user = request.user
+        viewer = get_viewer(request)
 
         # retrieve the post object
         post = get_object_or_404(Post, pk=self.context['post_id'])
 
         # check if the post is public or if the user follows the post owner or if it is the user page
         if post.user.is_private and user != post.user:
-            follows = FollowRelation.objects.filter(
-                from_user=user,
-                to_user=post.user,
-                is_accepted=True
-            ).exists()
-
-            if not follows:
+            if not viewer.follows(post.user_id):
                 raise ValidationError(
                     _("You can't like this post because the user is private and you don't follow them.")
                 )
         # if the account is public, check if the user is blocked
         elif post.user != user:
-            blocked = BlockRelation.objects.filter(
-                blocker=post.user,
-                blocked=user
-            ).exists()
-
-            if blocked:
+            if post.user_id in viewer.blocker_ids:
                 raise ValidationError(
                     _("You can't like this post.")
                 )
@@ -269,6 +242,7 @@ class LikeListLightSerializer(serializers.ModelSerializer):
     class Meta:
         model = Like
         fields = ('id', 'post', 'created_at')
+        list_serializer_class = PreloadListSerializer
 
 
 class LikeListSerializer(serializers.ModelSerializer):
@@ -278,6 +252,7 @@ class LikeListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Like
         fields = ('id', 'user', 'post', 'created_at')
+        list_serializer_class = PreloadListSerializer
 
 
 class SaveCreateSerializer(serializers.ModelSerializer):
@@ -288,30 +263,20 @@ class SaveCreateSerializer(serializers.ModelSerializer):
     def validate(self, attrs):
         request = self.context['request']
         user = request.user
+        viewer = get_viewer(request)
 
         # retrieve the post object
         post = get_object_or_404(Post, pk=attrs['post'].id)
 
         # check if the post is public or if the user follows the post owner or if it is the user page
         if post.user.is_private and user != post.user:
-            follows = FollowRelation.objects.filter(
-                from_user=user,
-                to_user=post.user,
-                is_accepted=True
-            ).exists()
-
-            if not follows:
+            if not viewer.follows(post.user_id):
                 raise ValidationError(
                     _("You can't save this post because the user is private and you don't follow them.")
                 )
         # if the account is public, check if the user is blocked
         elif post.user != user:
-            blocked = BlockRelation.objects.filter(
-                blocker=post.user,
-                blocked=user
-            ).exists()
-
-            if blocked:
+            if post.user_id in viewer.blocker_ids:
                 raise ValidationError(
                     _("You can't save this post.")
                 )
@@ -339,30 +304,20 @@ class SaveCreateLightSerializer(serializers.ModelSerializer):
     def validate(self, attrs):
         request = self.context['request']
         user = request.user
+        viewer = get_viewer(request)
 
         # retrieve the post object
         post = get_object_or_404(Post, pk=attrs['post'].id)
 
         # check if the post is public or if the user follows the post owner or if it is the user page
         if post.user.is_private and user != post.user:
-            follows = FollowRelation.objects.filter(
-                from_user=user,
-                to_user=post.user,
-                is_accepted=True
-            ).exists()
-
-            if not follows:
+            if not viewer.follows(post.user_id):
                 raise ValidationError(
                     _("You can't save this post because the user is private and you don't follow them.")
                 )
         # if the account is public, check if the user is blocked
         elif post.user != user:
-            blocked = BlockRelation.objects.filter(
-                blocker=post.user,
-                blocked=user
-            ).exists()
-
-            if blocked:
+            if post.user_id in viewer.blocker_ids:
                 raise ValidationError(
                     _("You can't save this post.")
                 )
@@ -394,3 +349,4 @@ class SaveListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Save
         fields = ('id', 'post', 'created_at')
+        list_serializer_class = PreloadListSerializer
@@ -0,0 +1,38 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from activities.counters import post_counters
+from activities.models import Like, Comment, Save
+from custom_lib.prefetch import forget_prefetched
+
+
+@receiver(post_save, sender=Like)
+def count_created_like(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: post_counters.incr(instance.post_id, 'like_count'))
+
+
+@receiver(post_delete, sender=Like)
+def count_deleted_like(sender, instance, **kwargs):
+    transaction.on_commit(lambda: post_counters.incr(instance.post_id, 'like_count', -1))
+
+
+@receiver(post_save, sender=Comment)
+def count_created_comment(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: post_counters.incr(instance.post_id, 'comment_count'))
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    transaction.on_commit(lambda: post_counters.incr(instance.post_id, 'comment_count', -1))
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+@receiver(post_save, sender=Save)
+@receiver(post_delete, sender=Save)
+def forget_prefetched_on_reaction(sender, instance, **kwargs):
+    # prefetched pages show whether the viewer liked and saved each post
+    transaction.on_commit(lambda: forget_prefetched((instance.user_id,)))
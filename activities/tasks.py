@@ -0,0 +1,20 @@
+from celery import shared_task
+
+
+@shared_task
+def flush_post_counters():
+    """write the buffered like and comment counts to the database, run periodically by celery beat"""
+    from .counters import post_counters
+
+    return post_counters.flush()
+
+
+@shared_task
+def flush_like_buffer():
+    """
+    write the likes buffered by LIKE_BUFFER_ENABLED to the database, run periodically by celery beat.
+    the buffer keeps being drained once disabled, for the likes queued before.
+    """
+    from .like_buffer import flush
+
+    return flush()
@@ -1,3 +1,212 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import override_settings
+
+from activities import like_buffer
+from activities.counters import post_counters
+from activities.models import Comment, Like, PostStats, Save
+from activities.tasks import flush_post_counters
+from custom_lib.testing import RedisTestCase
+from notifications.models import Notification
+
+
+class PostCountersTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author, self.liker = self.create_user('author'), self.create_user('liker')
+        self.post = self.create_post(self.author)
+
+    def test_increments_are_buffered_until_flushed(self):
+        Like.objects.create(user=self.liker, post=self.post)
+        Comment.objects.create(user=self.liker, post=self.post, text='nice')
+
+        self.assertFalse(PostStats.objects.filter(post=self.post).exists())
+        self.assertEqual(post_counters.get(self.post.id), {'like_count': 1, 'comment_count': 1})
+
+        self.assertEqual(flush_post_counters(), 1)
+        stats = PostStats.objects.get(post=self.post)
+        self.assertEqual((stats.like_count, stats.comment_count), (1, 1))
+        self.assertEqual(self.redis.hgetall(post_counters.key(self.post.id)), {})
+        self.assertEqual(post_counters.get(self.post.id), {'like_count': 1, 'comment_count': 1})
+
+    def test_deletes_are_counted(self):
+        like = Like.objects.create(user=self.liker, post=self.post)
+        flush_post_counters()
+        like.delete()
+
+        self.assertEqual(post_counters.get(self.post.id)['like_count'], 0)
+        flush_post_counters()
+        self.assertEqual(PostStats.objects.get(post=self.post).like_count, 0)
+
+    def test_deltas_of_a_failed_flush_are_kept(self):
+        Like.objects.create(user=self.liker, post=self.post)
+
+        with mock.patch.object(post_counters, '_upsert', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                post_counters.flush()
+        self.assertEqual(post_counters.get(self.post.id)['like_count'], 1)
+
+        flush_post_counters()
+        self.assertEqual(PostStats.objects.get(post=self.post).like_count, 1)
+
+    def test_post_serializer_reads_the_counters(self):
+        Like.objects.create(user=self.liker, post=self.post)
+
+        response = self.client_for(self.liker).get(f'/contents/author/posts/{self.post.id}/')
+        self.assertEqual(response.data['like_count'], 1)
+
+    def test_reconcile_keeps_deltas_buffered_after_the_counts(self):
+        Like.objects.create(user=self.liker, post=self.post)
+        flush_post_counters()
+        PostStats.objects.filter(post=self.post).update(like_count=99)
+        # counted by the recount, then taken off the buffer
+        Like.objects.create(user=self.create_user('second'), post=self.post)
+
+        # buffered while the recount runs: kept on top of it
+        subtract = post_counters.subtract
+
+        def like_meanwhile(pending):
+            post_counters.incr(self.post.id, 'like_count')
+            subtract(pending)
+
+        with mock.patch.object(post_counters, 'subtract', side_effect=like_meanwhile):
+            call_command('reconcile_post_stats', stdout=mock.Mock())
+
+        self.assertEqual(PostStats.objects.get(post=self.post).like_count, 2)
+        self.assertEqual(post_counters.get(self.post.id)['like_count'], 3)
+
+
+class PostReactionTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author, self.user = self.create_user('author'), self.create_user('user')
+        self.post = self.create_post(self.author)
+        self.client = self.client_for(self.user)
+        self.url = f'/activities/posts/{self.post.id}/like/'
+
+    def test_like_is_idempotent(self):
+        self.assertEqual(self.client.put(self.url).data, {'liked': True, 'like_count': 1})
+        self.assertEqual(self.client.put(self.url).data, {'liked': True, 'like_count': 1})
+        self.assertEqual(Like.objects.count(), 1)
+        self.assertEqual(Notification.objects.filter(notification_type=Notification.LIKE).count(), 1)
+
+        self.assertEqual(self.client.delete(self.url).data, {'liked': False, 'like_count': 0})
+        self.assertEqual(self.client.delete(self.url).data, {'liked': False, 'like_count': 0})
+        self.assertEqual(Like.objects.count(), 0)
+
+    def test_save_is_idempotent(self):
+        url = f'/activities/posts/{self.post.id}/save/'
+        self.assertEqual(self.client.put(url).data, {'saved': True})
+        self.assertEqual(self.client.put(url).data, {'saved': True})
+        self.assertEqual(Save.objects.count(), 1)
+        self.assertEqual(self.client.delete(url).data, {'saved': False})
+
+    def test_posts_the_user_cant_see(self):
+        private = self.create_user('private', is_private=True)
+        post = self.create_post(private)
+        self.assertEqual(self.client.put(f'/activities/posts/{post.id}/like/').status_code, 404)
+
+        blocker = self.create_user('blocker')
+        post = self.create_post(blocker)
+        self.assertEqual(self.client_for(blocker).post('/relations/block/user/').status_code, 201)
+        self.assertEqual(self.client.put(f'/activities/posts/{post.id}/like/').status_code, 404)
+        self.assertEqual(self.client.put('/activities/posts/0/like/').status_code, 404)
+
+
+class ViewerFlagsTests(RedisTestCase):
+    def test_has_liked_and_has_saved_on_lists(self):
+        viewer, author = self.create_user('viewer'), self.create_user('author')
+        self.follow(viewer, author)
+        liked, saved, other = self.create_post(author), self.create_post(author), self.create_post(author)
+        Like.objects.create(user=viewer, post=liked)
+        Save.objects.create(user=viewer, post=saved)
+        Like.objects.create(user=author, post=other)
+
+        results = self.client_for(viewer).get('/contents/feed/').data['results']
+        flags = {post['id']: (post['has_liked'], post['has_saved']) for post in results}
+        self.assertEqual(flags, {liked.id: (True, False), saved.id: (False, True), other.id: (False, False)})
+
+
+@override_settings(LIKE_BUFFER_ENABLED=True, LIKE_BUFFER_BATCH_SIZE=2)
+class LikeBufferTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author, self.user = self.create_user('author'), self.create_user('user')
+        self.posts = [self.create_post(self.author) for i in range(2)]
+        self.client = self.client_for(self.user)
+
+    def like(self, post, user=None):
+        return self.client_for(user or self.user).put(f'/activities/posts/{post.id}/like/')
+
+    def test_likes_are_written_by_the_flush(self):
+        self.like(self.posts[0])
+        self.like(self.posts[0], self.create_user('other'))
+        self.like(self.posts[1])
+
+        self.assertEqual(Like.objects.count(), 0)
+        response = self.client.get(f'/contents/author/posts/{self.posts[0].id}/')
+        self.assertTrue(response.data['has_liked'])
+
+        self.assertEqual(like_buffer.flush(), 3)
+        self.assertEqual(Like.objects.count(), 3)
+        self.assertEqual(PostStats.objects.get(post=self.posts[0]).like_count, 2)
+        self.assertEqual(Notification.objects.filter(notification_type=Notification.LIKE).count(), 3)
+        self.assertEqual(like_buffer.pending_likes(self.user.id, [post.id for post in self.posts]), {})
+
+    def test_latest_choice_wins(self):
+        self.like(self.posts[0])
+        self.client.delete(f'/activities/posts/{self.posts[0].id}/like/')
+        self.assertFalse(self.client.get(f'/contents/author/posts/{self.posts[0].id}/').data['has_liked'])
+
+        like_buffer.flush()
+        self.assertEqual(Like.objects.count(), 0)
+        self.assertEqual(post_counters.get(self.posts[0].id)['like_count'], 0)
+
+    def test_replayed_batch_counts_nothing(self):
+        self.like(self.posts[0])
+        entries = self.redis.xrange(like_buffer.STREAM_KEY)
+        like_buffer._flush_batch(self.redis, entries)
+        like_buffer._flush_batch(self.redis, entries)
+
+        self.assertEqual(Like.objects.count(), 1)
+        self.assertEqual(post_counters.get(self.posts[0].id)['like_count'], 1)
+        self.assertEqual(Notification.objects.filter(notification_type=Notification.LIKE).count(), 1)
+
+    def test_unlikes_only_count_existing_likes(self):
+        Like.objects.create(user=self.user, post=self.posts[0])
+        flush_post_counters()
+        self.client.delete(f'/activities/posts/{self.posts[0].id}/like/')
+        self.client.delete(f'/activities/posts/{self.posts[1].id}/like/')
+
+        like_buffer.flush()
+        self.assertEqual(post_counters.get(self.posts[0].id)['like_count'], 0)
+        self.assertEqual(post_counters.get(self.posts[1].id)['like_count'], 0)
+
+    def test_rejected_events_are_dead_lettered(self):
+        self.like(self.posts[0])
+        self.like(self.posts[1])
+        rejected = self.posts[1].id
+
+        flush_batch = like_buffer._flush_batch
+
+        def reject(conn, entries):
+            if any(int(fields[b'post']) == rejected for entry_id, fields in entries):
+                raise DatabaseError()
+            return flush_batch(conn, entries)
+
+        with mock.patch('activities.like_buffer._flush_batch', side_effect=reject):
+            like_buffer.flush()
+
+        self.assertEqual(list(Like.objects.values_list('post_id', flat=True)), [self.posts[0].id])
+        self.assertEqual(self.redis.xlen(like_buffer.DEAD_STREAM_KEY), 1)
+        self.assertEqual(self.redis.xlen(like_buffer.STREAM_KEY), 0)
+
+    def test_likes_of_deleted_posts_are_dropped(self):
+        self.like(self.posts[0])
+        self.posts[0].delete()
+
+        like_buffer.flush()
+        self.assertEqual(Like.objects.count(), 0)
+        self.assertEqual(self.redis.xlen(like_buffer.STREAM_KEY), 0)
@@ -27,4 +27,6 @@ urlpatterns = [
     path('likes/<int:pk>/', like_detail, name='like-detail'),
     path('saves/', save_list, name='save-list'),
     path('saves/<int:pk>/', save_detail, name='save-detail'),
+    path('posts/<int:post_id>/like/', views.PostLikeAPIView.as_view(), name='post-like'),
+    path('posts/<int:post_id>/save/', views.PostSaveAPIView.as_view(), name='post-save'),
 ]
@@ -1,14 +1,23 @@
+from django.conf import settings
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 
+from activities.counters import post_counters
+from activities.like_buffer import buffer_like
 from activities.models import Comment, Like, Save
+from activities.reactions import add_reaction, remove_reaction
 from activities.serializers import CommentListSerializer, CommentCreateSerializer, CommentDetailSerializer, \
     CommentUpdateSerializer, LikeListLightSerializer, LikeCreateSerializer, LikeListSerializer, SaveListSerializer, \
     SaveCreateSerializer
+from contents.models import Post
+from custom_lib.query_planner import QueryPlannerMixin
 
 
-class CommentViewSet(ModelViewSet):
+class CommentViewSet(QueryPlannerMixin, ModelViewSet):
     serializer_class = CommentListSerializer
 
     ordering = ('-created_at',)
@@ -31,7 +40,7 @@ class CommentViewSet(ModelViewSet):
         return self.serializer_class
 
 
-class LikeViewSet(ModelViewSet):
+class LikeViewSet(QueryPlannerMixin, ModelViewSet):
     serializer_class = LikeListLightSerializer
 
     ordering = ('-created_at',)
@@ -49,7 +58,7 @@ class LikeViewSet(ModelViewSet):
         return self.serializer_class
 
 
-class SaveViewSet(ModelViewSet):
+class SaveViewSet(QueryPlannerMixin, ModelViewSet):
     serializer_class = SaveListSerializer
 
     ordering = ('-created_at',)
@@ -66,3 +75,64 @@ class SaveViewSet(ModelViewSet):
         if self.action == 'create':
             return SaveCreateSerializer
         return self.serializer_class
+
+
+class PostReactionAPIView(APIView):
+    """
+    idempotent like or save of a post: PUT adds the user's reaction and DELETE removes it, repeating either
+    changes nothing. both answer with the resulting state and, for likes, the updated counter.
+    """
+    model = None
+    state_name = None
+    counter = None
+
+    permission_classes = (IsAuthenticated,)
+
+    def put(self, request, post_id):
+        # visibility, blocks and the post owner read in a single query
+        post = Post.objects.filter(id=post_id).visible_to(request.user).select_related('user').first()
+        if post is None:
+            raise NotFound()
+
+        self.add(request.user, post)
+        return Response(self.get_state(post_id, True))
+
+    def delete(self, request, post_id):
+        self.remove(request.user.id, post_id)
+        return Response(self.get_state(post_id, False))
+
+    def add(self, user, post):
+        add_reaction(self.model, user, post)
+
+    def remove(self, user_id, post_id):
+        remove_reaction(self.model, user_id, post_id)
+
+    def get_state(self, post_id, value):
+        state = {self.state_name: value}
+        if self.counter:
+            state[self.counter] = post_counters.get(post_id)[self.counter]
+        return state
+
+
+class PostLikeAPIView(PostReactionAPIView):
+    """with LIKE_BUFFER_ENABLED the like is buffered and written by the next flush, the counter catches up then"""
+    model = Like
+    state_name = 'liked'
+    counter = 'like_count'
+
+    def add(self, user, post):
+        if settings.LIKE_BUFFER_ENABLED:
+            buffer_like(user.id, post.id, True)
+        else:
+            super().add(user, post)
+
+    def remove(self, user_id, post_id):
+        if settings.LIKE_BUFFER_ENABLED:
+            buffer_like(user_id, post_id, False)
+        else:
+            super().remove(user_id, post_id)
+
+
+class PostSaveAPIView(PostReactionAPIView):
+    model = Save
+    state_name = 'saved'
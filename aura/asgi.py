@@ -2,6 +2,8 @@
 ASGI config for aura project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Long-polling and server-sent events endpoints (``/contents/feed/updates/``) are
+async views, serve them through this entry point so they don't hold a worker.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -153,7 +153,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'COERCE_DECIMAL_TO_STRING': False,
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'custom_lib.authentication.JWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -169,8 +169,12 @@ REST_FRAMEWORK = {
         'anon': '4/s',
         'user': '8/s',
     },
+    'PAGE_SIZE': 20,
 }
 
+# pagination classes are set per view, PAGE_SIZE only sizes their pages
+SILENCED_SYSTEM_CHECKS = ['rest_framework.W001']
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Aura API',
     'DESCRIPTION': 'Aura API Documentation',
@@ -180,6 +184,155 @@ SPECTACULAR_SETTINGS = {
 
 CELERY_BROKER_URL = 'redis://localhost:6379/1'
 
+# periodic tasks, run by `celery -A aura beat`
+CELERY_BEAT_SCHEDULE = {
+    'refresh-explore': {
+        'task': 'contents.tasks.refresh_explore',
+        'schedule': timedelta(minutes=10),
+    },
+    'refresh-top-tag-posts': {
+        'task': 'contents.tasks.refresh_top_tag_posts',
+        'schedule': timedelta(minutes=15),
+    },
+    'merge-tag-cooccurrence': {
+        'task': 'contents.tasks.merge_tag_cooccurrence',
+        'schedule': timedelta(minutes=5),
+    },
+    'rebuild-tag-cooccurrence': {
+        'task': 'contents.tasks.rebuild_tag_cooccurrence',
+        'schedule': timedelta(days=1),
+    },
+    'compute-suggestions': {
+        'task': 'relations.tasks.compute_suggestions',
+        'schedule': timedelta(days=1),
+    },
+    'resume-propagation-jobs': {
+        'task': 'relations.tasks.resume_propagation_jobs',
+        'schedule': timedelta(minutes=5),
+    },
+    'flush-post-counters': {
+        'task': 'activities.tasks.flush_post_counters',
+        'schedule': timedelta(seconds=30),
+    },
+    'flush-like-buffer': {
+        'task': 'activities.tasks.flush_like_buffer',
+        'schedule': timedelta(seconds=5),
+    },
+}
+
+# redis database holding feeds, counters and other derived data
+REDIS_URL = 'redis://localhost:6379/0'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://localhost:6379/2',
+    }
+}
+
+# counters buffered in redis and written to the database in batches (write-behind)
+COUNTERS_FLUSH_BATCH_SIZE = 500  # rows upserted per statement
+COUNTERS_LOCK_TIMEOUT = timedelta(minutes=5)  # a crashed flush or recount releases the counters after this
+
+# likes buffered in a redis stream and written in batches, for bursts on viral posts
+LIKE_BUFFER_ENABLED = False
+LIKE_BUFFER_BATCH_SIZE = 1000  # stream entries written per batch
+LIKE_BUFFER_LOCK_TIMEOUT = timedelta(minutes=1)  # a crashed flush releases the buffer after this
+
+# speculative prefetch of the next page of cursor paginated lists
+PREFETCH_ENABLED = True
+PREFETCH_TTL = timedelta(seconds=30)  # how long a prefetched page waits for its request
+PREFETCH_WORKERS = 2  # background threads computing next pages, per process
+
+# home feed timelines (fan-out on write)
+FEED_TIMELINE_ENABLED = True
+FEED_TIMELINE_SIZE = 800  # post ids kept per timeline
+FEED_TIMELINE_TTL = timedelta(days=7)  # timelines of inactive users are rebuilt on their next visit
+FEED_FANOUT_BATCH_SIZE = 1000  # followers written per redis pipeline
+FEED_FANOUT_FOLLOWER_THRESHOLD = 10000  # posts of authors with more followers are merged into feeds at read time
+
+# relevance ranked feed (?ranking=relevance)
+FEED_RANKING_CANDIDATES = 800  # most recent feed posts considered for ranking, at most FEED_TIMELINE_SIZE
+FEED_RANKING_SNAPSHOT_TTL = timedelta(minutes=15)  # how long a ranked feed can be paged through
+FEED_RANKING_AFFINITY_WINDOW = timedelta(days=30)  # interactions counted towards author affinity
+FEED_RANKING_WEIGHTS = {
+    'HALF_LIFE_HOURS': 12,
+    'LIKE_VELOCITY': 1.0,
+    'COMMENT_VELOCITY': 2.0,
+    'AFFINITY': 0.5,
+    'VIDEO': 0.2,
+    'AUTHOR_DIVERSITY_DECAY': 0.7,
+}
+
+# new feed posts polling (long-poll and server-sent events, served through aura.asgi)
+FEED_UPDATES_POLL_INTERVAL = 2  # seconds between two checks of the timeline head
+FEED_UPDATES_MAX_WAIT = 30  # longest a long-poll request is held
+FEED_UPDATES_HEARTBEAT = 15  # seconds without event before an event stream sends a keep-alive
+FEED_UPDATES_STREAM_DURATION = 300  # seconds before an event stream is closed and the client reconnects
+
+# seen posts tracking (?seen=hide or ?seen=last on feeds)
+FEED_SEEN_WINDOW = timedelta(days=7)  # seen posts are forgotten after this long
+FEED_SEEN_MAX_CONTAINERS = 32  # bitmaps of 65536 post ids (8 KB) kept per user
+
+# explore feed of trending public posts, precomputed by the refresh-explore periodic task
+EXPLORE_WINDOW = timedelta(days=3)  # only posts created this recently are ranked
+EXPLORE_SIZE = 1000  # posts kept in the precomputed ranking
+EXPLORE_MAX_POSTS_PER_AUTHOR = 3
+EXPLORE_VERSION_TTL = timedelta(minutes=30)  # a ranking is served this long without a refresh
+EXPLORE_SNAPSHOT_TTL = timedelta(hours=1)  # a ranking can still be paged through this long after it is replaced
+EXPLORE_WEIGHTS = {
+    'LIKE': 1.0,
+    'COMMENT': 2.0,
+    'GRAVITY': 1.5,  # how fast engagement loses value as the post gets older
+}
+
+# per-tag post indexes, the recent tab is kept up to date on write, the top tab is refreshed periodically
+TAG_TOP_SIZE = 300  # post ids kept in the top index of a tag
+TAG_TOP_CANDIDATES = 1000  # most recent posts of a tag considered for its top index
+TAG_TOP_TTL = timedelta(days=1)  # top indexes of tags nobody visits expire and stop being refreshed
+TAG_TOP_WEIGHTS = {
+    'LIKE': 1.0,
+    'COMMENT': 2.0,
+    'GRAVITY': 0.8,
+}
+
+# trending tags, counted per time bucket in a count-min sketch with a top-k of heavy hitters
+TRENDING_BUCKET = timedelta(hours=1)
+TRENDING_WINDOW_BUCKETS = 24  # buckets summed into the trending score
+TRENDING_DECAY = 0.85  # weight of each bucket relative to the next, more recent one
+TRENDING_SKETCH_WIDTH = 4096  # counters per sketch row, the sketch of a bucket takes width * depth * 4 bytes
+TRENDING_SKETCH_DEPTH = 4
+TRENDING_TOP_SIZE = 200  # heavy hitters kept per bucket
+TRENDING_CACHE_TTL = timedelta(minutes=1)
+
+# tag co-occurrence index (related tags and similar posts), sparse matrices stored in redis
+TAG_COOCCURRENCE_POSTS = 200000  # most recent tagged posts that can be suggested as similar posts
+TAG_COOCCURRENCE_CHUNK = 50000  # tagged posts read per step of a rebuild
+
+# people you may know, recomputed daily from a snapshot of the follow graph
+SUGGESTIONS_SIZE = 50  # suggestions stored per user
+SUGGESTIONS_TTL = timedelta(days=2)
+SUGGESTIONS_SHARD_SIZE = 2000  # users scored at once by a worker process
+SUGGESTIONS_SHARD_PATHS = 5000000  # friend of friend paths scored at once, fewer users when they have more
+
+# blocked and blocker sets of each user cached in redis, kept up to date by the block signals
+BLOCK_CACHE_TTL = timedelta(days=7)  # sets are rebuilt from the database on the first read this long after built
+
+# username -> (id, is_private, is_active) of the users named in urls, forgotten whenever a user is saved
+USERNAME_CACHE_TTL = timedelta(hours=1)
+
+# whether a viewer may see an owner's profile and posts, cached until a relationship of either one changes
+VISIBILITY_CACHE_TTL = timedelta(days=1)
+
+# background jobs applying blocks, privacy toggles and deactivations to feeds, tag indexes and follows
+PROPAGATION_CHUNK_SIZE = 500  # items processed per task
+PROPAGATION_CHUNK_TIMEOUT = timedelta(minutes=5)  # a chunk running longer may be run again
+PROPAGATION_STALL_TIMEOUT = timedelta(minutes=10)  # jobs not advanced for this long are queued again
+
+# profile summaries cached per viewer and profile, replaced as soon as a relationship, the profile or its posts
+# change. likes and comments of the posts shown may lag behind by up to the ttl.
+PROFILE_SUMMARY_TTL = timedelta(minutes=5)
+
 SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('JWT',),
     # 'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
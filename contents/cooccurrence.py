@@ -0,0 +1,200 @@
+from array import array
+from collections import deque
+from io import BytesIO
+from itertools import groupby, islice
+
+import numpy as np
+from django.conf import settings
+from scipy import sparse
+
+from custom_lib.redis_client import get_redis_connection
+
+# tagged posts processed since the last merge, as packed [post_id, tag_id, ...] arrays
+LOG_KEY = 'tags:cooccurrence:log'
+# tag x tag co-occurrence counts, the diagonal holds the number of posts of each tag
+MATRIX_KEY = 'tags:cooccurrence'
+# tag x post incidence of the most recent tagged posts, and the post id of each column
+POSTS_MATRIX_KEY = 'tags:cooccurrence:posts'
+POST_IDS_KEY = 'tags:cooccurrence:post-ids'
+# number of tagged posts counted in the co-occurrence matrix
+TOTAL_KEY = 'tags:cooccurrence:total'
+VERSION_KEY = 'tags:cooccurrence:version'
+LOCK_KEY = 'tags:cooccurrence:lock'
+
+# the matrices last read by this process, read again when the stored version changes
+_loaded = {'version': None}
+
+
+def log_tagged_post(post_id, tag_ids):
+    """queue the tags of a processed post, they are added to the matrices by the next `merge_log`"""
+    if tag_ids:
+        get_redis_connection().rpush(LOG_KEY, array('q', [post_id, *tag_ids]).tobytes())
+
+
+def incidence(rows):
+    """post x tag incidence matrix of (post_id, tag_ids) rows"""
+    indptr = np.cumsum([0] + [len(tag_ids) for post_id, tag_ids in rows])
+    indices = np.fromiter((tag_id for post_id, tag_ids in rows for tag_id in tag_ids), dtype=np.int64)
+    shape = (len(rows), int(indices.max()) + 1 if len(indices) else 0)
+    return sparse.csr_matrix((np.ones(len(indices), dtype=np.int32), indices, indptr), shape=shape)
+
+
+def add_rows(matrix, posts_matrix, post_ids, rows):
+    """add (post_id, tag_ids) rows to the co-occurrence and incidence matrices, keep the most recent posts"""
+    delta = incidence(rows)
+    size = max(matrix.shape[0], delta.shape[1])
+
+    matrix = _resized(matrix, (size, size)) + _resized(delta.T @ delta, (size, size))
+    posts_matrix = sparse.hstack(
+        [_resized(posts_matrix, (size, posts_matrix.shape[1])), _resized(delta.T, (size, len(rows)))], format='csc'
+    )
+    post_ids = np.concatenate([post_ids, np.array([post_id for post_id, tag_ids in rows], dtype=np.int64)])
+
+    keep = settings.TAG_COOCCURRENCE_POSTS
+    return matrix, posts_matrix[:, -keep:].tocsr(), post_ids[-keep:]
+
+
+def _resized(matrix, shape):
+    matrix = sparse.csr_matrix(matrix)
+    matrix.resize(shape)
+    return matrix
+
+
+def merge_log():
+    """add the tagged posts logged since the last merge to the stored matrices, return how many there were"""
+    conn = get_redis_connection()
+    with conn.lock(LOCK_KEY, timeout=600):
+        pipe = conn.pipeline()
+        pipe.lrange(LOG_KEY, 0, -1)
+        pipe.delete(LOG_KEY)
+        logged = pipe.execute()[0]
+        if not logged:
+            return 0
+
+        rows = []
+        for data in logged:
+            post_id, *tag_ids = array('q', data).tolist()
+            rows.append((post_id, sorted(set(tag_ids))))
+
+        matrix, posts_matrix, post_ids, total = read_stored()
+        store(*add_rows(matrix, posts_matrix, post_ids, rows), total + len(rows))
+        return len(rows)
+
+
+def rebuild():
+    """recompute the matrices from the PostTag table, this also drops the counts of untagged and deleted posts"""
+    from .models import PostTag
+
+    conn = get_redis_connection()
+    with conn.lock(LOCK_KEY, timeout=3600):
+        conn.delete(LOG_KEY)
+
+        post_tags = PostTag.objects.order_by('post_id', 'tag_id').values_list('post_id', 'tag_id').distinct()
+        rows = (
+            (post_id, [tag_id for _, tag_id in group])
+            for post_id, group in groupby(post_tags.iterator(chunk_size=settings.TAG_COOCCURRENCE_CHUNK),
+                                          key=lambda post_tag: post_tag[0])
+        )
+
+        # the co-occurrence counts are summed one chunk of posts at a time, only the recent posts are kept
+        matrix, total = sparse.csr_matrix((0, 0), dtype=np.int32), 0
+        recent = deque(maxlen=settings.TAG_COOCCURRENCE_POSTS)
+        while chunk := list(islice(rows, settings.TAG_COOCCURRENCE_CHUNK)):
+            delta = incidence(chunk)
+            size = max(matrix.shape[0], delta.shape[1])
+            matrix = _resized(matrix, (size, size)) + _resized(delta.T @ delta, (size, size))
+            recent.extend(chunk)
+            total += len(chunk)
+
+        posts_matrix = _resized(incidence(list(recent)).T, (matrix.shape[0], len(recent)))
+        post_ids = np.array([post_id for post_id, tag_ids in recent], dtype=np.int64)
+        store(matrix, posts_matrix, post_ids, total)
+        return total
+
+
+def _dump(matrix):
+    buffer = BytesIO()
+    sparse.save_npz(buffer, matrix.tocsr(), compressed=False)
+    return buffer.getvalue()
+
+
+def _parse(data):
+    return sparse.load_npz(BytesIO(data)).tocsr()
+
+
+def store(matrix, posts_matrix, post_ids, total):
+    pipe = get_redis_connection().pipeline()
+    pipe.set(MATRIX_KEY, _dump(matrix))
+    pipe.set(POSTS_MATRIX_KEY, _dump(posts_matrix))
+    pipe.set(POST_IDS_KEY, post_ids.astype(np.int64).tobytes())
+    pipe.set(TOTAL_KEY, total)
+    pipe.incr(VERSION_KEY)
+    pipe.execute()
+
+
+def read_stored():
+    """(matrix, posts_matrix, post_ids, total) as stored in redis, empty if nothing was stored yet"""
+    pipe = get_redis_connection().pipeline(transaction=True)
+    for key in (MATRIX_KEY, POSTS_MATRIX_KEY, POST_IDS_KEY, TOTAL_KEY):
+        pipe.get(key)
+    matrix, posts_matrix, post_ids, total = pipe.execute()
+
+    if matrix is None:
+        empty = sparse.csr_matrix((0, 0), dtype=np.int32)
+        return empty, empty, np.empty(0, dtype=np.int64), 0
+    return _parse(matrix), _parse(posts_matrix), np.frombuffer(post_ids, dtype=np.int64), int(total)
+
+
+def load():
+    """the stored matrices with the document frequency and idf of each tag, read again only once they changed"""
+    version = get_redis_connection().get(VERSION_KEY)
+    if version != _loaded['version']:
+        matrix, posts_matrix, post_ids, total = read_stored()
+        frequency = matrix.diagonal().astype(np.float64)
+        _loaded.update(
+            version=version, matrix=matrix, posts_matrix=posts_matrix, post_ids=post_ids,
+            frequency=frequency, idf=np.log((1 + total) / (1 + frequency)),
+        )
+    return _loaded
+
+
+def related_tags(tag_id, count=10):
+    """
+    (tag_id, score) of the tags used the most with `tag_id`, best first. the score is the cosine
+    similarity of the two tags' posts: co-occurrences over the geometric mean of their post counts.
+    """
+    loaded = load()
+    matrix, frequency = loaded['matrix'], loaded['frequency']
+    if tag_id >= matrix.shape[0]:
+        return []
+
+    start, end = matrix.indptr[tag_id], matrix.indptr[tag_id + 1]
+    tag_ids, counts = matrix.indices[start:end], matrix.data[start:end]
+    others = tag_ids != tag_id
+    tag_ids, counts = tag_ids[others], counts[others]
+
+    scores = counts / np.sqrt(frequency[tag_id] * frequency[tag_ids])
+    best = np.lexsort((-tag_ids, -scores))[:count]
+    return list(zip(tag_ids[best].tolist(), scores[best].tolist()))
+
+
+def similar_posts(post_id, tag_ids, count=20):
+    """
+    ids of the recent posts sharing the most tags with a post of `tag_ids`, best first. each shared tag
+    weighs its idf, so sharing a rare tag counts more than sharing a popular one.
+    """
+    loaded = load()
+    posts_matrix, idf = loaded['posts_matrix'], loaded['idf']
+    tag_ids = np.array([tag_id for tag_id in set(tag_ids) if tag_id < posts_matrix.shape[0]], dtype=np.int64)
+    if not len(tag_ids):
+        return []
+
+    # weighted sum of the rows of the post's tags, a (1 x posts) sparse vector
+    scores = sparse.csr_matrix(idf[tag_ids]) @ posts_matrix[tag_ids]
+    columns, values = scores.indices, scores.data
+    post_ids = loaded['post_ids'][columns]
+
+    others = post_ids != post_id
+    post_ids, values = post_ids[others], values[others]
+    best = np.lexsort((-post_ids, -values))[:count]
+    return post_ids[best].tolist()
@@ -0,0 +1,109 @@
+import time
+from uuid import uuid4
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from custom_lib.redis_client import get_redis_connection
+
+from .ranking import author_ranks, engagement_velocity
+from .snapshots import save_snapshot, read_snapshot
+
+# id of the ranking currently served, older rankings stay readable until they expire. the pointer expires
+# EXPLORE_SNAPSHOT_TTL before the ranking it points to, so a stalled refresh shows up as no ranking at all
+# and a ranking can be paged through for EXPLORE_SNAPSHOT_TTL after it stops being served
+EXPLORE_VERSION_KEY = 'explore:current'
+
+
+def explore_key(version):
+    return f'explore:{version}'
+
+
+def current_explore_version():
+    version = get_redis_connection().get(EXPLORE_VERSION_KEY)
+    return version.decode() if version is not None else None
+
+
+def refresh_explore():
+    """
+    rank the recent public posts by engagement velocity and store the best ones as a new version of the
+    explore ranking, as packed (post_id, author_id) pairs. return the new version.
+    """
+    from activities.models import Like, Comment
+    from .models import Post
+
+    since = timezone.now() - settings.EXPLORE_WINDOW
+    posts = Post.objects.filter(created_at__gte=since, user__is_private=False, user__is_active=True)
+
+    candidates = list(posts.values_list('id', 'user_id', 'created_at'))
+    likes = _count_recent(Like, posts)
+    comments = _count_recent(Comment, posts)
+
+    post_ids = np.array([post_id for post_id, user_id, created_at in candidates], dtype=np.int64)
+    author_ids = np.array([user_id for post_id, user_id, created_at in candidates], dtype=np.int64)
+    order = score_explore(
+        {
+            'created_at': np.array([created_at.timestamp() for _, _, created_at in candidates], dtype=np.float64),
+            'author_id': author_ids,
+            'likes': np.array([likes.get(post_id, 0) for post_id in post_ids.tolist()], dtype=np.float64),
+            'comments': np.array([comments.get(post_id, 0) for post_id in post_ids.tolist()], dtype=np.float64),
+        },
+        time.time()
+    )
+
+    entries = np.empty(len(order) * 2, dtype=np.int64)
+    entries[::2], entries[1::2] = post_ids[order], author_ids[order]
+
+    version = uuid4().hex[:12]
+    version_ttl = int(settings.EXPLORE_VERSION_TTL.total_seconds())
+    ttl = version_ttl + int(settings.EXPLORE_SNAPSHOT_TTL.total_seconds())
+    save_snapshot(explore_key(version), entries.tolist(), ttl)
+    get_redis_connection().set(EXPLORE_VERSION_KEY, version, ex=version_ttl)
+    return version
+
+
+def _count_recent(model, posts):
+    """number of `model` rows (likes, comments) of each post of `posts` that has any"""
+    return dict(
+        model.objects.filter(post__in=posts).values('post_id').annotate(n=Count('id')).values_list('post_id', 'n')
+    )
+
+
+def score_explore(features, now):
+    """
+    return the indexes of the posts worth exploring from best to worst: engaged posts scored by their
+    engagement divided by a power of their age, at most EXPLORE_MAX_POSTS_PER_AUTHOR per author.
+    """
+    age_hours = np.maximum(now - features['created_at'], 0) / 3600
+    scores = engagement_velocity(features['likes'], features['comments'], age_hours, settings.EXPLORE_WEIGHTS)
+
+    kept = np.flatnonzero(scores > 0)
+    kept = kept[author_ranks(features['author_id'][kept], scores[kept]) < settings.EXPLORE_MAX_POSTS_PER_AUTHOR]
+    order = kept[np.argsort(-scores[kept], kind='stable')]
+    return order[:settings.EXPLORE_SIZE]
+
+
+def read_explore(version, offset, count):
+    """read `count` (post_id, author_id) entries of an explore ranking, `None` if it has expired"""
+    data = read_snapshot(explore_key(version), offset * 2, count * 2)
+    if data is None:
+        return None
+    return list(zip(data[::2], data[1::2]))
+
+
+def excluded_authors(user_id):
+    """
+    the authors whose posts `user_id` should not explore: themselves, the accounts they follow or
+    requested to follow, and blocks in both directions. one query.
+    """
+    from relations.models import FollowRelation, BlockRelation
+
+    following = FollowRelation.objects.filter(from_user_id=user_id).values_list('to_user_id', flat=True)
+    blocked = BlockRelation.objects.filter(blocker_id=user_id).values_list('blocked_id', flat=True)
+    blockers = BlockRelation.objects.filter(blocked_id=user_id).values_list('blocker_id', flat=True)
+
+    # the models have a default ordering, compound statements can't have one per part
+    authors = following.order_by().union(blocked.order_by(), blockers.order_by())
+    return {user_id, *authors}
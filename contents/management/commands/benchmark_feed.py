@@ -0,0 +1,164 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from contents.models import Post
+from users.models import User
+
+BENCH_PREFIX = 'feedbench_'
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the home feed query: optionally seed a synthetic follow graph, then print the query plan '
+        'and latency percentiles of the first feed page for a sample of users.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true', help='create the synthetic graph before measuring')
+        parser.add_argument('--clear', action='store_true', help='delete the synthetic graph and exit')
+        parser.add_argument('--users', type=int, default=200_000)
+        parser.add_argument('--follows', type=int, default=10_000_000)
+        parser.add_argument('--posts', type=int, default=2_000_000)
+        parser.add_argument('--blocks', type=int, default=100_000)
+        parser.add_argument('--samples', type=int, default=50, help='number of users whose feed is measured')
+        parser.add_argument('--page-size', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stderr.write('The feed benchmark needs PostgreSQL.')
+            return
+
+        if options['clear']:
+            self.clear()
+            return
+
+        if options['seed']:
+            self.seed(options['users'], options['follows'], options['posts'], options['blocks'])
+
+        self.measure(options['samples'], options['page_size'])
+
+    def seed(self, users, follows, posts, blocks):
+        """generate the graph in the database, popularity of followed accounts follows a power law"""
+        self.stdout.write(f'Seeding {users} users, {follows} follows, {posts} posts and {blocks} blocks...')
+        started = time.perf_counter()
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO users_user (password, is_superuser, username, email, is_staff, is_active, date_joined,
+                                        avatar, is_private, is_verified, date_modified)
+                SELECT '!', false, %(prefix)s || i, %(prefix)s || i || '@example.com', false, random() > 0.01,
+                       now(), 'users/avatars/default.png', random() < 0.2, false, now()
+                FROM generate_series(1, %(users)s) AS i
+                """,
+                {'prefix': BENCH_PREFIX, 'users': users}
+            )
+            cursor.execute(
+                """
+                CREATE TEMPORARY TABLE feedbench_users ON COMMIT DROP AS
+                SELECT row_number() OVER (ORDER BY id) - 1 AS n, id FROM users_user WHERE username LIKE %(pattern)s
+                """,
+                {'pattern': BENCH_PREFIX + '%'}
+            )
+            cursor.execute('CREATE UNIQUE INDEX ON feedbench_users (n)')
+            cursor.execute(
+                """
+                INSERT INTO relations_followrelation (created_at, modified_at, from_user_id, to_user_id, is_accepted)
+                SELECT now(), now(), f.id, t.id, random() < 0.95
+                FROM (
+                    SELECT floor(random() * %(users)s) AS from_n, floor(power(random(), 3) * %(users)s) AS to_n
+                    FROM generate_series(1, %(follows)s)
+                ) AS edge
+                JOIN feedbench_users AS f ON f.n = edge.from_n
+                JOIN feedbench_users AS t ON t.n = edge.to_n
+                WHERE f.id <> t.id
+                ON CONFLICT DO NOTHING
+                """,
+                {'users': users, 'follows': follows}
+            )
+            cursor.execute(
+                """
+                INSERT INTO contents_post (created_at, modified_at, caption, user_id)
+                SELECT created_at, created_at, 'benchmark', u.id
+                FROM (
+                    SELECT now() - random() * interval '90 days' AS created_at,
+                           floor(power(random(), 2) * %(users)s) AS user_n
+                    FROM generate_series(1, %(posts)s)
+                ) AS post
+                JOIN feedbench_users AS u ON u.n = post.user_n
+                """,
+                {'users': users, 'posts': posts}
+            )
+            cursor.execute(
+                """
+                INSERT INTO relations_blockrelation (created_at, blocker_id, blocked_id)
+                SELECT now(), b.id, d.id
+                FROM (
+                    SELECT floor(random() * %(users)s) AS blocker_n, floor(random() * %(users)s) AS blocked_n
+                    FROM generate_series(1, %(blocks)s)
+                ) AS block
+                JOIN feedbench_users AS b ON b.n = block.blocker_n
+                JOIN feedbench_users AS d ON d.n = block.blocked_n
+                WHERE b.id <> d.id
+                ON CONFLICT DO NOTHING
+                """,
+                {'users': users, 'blocks': blocks}
+            )
+
+        with connection.cursor() as cursor:
+            for table in ('users_user', 'relations_followrelation', 'relations_blockrelation', 'contents_post'):
+                cursor.execute(f'ANALYZE {table}')
+
+        self.stdout.write(f'Seeded in {time.perf_counter() - started:.1f}s')
+
+    def measure(self, samples, page_size):
+        """explain the feed query of one sample user and time it for every sample user"""
+        viewers = list(
+            User.objects.filter(username__startswith=BENCH_PREFIX).order_by('?').values_list('id', flat=True)[:samples]
+        )
+        if not viewers:
+            self.stderr.write('No benchmark users found, run with --seed first.')
+            return
+
+        def first_page(viewer_id):
+            return Post.objects.feed_for(viewer_id).order_by('-created_at', '-id')[:page_size]
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM relations_followrelation')
+            self.stdout.write(f'Follow edges: {cursor.fetchone()[0]}')
+
+        self.stdout.write('Plan of the first feed page:')
+        self.stdout.write(first_page(viewers[0]).explain(analyze=True, buffers=True))
+
+        timings = []
+        for viewer_id in viewers:
+            started = time.perf_counter()
+            list(first_page(viewer_id))
+            timings.append((time.perf_counter() - started) * 1000)
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f'Feed page latency over {len(timings)} users: '
+            f'p50 {statistics.median(timings):.2f}ms, p95 {p95:.2f}ms, max {timings[-1]:.2f}ms'
+        )
+
+    def clear(self):
+        """delete the synthetic graph with plain sql, skipping the per-row signals of the orm"""
+        with transaction.atomic(), connection.cursor() as cursor:
+            bench_users = 'SELECT id FROM users_user WHERE username LIKE %s'
+            pattern = BENCH_PREFIX + '%'
+            cursor.execute(f'DELETE FROM contents_post WHERE user_id IN ({bench_users})', [pattern])
+            cursor.execute(
+                f'DELETE FROM relations_followrelation WHERE from_user_id IN ({bench_users}) '
+                f'OR to_user_id IN ({bench_users})', [pattern, pattern]
+            )
+            cursor.execute(
+                f'DELETE FROM relations_blockrelation WHERE blocker_id IN ({bench_users}) '
+                f'OR blocked_id IN ({bench_users})', [pattern, pattern]
+            )
+            cursor.execute('DELETE FROM users_user WHERE username LIKE %s', [pattern])
+        self.stdout.write('Benchmark data deleted.')
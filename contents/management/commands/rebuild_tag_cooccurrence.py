@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from contents import cooccurrence
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the tag co-occurrence index behind related tags and similar posts from the database.'
+
+    def handle(self, *args, **options):
+        total = cooccurrence.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} tagged posts.'))
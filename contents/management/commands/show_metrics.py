@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from custom_lib import metrics
+from custom_lib.prefetch import prefetch_report
+
+
+class Command(BaseCommand):
+    help = 'Print the counters and gauges recorded by feeds, prefetching and background jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('namespaces', nargs='*', help='namespaces to print, all of them by default')
+
+    def handle(self, *args, **options):
+        for namespace in options['namespaces'] or metrics.namespaces():
+            self.stdout.write(self.style.MIGRATE_HEADING(namespace))
+            for name, value in metrics.get_metrics(namespace).items():
+                self.stdout.write(f'  {name}: {value:g}')
+
+            if namespace == 'prefetch':
+                for view, values in prefetch_report().items():
+                    self.stdout.write(
+                        f'  {view}: hit rate {values["hit_rate"]:.1%}, '
+                        f'{values["wasted"]:g} pages prefetched for nothing'
+                    )
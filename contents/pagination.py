@@ -0,0 +1,123 @@
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class TimelineCursorPagination(BasePagination):
+    """
+    cursor pagination over a precomputed sequence of (post_id, score) entries, such as a redis timeline.
+    the cursor holds the position of the last entry served, so pages stay stable while new posts arrive.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_entries(self, fetch, request):
+        """`fetch(before, count)` returns up to `count` entries older than the `before` position, newest first"""
+        self.base_url = request.build_absolute_uri()
+        entries = fetch(self.decode_cursor(request), self.page_size + 1)
+
+        self.has_next = len(entries) > self.page_size
+        entries = entries[:self.page_size]
+        self.next_position = (entries[-1][1], entries[-1][0]) if self.has_next else None
+        return entries
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            score, post_id = b64decode(encoded.encode('ascii')).decode('ascii').split(':')
+            return float(score), int(post_id)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        score, post_id = position
+        encoded = b64encode(f'{score!r}:{post_id}'.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class SnapshotCursorPagination(TimelineCursorPagination):
+    """
+    cursor pagination over a ranked snapshot of post ids. the first page creates the snapshot, the cursor
+    then holds the snapshot id and an offset, so the order stays stable while the user scrolls.
+    """
+    expired_cursor_message = _('This cursor has expired')
+
+    def paginate_snapshot(self, create, read, request, keep=None):
+        """
+        `create()` stores a new snapshot and returns its id, `read(snapshot_id, offset, count)` reads its items.
+        items rejected by the optional `keep(item)` filter are skipped, reading on until the page is full.
+        """
+        self.base_url = request.build_absolute_uri()
+        position = self.decode_cursor(request)
+        snapshot_id, offset = position if position is not None else (create(), 0)
+
+        items, next_offset = [], offset
+        while len(items) <= self.page_size:
+            chunk = read(snapshot_id, offset, self.page_size + 1)
+            if chunk is None:
+                raise NotFound(self.expired_cursor_message)
+
+            for item in chunk:
+                offset += 1
+                if keep is None or keep(item):
+                    items.append(item)
+                    if len(items) == self.page_size:
+                        next_offset = offset
+                    elif len(items) > self.page_size:
+                        break
+
+            if len(chunk) <= self.page_size:
+                break
+
+        self.has_next = len(items) > self.page_size
+        self.next_position = (snapshot_id, next_offset)
+        return items[:self.page_size]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            snapshot_id, offset = b64decode(encoded.encode('ascii')).decode('ascii').split(':')
+            return snapshot_id, int(offset)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        snapshot_id, offset = position
+        encoded = b64encode(f'{snapshot_id}:{offset}'.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
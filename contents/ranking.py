@@ -0,0 +1,118 @@
+import time
+from uuid import uuid4
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from .snapshots import save_snapshot
+from .timelines import read_feed
+
+
+def snapshot_key(user_id, snapshot_id):
+    return f'ranking:{user_id}:{snapshot_id}'
+
+
+def rank_feed(user_id):
+    """rank the candidate posts of a user's home feed and store the ranking as a snapshot, return its id"""
+    # a timeline holds FEED_TIMELINE_SIZE posts, more candidates would be posts of the merged authors only
+    count = min(settings.FEED_RANKING_CANDIDATES, settings.FEED_TIMELINE_SIZE)
+    candidates = read_feed(user_id, count=count)
+    features = build_features(user_id, candidates)
+    ranked_ids = features['post_id'][score_candidates(features, time.time())]
+
+    snapshot_id = uuid4().hex[:12]
+    ttl = int(settings.FEED_RANKING_SNAPSHOT_TTL.total_seconds())
+    save_snapshot(snapshot_key(user_id, snapshot_id), ranked_ids.tolist(), ttl)
+    return snapshot_id
+
+
+def build_features(user_id, candidates):
+    """
+    load the ranking features of (post_id, score) candidates in bulk, one query per feature,
+    as arrays aligned with the candidates.
+    """
+    from activities.counters import post_counters
+    from activities.models import Like, Comment
+    from .models import Post, Media
+
+    post_ids = [post_id for post_id, score in candidates]
+    authors = dict(Post.objects.filter(id__in=post_ids, user__is_active=True).values_list('id', 'user_id'))
+    candidates = [(post_id, score) for post_id, score in candidates if post_id in authors]
+    post_ids = [post_id for post_id, score in candidates]
+
+    counters = post_counters.get_many(post_ids)
+    videos = set(
+        Media.objects.filter(post_id__in=post_ids, media_type=Media.VIDEO).values_list('post_id', flat=True)
+    )
+
+    # the viewer's recent interactions with each candidate author
+    author_ids = set(authors.values())
+    since = timezone.now() - settings.FEED_RANKING_AFFINITY_WINDOW
+    affinity = dict.fromkeys(author_ids, 0)
+    for model, weight in ((Like, 1), (Comment, 2)):
+        interactions = model.objects.filter(
+            user_id=user_id, post__user_id__in=author_ids, created_at__gte=since
+        ).values('post__user_id').annotate(n=Count('id')).values_list('post__user_id', 'n')
+        for author_id, count in interactions:
+            affinity[author_id] += weight * count
+
+    return {
+        'post_id': np.array(post_ids, dtype=np.int64),
+        'author_id': np.array([authors[post_id] for post_id in post_ids], dtype=np.int64),
+        'created_at': np.array([score for post_id, score in candidates], dtype=np.float64),
+        'likes': np.array([counters[post_id]['like_count'] for post_id in post_ids], dtype=np.float64),
+        'comments': np.array([counters[post_id]['comment_count'] for post_id in post_ids], dtype=np.float64),
+        'is_video': np.array([post_id in videos for post_id in post_ids], dtype=np.float64),
+        'affinity': np.array([affinity[authors[post_id]] for post_id in post_ids], dtype=np.float64),
+    }
+
+
+def score_candidates(features, now):
+    """
+    score all candidates at once and return their indexes from best to worst.
+
+    the score is an exponential recency decay scaled up by like and comment velocity, author affinity
+    and media type. each further post of the same author is then discounted by AUTHOR_DIVERSITY_DECAY
+    so a single prolific author cannot take over the top of the feed.
+    """
+    weights = settings.FEED_RANKING_WEIGHTS
+    count = len(features['post_id'])
+    if not count:
+        return np.empty(0, dtype=np.int64)
+
+    age_hours = np.maximum(now - features['created_at'], 0) / 3600
+    recency = np.exp2(-age_hours / weights['HALF_LIFE_HOURS'])
+    like_velocity = np.log1p(features['likes'] / (age_hours + 2))
+    comment_velocity = np.log1p(features['comments'] / (age_hours + 2))
+
+    scores = recency * (
+        1
+        + weights['LIKE_VELOCITY'] * like_velocity
+        + weights['COMMENT_VELOCITY'] * comment_velocity
+        + weights['AFFINITY'] * np.log1p(features['affinity'])
+        + weights['VIDEO'] * features['is_video']
+    )
+
+    scores = scores * np.power(weights['AUTHOR_DIVERSITY_DECAY'], author_ranks(features['author_id'], scores))
+    return np.argsort(-scores, kind='stable')
+
+
+def engagement_velocity(likes, comments, age_hours, weights):
+    """engagement of posts divided by a power of their age, so recent engagement weighs the most"""
+    engagement = weights['LIKE'] * likes + weights['COMMENT'] * comments
+    return engagement / np.power(age_hours + 2, weights['GRAVITY'])
+
+
+def author_ranks(author_ids, scores):
+    """rank of each post among the posts of its author, 0 for the best scored one"""
+    count = len(author_ids)
+    by_author = np.lexsort((-scores, author_ids))
+    sorted_authors = author_ids[by_author]
+    group_starts = np.flatnonzero(np.r_[True, sorted_authors[1:] != sorted_authors[:-1]])
+    group_sizes = np.diff(np.r_[group_starts, count])
+
+    ranks = np.empty(count, dtype=np.int64)
+    ranks[by_author] = np.arange(count) - np.repeat(group_starts, group_sizes)
+    return ranks
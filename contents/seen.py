@@ -0,0 +1,61 @@
+import time
+
+from django.conf import settings
+
+from custom_lib.redis_client import get_redis_connection
+
+# like a roaring bitmap, the high bits of a post id select a container and the low bits a bit in it,
+# so a container is a redis string of at most 2 ** 16 bits (8 KB) covering 65536 consecutive post ids
+CONTAINER_BITS = 16
+CONTAINER_MASK = (1 << CONTAINER_BITS) - 1
+
+
+def _container_key(user_id, container):
+    return f'seen:{user_id}:{container}'
+
+
+def _containers_key(user_id):
+    return f'seen:{user_id}:containers'
+
+
+def mark_seen(user_id, post_ids):
+    """
+    record that `user_id` has seen `post_ids`. containers expire after FEED_SEEN_WINDOW without writes and
+    only the FEED_SEEN_MAX_CONTAINERS most recently written are kept, so memory per user stays bounded.
+    """
+    conn = get_redis_connection()
+    ttl = int(settings.FEED_SEEN_WINDOW.total_seconds())
+    now = time.time()
+
+    pipe = conn.pipeline(transaction=False)
+    containers = set()
+    for post_id in post_ids:
+        containers.add(post_id >> CONTAINER_BITS)
+        pipe.setbit(_container_key(user_id, post_id >> CONTAINER_BITS), post_id & CONTAINER_MASK, 1)
+    for container in containers:
+        pipe.expire(_container_key(user_id, container), ttl)
+        pipe.zadd(_containers_key(user_id), {container: now})
+
+    # forget containers that left the window, then the oldest ones above the limit
+    pipe.zremrangebyscore(_containers_key(user_id), '-inf', now - ttl)
+    pipe.zrange(_containers_key(user_id), 0, -settings.FEED_SEEN_MAX_CONTAINERS - 1)
+    pipe.expire(_containers_key(user_id), ttl)
+    evicted = pipe.execute()[-2]
+
+    if evicted:
+        pipe = conn.pipeline(transaction=False)
+        pipe.zrem(_containers_key(user_id), *evicted)
+        pipe.delete(*(_container_key(user_id, int(container)) for container in evicted))
+        pipe.execute()
+
+
+def seen_post_ids(user_id, post_ids):
+    """the subset of `post_ids` that `user_id` has seen, one bit lookup per post"""
+    post_ids = list(post_ids)
+    if not post_ids:
+        return set()
+
+    pipe = get_redis_connection().pipeline(transaction=False)
+    for post_id in post_ids:
+        pipe.getbit(_container_key(user_id, post_id >> CONTAINER_BITS), post_id & CONTAINER_MASK)
+    return {post_id for post_id, bit in zip(post_ids, pipe.execute()) if bit}
@@ -1,8 +1,13 @@
 from django.db import transaction
+from django.db.models import Value
 from rest_framework import serializers
 
-from activities.models import Comment, Like
+from activities.counters import post_counters
+from activities.like_buffer import pending_likes
+from activities.models import Like, Save
 from contents.models import Tag, Post, Media
+from contents.seen import mark_seen
+from custom_lib.preload import PreloadMixin, PreloadListSerializer
 from locations.serializers import LocationSerializer
 
 
@@ -18,26 +23,68 @@ class MediaSerializer(serializers.ModelSerializer):
         fields = ('id', 'media_type', 'file')
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(PreloadMixin, serializers.ModelSerializer):
     user = serializers.CharField(source='user.username')
     location = LocationSerializer()
     media = MediaSerializer(many=True)
     like_count = serializers.SerializerMethodField()
     comment_count = serializers.SerializerMethodField()
+    has_liked = serializers.SerializerMethodField()
+    has_saved = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
-        fields = ('id', 'user', 'caption', 'media', 'location', 'like_count', 'comment_count')
-
-    @staticmethod
-    def get_like_count(obj):
-        # count the number of likes for the post
-        return Like.objects.filter(post=obj).count()
-
-    @staticmethod
-    def get_comment_count(obj):
-        # count the number of comments for the post
-        return Comment.objects.filter(post=obj).count()
+        fields = (
+            'id', 'user', 'caption', 'media', 'location', 'like_count', 'comment_count', 'has_liked', 'has_saved'
+        )
+        list_serializer_class = PreloadListSerializer
+        # the counters and the viewer's likes and saves are looked up by id
+        read_fields = ()
+
+    def preload(self, posts):
+        # read the counters and the viewer's likes and saves of the whole page at once
+        self.preload_values('counters', posts, _load_counters)
+        self.preload_values('viewer_state', posts, self._load_viewer_state)
+
+    def get_like_count(self, obj):
+        return self.preloaded('counters', obj, _load_counters)['like_count']
+
+    def get_comment_count(self, obj):
+        return self.preloaded('counters', obj, _load_counters)['comment_count']
+
+    def get_has_liked(self, obj):
+        return 'like' in self.preloaded('viewer_state', obj, self._load_viewer_state)
+
+    def get_has_saved(self, obj):
+        return 'save' in self.preloaded('viewer_state', obj, self._load_viewer_state)
+
+    def _load_viewer_state(self, posts):
+        """
+        {post_id: {'like', 'save'}} of the viewer's likes and saves among `posts`, one query,
+        with the viewer's buffered likes not flushed yet applied on top.
+        """
+        state = {post.id: set() for post in posts}
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            return state
+
+        post_ids = list(state)
+        likes = Like.objects.filter(user=request.user, post_id__in=post_ids).values_list('post_id', Value('like'))
+        saves = Save.objects.filter(user=request.user, post_id__in=post_ids).values_list('post_id', Value('save'))
+        for post_id, kind in likes.union(saves, all=True):
+            state[post_id].add(kind)
+
+        # likes buffered before the buffer was disabled may still be waiting for their flush
+        for post_id, liked in pending_likes(request.user.id, post_ids).items():
+            if liked:
+                state[post_id].add('like')
+            else:
+                state[post_id].discard('like')
+        return state
+
+
+def _load_counters(posts):
+    return post_counters.get_many({post.id for post in posts})
 
 
 class PostNotificationSerializer(serializers.ModelSerializer):
@@ -83,3 +130,12 @@ class PostCreateSerializer(serializers.ModelSerializer):
                 Media.objects.create(post=post, file=media_file)
 
         return post
+
+
+class SeenPostsSerializer(serializers.Serializer):
+    posts = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=100)
+
+    def create(self, validated_data):
+        # record the posts the client displayed to the user
+        mark_seen(self.context['request'].user.id, validated_data['posts'])
+        return validated_data
@@ -0,0 +1,54 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from contents.models import Post, PostTag
+from contents.tasks import fan_out_post, remove_post_from_timelines, backfill_timeline, remove_author_from_timeline, \
+    remove_post_from_tag_indexes
+from relations.models import FollowRelation
+from users.stats import add_to_stats
+from users.summary import bump_profile_epochs
+
+
+@receiver(post_save, sender=Post)
+def fan_out_created_post(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: fan_out_post.delay(instance.id))
+
+
+@receiver(post_delete, sender=Post)
+def remove_deleted_post(sender, instance, **kwargs):
+    transaction.on_commit(lambda: remove_post_from_timelines.delay(instance.id, instance.user_id))
+
+
+@receiver(post_save, sender=Post)
+def count_created_post(sender, instance, created, **kwargs):
+    # edited posts change the profile summaries showing them
+    transaction.on_commit(lambda: _count_post(instance.user_id, 1 if created else 0))
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    transaction.on_commit(lambda: _count_post(instance.user_id, -1))
+
+
+@receiver(post_delete, sender=PostTag)
+def remove_untagged_post(sender, instance, **kwargs):
+    transaction.on_commit(lambda: remove_post_from_tag_indexes.delay(instance.post_id, instance.tag_id))
+
+
+@receiver(post_save, sender=FollowRelation)
+def backfill_timeline_on_follow(sender, instance, created, **kwargs):
+    if instance.is_accepted:
+        transaction.on_commit(lambda: backfill_timeline.delay(instance.from_user_id, instance.to_user_id))
+
+
+@receiver(post_delete, sender=FollowRelation)
+def clean_timeline_on_unfollow(sender, instance, **kwargs):
+    transaction.on_commit(lambda: remove_author_from_timeline.delay(instance.from_user_id, instance.to_user_id))
+
+
+def _count_post(user_id, amount):
+    if amount:
+        add_to_stats(user_id, 'posts_count', amount)
+    bump_profile_epochs((user_id,))
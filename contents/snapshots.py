@@ -0,0 +1,23 @@
+from array import array
+
+from custom_lib.redis_client import get_redis_connection
+
+# post ids are stored as packed 64-bit integers, so a page is a single GETRANGE
+ITEM_SIZE = array('q').itemsize
+
+
+def save_snapshot(key, post_ids, ttl):
+    """store an ordered list of post ids under `key` for `ttl` seconds"""
+    get_redis_connection().set(key, array('q', post_ids).tobytes(), ex=ttl)
+
+
+def read_snapshot(key, offset, count):
+    """read `count` post ids starting at `offset`, `None` if the snapshot has expired"""
+    pipe = get_redis_connection().pipeline(transaction=False)
+    pipe.exists(key)
+    pipe.getrange(key, offset * ITEM_SIZE, (offset + count) * ITEM_SIZE - 1)
+    exists, data = pipe.execute()
+
+    if not exists:
+        return None
+    return array('q', data).tolist()
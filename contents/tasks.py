@@ -1,7 +1,11 @@
 import re
 from celery import shared_task
+from django.conf import settings
 from django.contrib.auth import get_user_model
 
+from .timelines import home_timelines, author_timelines, tag_timelines, tag_top_posts, post_score, \
+    is_fanout_exempt, set_fanout_exempt
+
 User = get_user_model()
 
 
@@ -20,11 +24,20 @@ def process_post_content(post_id):
 
 def extract_hashtags(post):
     from .models import Tag, PostTag
+    from .cooccurrence import log_tagged_post
+    from .trending import record_tag_uses
 
     tags = re.findall(r'#(\w+)', post.caption)
+    used_tag_ids = []
     for tag in tags:
         tag, created = Tag.objects.get_or_create(name=tag)
-        PostTag.objects.get_or_create(post=post, tag=tag)
+        post_tag, created = PostTag.objects.get_or_create(post=post, tag=tag)
+        if created:
+            tag_timelines.push((tag.id,), post.id, post_score(post.created_at))
+            used_tag_ids.append(tag.id)
+
+    record_tag_uses(used_tag_ids)
+    log_tagged_post(post.id, used_tag_ids)
 
 
 def extract_mentions(post):
@@ -37,3 +50,118 @@ def extract_mentions(post):
             TaggedUser.objects.get_or_create(post=post, user=user)
         except User.DoesNotExist:
             pass
+
+
+def _follower_batches(author_id):
+    """ids of the accepted followers of `author_id`, in batches"""
+    from relations.models import FollowRelation
+
+    follower_ids = FollowRelation.objects.filter(
+        to_user_id=author_id, is_accepted=True
+    ).values_list('from_user_id', flat=True)
+
+    batch = []
+    for follower_id in follower_ids.iterator(chunk_size=settings.FEED_FANOUT_BATCH_SIZE):
+        batch.append(follower_id)
+        if len(batch) == settings.FEED_FANOUT_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@shared_task
+def fan_out_post(post_id):
+    """
+    push a new post into the home timelines of its author's followers. posts of authors with more followers
+    than FEED_FANOUT_FOLLOWER_THRESHOLD are only indexed for their author and merged into feeds at read time.
+    """
+    from relations.models import FollowRelation
+    from .models import Post
+
+    try:
+        post = Post.objects.only('id', 'user_id', 'created_at').get(id=post_id)
+    except Post.DoesNotExist:
+        return
+
+    score = post_score(post.created_at)
+    author_timelines.push((post.user_id,), post.id, score)
+
+    followers_count = FollowRelation.objects.filter(to_user_id=post.user_id, is_accepted=True).count()
+    exempt = followers_count > settings.FEED_FANOUT_FOLLOWER_THRESHOLD
+    if set_fanout_exempt(post.user_id, exempt) and not exempt:
+        # the author fell back under the threshold, their posts are no longer merged at read time
+        fan_out_author.delay(post.user_id)
+    if exempt:
+        return
+
+    for follower_ids in _follower_batches(post.user_id):
+        home_timelines.push(follower_ids, post.id, score)
+
+
+@shared_task
+def fan_out_author(author_id):
+    """push the recent posts of an author into the home timelines of all their followers"""
+    entries = author_timelines.entries(author_id)
+    for follower_ids in _follower_batches(author_id):
+        home_timelines.push_entries(follower_ids, entries)
+
+
+@shared_task
+def remove_post_from_timelines(post_id, author_id):
+    """remove a deleted post from the home timelines of its author's followers"""
+    author_timelines.remove((author_id,), (post_id,))
+    for follower_ids in _follower_batches(author_id):
+        home_timelines.remove(follower_ids, (post_id,))
+
+
+@shared_task
+def backfill_timeline(user_id, author_id):
+    """add the recent posts of a newly followed account to the follower's home timeline"""
+    if is_fanout_exempt(author_id):
+        return
+    home_timelines.push_entries((user_id,), author_timelines.entries(author_id))
+
+
+@shared_task
+def remove_author_from_timeline(user_id, author_id):
+    """remove the posts of an unfollowed or blocked account from a home timeline"""
+    home_timelines.remove((user_id,), [post_id for post_id, score in author_timelines.entries(author_id)])
+
+
+@shared_task
+def refresh_explore():
+    """recompute the explore ranking, run periodically by celery beat"""
+    from . import explore
+
+    return explore.refresh_explore()
+
+
+@shared_task
+def remove_post_from_tag_indexes(post_id, tag_id):
+    """remove an untagged or deleted post from the recent and top indexes of a tag"""
+    tag_timelines.remove((tag_id,), (post_id,))
+    tag_top_posts.remove((tag_id,), (post_id,))
+
+
+@shared_task
+def refresh_top_tag_posts():
+    """recompute the top index of every tag visited recently, run periodically by celery beat"""
+    for tag_id in tag_top_posts.built_owners():
+        tag_top_posts.rebuild(tag_id)
+
+
+@shared_task
+def merge_tag_cooccurrence():
+    """add the recently tagged posts to the tag co-occurrence index, run periodically by celery beat"""
+    from . import cooccurrence
+
+    return cooccurrence.merge_log()
+
+
+@shared_task
+def rebuild_tag_cooccurrence():
+    """recompute the tag co-occurrence index from the database, correcting edited and deleted posts"""
+    from . import cooccurrence
+
+    return cooccurrence.rebuild()
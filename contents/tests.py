@@ -1,3 +1,452 @@
-from django.test import TestCase
+import asyncio
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import AsyncClient, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from activities.models import Like
+from contents import cooccurrence, explore, trending
+from contents.models import Post, Tag
+from contents.ranking import score_candidates
+from contents.seen import mark_seen, seen_post_ids
+from contents.tasks import merge_tag_cooccurrence, refresh_top_tag_posts
+from contents.timelines import home_timelines, author_timelines, is_fanout_exempt, read_feed
+from custom_lib.testing import RedisTestCase
+from relations.models import BlockRelation, FollowRelation
+
+
+class FeedTimelineTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.viewer, self.author = self.create_user('viewer'), self.create_user('author')
+        self.follow(self.viewer, self.author)
+        self.client = self.client_for(self.viewer)
+
+    def feed_ids(self, url='/contents/feed/'):
+        return [post['id'] for post in self.walk(self.client, url)]
+
+    def test_new_posts_are_fanned_out_to_built_timelines(self):
+        home_timelines.ensure(self.viewer.id)
+        post = self.create_post(self.author)
+
+        self.assertIsNotNone(self.redis.zscore(home_timelines.key(self.viewer.id), post.id))
+        self.assertEqual(self.feed_ids(), [post.id])
+
+    def test_first_page_and_next_cursor(self):
+        posts = [self.create_post(self.author, f'post {i}') for i in range(25)]
+
+        response = self.client.get('/contents/feed/')
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertIsNotNone(response.data['next'])
+
+        next_page = self.client.get(response.data['next'])
+        self.assertIsNone(next_page.data['next'])
+
+        ids = [post['id'] for post in response.data['results'] + next_page.data['results']]
+        self.assertEqual(ids, [post.id for post in reversed(posts)])
+
+    def test_cursor_is_stable_while_posts_arrive(self):
+        posts = [self.create_post(self.author) for i in range(25)]
+        response = self.client.get('/contents/feed/')
+        self.create_post(self.author)
+
+        next_page = self.client.get(response.data['next'])
+        self.assertEqual([post['id'] for post in next_page.data['results']], [post.id for post in posts[4::-1]])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/contents/feed/?cursor=nope').status_code, 404)
+
+    def test_deleted_posts_leave_the_timeline(self):
+        kept, deleted = self.create_post(self.author), self.create_post(self.author)
+        self.assertEqual(self.feed_ids(), [deleted.id, kept.id])
+
+        deleted.delete()
+        self.assertEqual(self.feed_ids(), [kept.id])
+
+    def test_unfollow_and_follow(self):
+        post = self.create_post(self.author)
+        self.assertEqual(self.feed_ids(), [post.id])
+
+        FollowRelation.objects.get(from_user=self.viewer, to_user=self.author).delete()
+        self.assertEqual(self.feed_ids(), [])
+
+        self.follow(self.viewer, self.author)
+        self.assertEqual(self.feed_ids(), [post.id])
+
+    def test_pending_follow_requests_are_not_fanned_out(self):
+        private = self.create_user('private', is_private=True)
+        self.follow(self.viewer, private, accepted=False)
+        self.create_post(private)
+
+        self.assertEqual(self.feed_ids(), [])
+
+    def test_blocks_in_both_directions(self):
+        other = self.create_user('other')
+        self.follow(self.viewer, other)
+        post = self.create_post(self.author)
+        other_post = self.create_post(other)
+        self.assertEqual(self.feed_ids(), [other_post.id, post.id])
+
+        BlockRelation.objects.create(blocker=self.author, blocked=self.viewer)
+        self.assertEqual(self.feed_ids(), [other_post.id])
+
+        BlockRelation.objects.create(blocker=self.viewer, blocked=other)
+        self.assertEqual(self.feed_ids(), [])
+
+    def test_search_falls_back_to_the_database(self):
+        other = self.create_user('other')
+        self.follow(self.viewer, other)
+        post = self.create_post(self.author)
+        self.create_post(other)
+
+        self.assertEqual(self.feed_ids('/contents/feed/?search=auth'), [post.id])
+
+
+@override_settings(FEED_FANOUT_FOLLOWER_THRESHOLD=1)
+class HybridFanoutTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.viewer = self.create_user('viewer')
+        self.regular, self.popular = self.create_user('regular'), self.create_user('popular')
+        self.follow(self.viewer, self.regular)
+        self.follow(self.viewer, self.popular)
+        self.follow(self.create_user('fan'), self.popular)
+
+    def test_posts_of_popular_authors_are_merged_at_read_time(self):
+        self.client_for(self.viewer).get('/contents/feed/')
+        posts = []
+        for i in range(15):
+            posts += [self.create_post(self.regular), self.create_post(self.popular)]
+
+        self.assertTrue(is_fanout_exempt(self.popular.id))
+        self.assertFalse(is_fanout_exempt(self.regular.id))
+        self.assertIsNone(self.redis.zscore(home_timelines.key(self.viewer.id), posts[-1].id))
+
+        # the k-way merge keeps the order across pages, without duplicates
+        ids = [post['id'] for post in self.walk(self.client_for(self.viewer), '/contents/feed/')]
+        self.assertEqual(ids, [post.id for post in reversed(posts)])
+
+    def test_read_feed_merges_by_creation_time(self):
+        first = self.create_post(self.popular)
+        second = self.create_post(self.regular)
+        third = self.create_post(self.popular)
+
+        entries = read_feed(self.viewer.id, count=2)
+        self.assertEqual([post_id for post_id, score in entries], [third.id, second.id])
+        entries = read_feed(self.viewer.id, before=(entries[-1][1], entries[-1][0]), count=2)
+        self.assertEqual([post_id for post_id, score in entries], [first.id])
+
+    def test_authors_falling_under_the_threshold_are_fanned_out(self):
+        self.create_post(self.popular)
+        home_timelines.ensure(self.viewer.id)
+        FollowRelation.objects.get(from_user__username='fan').delete()
+
+        post = self.create_post(self.popular)
+
+        self.assertFalse(is_fanout_exempt(self.popular.id))
+        self.assertIsNotNone(self.redis.zscore(home_timelines.key(self.viewer.id), post.id))
+
+
+class RankedFeedTests(RedisTestCase):
+    def features(self, **overrides):
+        features = {
+            'post_id': np.array([1, 2, 3]),
+            'author_id': np.array([1, 2, 3]),
+            'created_at': np.array([1000.0, 1000.0, 1000.0]),
+            'likes': np.zeros(3),
+            'comments': np.zeros(3),
+            'is_video': np.zeros(3),
+            'affinity': np.zeros(3),
+        }
+        features.update(overrides)
+        return features
+
+    def test_recency_and_engagement(self):
+        order = score_candidates(self.features(created_at=np.array([0.0, 36000.0, 72000.0])), 72000.0)
+        self.assertEqual(order.tolist(), [2, 1, 0])
+
+        order = score_candidates(self.features(likes=np.array([0.0, 50.0, 0.0])), 1000.0)
+        self.assertEqual(order[0], 1)
+
+    def test_author_diversity(self):
+        features = self.features(author_id=np.array([1, 1, 2]), likes=np.array([10.0, 10.0, 5.0]))
+        self.assertEqual(score_candidates(features, 1000.0).tolist(), [0, 2, 1])
+
+    def test_no_candidates(self):
+        features = {name: np.array([]) for name in self.features()}
+        self.assertEqual(len(score_candidates(features, 0.0)), 0)
+
+    def test_ranked_pages_cover_the_feed_once(self):
+        viewer, author = self.create_user('viewer'), self.create_user('author')
+        self.follow(viewer, author)
+        posts = [self.create_post(author) for i in range(25)]
+        Like.objects.create(user=viewer, post=posts[0])
+
+        client = self.client_for(viewer)
+        response = client.get('/contents/feed/?ranking=relevance')
+        self.assertEqual(response.data['results'][0]['id'], posts[0].id)
+
+        ids = [post['id'] for post in self.walk(client, '/contents/feed/?ranking=relevance')]
+        self.assertCountEqual(ids, [post.id for post in posts])
+        self.assertEqual(client.get('/contents/feed/?ranking=relevance&cursor=bm9wZTow').status_code, 404)
+
+
+class FeedQueryTests(RedisTestCase):
+    def test_feed_for(self):
+        viewer = self.create_user('viewer')
+        followed, requested = self.create_user('followed'), self.create_user('requested', is_private=True)
+        inactive, blocker = self.create_user('inactive'), self.create_user('blocker')
+        self.follow(viewer, followed)
+        self.follow(viewer, requested, accepted=False)
+        for user in (inactive, blocker):
+            self.follow(viewer, user)
+        post = self.create_post(followed)
+        for user in (requested, inactive, blocker, self.create_user('stranger')):
+            self.create_post(user)
+        inactive.is_active = False
+        inactive.save()
+        BlockRelation.objects.create(blocker=blocker, blocked=viewer)
+
+        self.assertEqual(list(Post.objects.feed_for(viewer)), [post])
+
+
+class FeedUpdatesTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.viewer, self.author = self.create_user('viewer'), self.create_user('author')
+        self.follow(self.viewer, self.author)
+        self.headers = {'Authorization': f'JWT {AccessToken.for_user(self.viewer)}'}
+
+    def test_count_since_head(self):
+        self.create_post(self.author)
+
+        async def check():
+            client = AsyncClient()
+            response = (await client.get('/contents/feed/updates/', headers=self.headers)).json()
+            self.assertEqual(response['count'], 0)
+
+            await asyncio.to_thread(self.create_post, self.author)
+            await asyncio.to_thread(self.create_post, self.author)
+            updates = await client.get('/contents/feed/updates/', {'since': response['head']}, headers=self.headers)
+            self.assertEqual(updates.json()['count'], 2)
+            self.assertGreater(updates.json()['head'], response['head'])
+
+            self.assertEqual((await AsyncClient().get('/contents/feed/updates/')).status_code, 401)
+
+        asyncio.run(check())
+
+    def test_stream_sends_an_event_id_once_there_is_a_head(self):
+        async def check():
+            response = await AsyncClient().get('/contents/feed/updates/stream/', headers=self.headers)
+            events = response.streaming_content.__aiter__()
+            self.assertTrue((await events.__anext__()).startswith(b'retry: '))
+
+            post = await asyncio.to_thread(self.create_post, self.author)
+            self.assertTrue((await events.__anext__()).startswith(b'event: new-posts\ndata: {"count": 1'))
+
+            since = author_timelines.entries(self.author.id)[0][1]
+            response = await AsyncClient().get(
+                '/contents/feed/updates/stream/', headers={**self.headers, 'Last-Event-ID': str(since)}
+            )
+            events = response.streaming_content.__aiter__()
+            await events.__anext__()
+            await asyncio.to_thread(self.create_post, self.author)
+            self.assertTrue((await events.__anext__()).startswith(f'id: {since}\nevent: new-posts\n'.encode()))
+            return post
+
+        with override_settings(FEED_UPDATES_POLL_INTERVAL=0.01):
+            asyncio.run(check())
+
+
+class SeenPostsTests(RedisTestCase):
+    def test_hide_and_last(self):
+        viewer, author = self.create_user('viewer'), self.create_user('author')
+        self.follow(viewer, author)
+        posts = [self.create_post(author) for i in range(4)]
+        client = self.client_for(viewer)
+
+        response = client.post('/contents/seen/', {'posts': [posts[3].id, posts[1].id]}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        hidden = client.get('/contents/feed/?seen=hide').data['results']
+        self.assertEqual([post['id'] for post in hidden], [posts[2].id, posts[0].id])
+        last = client.get('/contents/feed/?seen=last').data['results']
+        self.assertEqual([post['id'] for post in last], [posts[2].id, posts[0].id, posts[3].id, posts[1].id])
+
+    def test_containers_are_capped(self):
+        with override_settings(FEED_SEEN_MAX_CONTAINERS=2):
+            mark_seen(1, [1, 70000, 140000])
+
+        self.assertEqual(seen_post_ids(1, [1, 70000, 140000, 2]), {70000, 140000})
+
+
+class InlineExecutor:
+    def submit(self, fn, *args, **kwargs):
+        fn(*args, **kwargs)
+
+
+@override_settings(PREFETCH_ENABLED=True)
+class PrefetchTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('custom_lib.prefetch.get_executor', return_value=InlineExecutor())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.viewer, self.author = self.create_user('viewer'), self.create_user('author')
+        self.follow(self.viewer, self.author)
+        self.posts = [self.create_post(self.author) for i in range(25)]
+        self.client = self.client_for(self.viewer)
+
+    def test_next_page_is_served_from_the_prefetch(self):
+        from custom_lib.prefetch import prefetch_report
+
+        first = self.client.get('/contents/feed/')
+        second = self.client.get(first.data['next'])
+
+        self.assertEqual([post['id'] for post in second.data['results']], [post.id for post in self.posts[4::-1]])
+        self.assertEqual(prefetch_report()['FeedViewSet']['hits'], 1)
+
+    def test_likes_drop_prefetched_pages(self):
+        first = self.client.get('/contents/feed/')
+        self.client.put(f'/activities/posts/{self.posts[0].id}/like/')
+
+        second = self.client.get(first.data['next'])
+        self.assertTrue(second.data['results'][-1]['has_liked'])
+
+
+class ExploreTests(RedisTestCase):
+    def test_ranking_skips_followed_blocked_and_private_authors(self):
+        viewer = self.create_user('viewer')
+        authors = {name: self.create_user(name) for name in ('public', 'followed', 'blocked', 'quiet')}
+        authors['private'] = self.create_user('private', is_private=True)
+        self.follow(viewer, authors['followed'])
+        BlockRelation.objects.create(blocker=authors['blocked'], blocked=viewer)
+        likers = [self.create_user(f'liker{i}') for i in range(3)]
+
+        posts = {}
+        for name, author in authors.items():
+            posts[name] = self.create_post(author)
+            if name != 'quiet':
+                for liker in likers:
+                    Like.objects.create(user=liker, post=posts[name])
+        # a second, less liked post of the same author
+        other = self.create_post(authors['public'])
+        Like.objects.create(user=likers[0], post=other)
+
+        client = self.client_for(viewer)
+        # the first visit starts the ranking and gets an empty page
+        self.assertEqual(client.get('/contents/explore/').data['results'], [])
+        self.assertIsNotNone(explore.current_explore_version())
+
+        ids = [post['id'] for post in self.walk(client, '/contents/explore/')]
+        self.assertEqual(ids, [posts['public'].id, other.id])
+
+    def test_pages_keep_the_ranking_they_started_with(self):
+        viewer, liker = self.create_user('viewer'), self.create_user('liker')
+        posts = []
+        for i in range(25):
+            posts.append(self.create_post(self.create_user(f'author{i}')))
+            Like.objects.create(user=liker, post=posts[-1])
+        explore.refresh_explore()
+
+        client = self.client_for(viewer)
+        response = client.get('/contents/explore/')
+        explore.refresh_explore()
+        next_page = client.get(response.data['next'])
+
+        ids = [post['id'] for post in response.data['results'] + next_page.data['results']]
+        self.assertCountEqual(ids, [post.id for post in posts])
+
+
+class TagPostsTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.viewer = self.create_user('viewer')
+        self.public = self.create_user('public')
+        self.private = self.create_user('private', is_private=True)
+        self.client = self.client_for(self.viewer)
+
+    def tag_ids(self, query=''):
+        tag = Tag.objects.get(name='cat')
+        return [post['id'] for post in self.walk(self.client, f'/contents/tags/{tag.id}/posts/?{query}')]
+
+    def test_recent_posts_visible_to_the_viewer(self):
+        posts = [self.create_post(self.public, f'#cat {i}') for i in range(25)]
+        self.create_post(self.private, '#cat hidden')
+
+        self.assertEqual(self.tag_ids(), [post.id for post in reversed(posts)])
+
+        self.follow(self.viewer, self.private)
+        self.assertEqual(len(self.tag_ids()), 26)
+
+        posts[-1].delete()
+        self.assertEqual(len(self.tag_ids()), 25)
+
+    def test_top_posts(self):
+        posts = [self.create_post(self.public, f'#cat {i}') for i in range(3)]
+        self.assertEqual(self.tag_ids('ranking=top')[0], posts[2].id)
+
+        for liker in [self.create_user(f'liker{i}') for i in range(5)]:
+            Like.objects.create(user=liker, post=posts[0])
+        refresh_top_tag_posts()
+        self.assertEqual(self.tag_ids('ranking=top')[0], posts[0].id)
+
+    def test_unknown_tag(self):
+        self.assertEqual(self.client.get('/contents/tags/nope/posts/').status_code, 404)
+
+
+class TrendingTagsTests(RedisTestCase):
+    def test_most_used_tags_first(self):
+        user = self.create_user('user')
+        for i in range(25):
+            self.create_post(user, f'#hot #tag{i}')
+        for i in range(3):
+            self.create_post(user, '#warm')
+
+        hot = Tag.objects.get(name='hot')
+        self.assertGreaterEqual(trending.estimate_tag_uses(hot.id), 25)
+
+        client = self.client_for(user)
+        response = client.get('/contents/tags/?ordering=trending')
+        self.assertEqual([tag['name'] for tag in response.data['results'][:2]], ['hot', 'warm'])
+        names = [tag['name'] for tag in self.walk(client, '/contents/tags/?ordering=trending')]
+        self.assertEqual(len(names), len(set(names)))
+        self.assertEqual(len(names), 27)
+
+    def test_heavy_hitters_are_capped(self):
+        with override_settings(TRENDING_TOP_SIZE=5):
+            trending.record_tag_uses(range(100))
+        self.assertEqual(self.redis.zcard(trending.top_key(trending.current_bucket())), 5)
+
+
+class TagCooccurrenceTests(RedisTestCase):
+    def test_related_tags_and_similar_posts(self):
+        user = self.create_user('user')
+        post = self.create_post(user, '#cat #cute')
+        similar = self.create_post(user, '#cat #cute #fluffy')
+        self.create_post(user, '#cat #dog')
+        self.create_post(user, '#other')
+        merge_tag_cooccurrence()
+
+        client = self.client_for(user)
+        cute = Tag.objects.get(name='cute')
+        names = [tag['name'] for tag in client.get(f'/contents/tags/{cute.id}/related/').data]
+        self.assertEqual(names[:2], ['cat', 'fluffy'])
+        self.assertNotIn('other', names)
+
+        response = client.get(f'/contents/user/posts/{post.id}/similar/')
+        self.assertEqual(response.data[0]['id'], similar.id)
+
+    def test_rebuild_matches_the_merged_index(self):
+        user = self.create_user('user')
+        for caption in ('#a #b', '#a #c', '#b #c #d'):
+            self.create_post(user, caption)
+        merge_tag_cooccurrence()
+        merged = cooccurrence.read_stored()
+
+        cooccurrence.rebuild()
+        rebuilt = cooccurrence.read_stored()
+        self.assertEqual((merged[0] != rebuilt[0]).nnz, 0)
+        self.assertEqual(list(merged[2]), list(rebuilt[2]))
@@ -0,0 +1,364 @@
+import heapq
+import time
+
+import numpy as np
+from django.conf import settings
+
+from custom_lib.redis_client import get_redis_connection
+
+# push a post into an index only if the index has been built, keeping it capped
+# and aligned with the ttl of its "built" flag
+PUSH_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -tonumber(ARGV[3]) - 1)
+local ttl = redis.call('PTTL', KEYS[2])
+if ttl > 0 then
+    redis.call('PEXPIRE', KEYS[1], ttl)
+end
+return 1
+"""
+
+
+def post_score(created_at):
+    """timeline score of a post, newer posts rank higher"""
+    return created_at.timestamp()
+
+
+class PostIndex:
+    """
+    a capped redis sorted set of post ids scored by creation time, one per owner (a follower, an author...).
+    `loader` returns (post_id, value) pairs turned into scores by `score`, the creation time by default.
+
+    an index is built lazily from the database by `loader` the first time it is read and is kept up to
+    date afterwards by `push` and `remove`. pushes to an index that has not been built are dropped,
+    the next read rebuilds it from the database instead.
+    """
+
+    def __init__(self, prefix, loader, size=None, ttl=None, score=post_score):
+        self.prefix = prefix
+        self.loader = loader
+        self.size = size or settings.FEED_TIMELINE_SIZE
+        self.ttl = int((ttl or settings.FEED_TIMELINE_TTL).total_seconds())
+        self.score = score
+
+    def key(self, owner_id):
+        return f'{self.prefix}:{owner_id}'
+
+    def built_key(self, owner_id):
+        return f'{self.prefix}:{owner_id}:built'
+
+    @property
+    def connection(self):
+        return get_redis_connection()
+
+    def ensure(self, owner_id):
+        """build the index of `owner_id` from the database unless it is already built"""
+        self.ensure_many((owner_id,))
+
+    def ensure_many(self, owner_ids):
+        """build the indexes of `owner_ids` that are not built yet"""
+        conn = self.connection
+
+        # refresh the ttl of built indexes, so only inactive owners expire
+        pipe = conn.pipeline(transaction=False)
+        for owner_id in owner_ids:
+            pipe.expire(self.built_key(owner_id), self.ttl)
+            pipe.expire(self.key(owner_id), self.ttl)
+        built = pipe.execute()[::2]
+
+        for owner_id, is_built in zip(owner_ids, built):
+            if not is_built:
+                self.build(owner_id)
+
+    def build(self, owner_id):
+        """load the index of `owner_id` from the database"""
+        conn = self.connection
+
+        # raise the flag before loading, pushes made while loading are kept
+        conn.set(self.built_key(owner_id), 1, ex=self.ttl)
+        entries = self.load(owner_id)
+
+        pipe = conn.pipeline()
+        if entries:
+            pipe.zadd(self.key(owner_id), entries)
+            pipe.zremrangebyrank(self.key(owner_id), 0, -self.size - 1)
+        pipe.expire(self.key(owner_id), self.ttl)
+        pipe.execute()
+
+    def rebuild(self, owner_id):
+        """replace a built index with a fresh load from the database, keeping its ttl"""
+        conn = self.connection
+        ttl = conn.pttl(self.built_key(owner_id))
+        if ttl <= 0:
+            return
+
+        entries = self.load(owner_id)
+        pipe = conn.pipeline()
+        pipe.delete(self.key(owner_id))
+        if entries:
+            pipe.zadd(self.key(owner_id), entries)
+        pipe.pexpire(self.key(owner_id), ttl)
+        pipe.execute()
+
+    def load(self, owner_id):
+        return {post_id: self.score(value) for post_id, value in self.loader(owner_id, self.size)}
+
+    def built_owners(self):
+        """ids of the owners whose index is built"""
+        pattern = self.built_key('*')
+        return [int(key.decode().split(':')[-2]) for key in self.connection.scan_iter(match=pattern, count=1000)]
+
+    def push(self, owner_ids, post_id, score):
+        """add a post to the already built indexes of `owner_ids`"""
+        pipe = self.connection.pipeline(transaction=False)
+        for owner_id in owner_ids:
+            self._push(pipe, owner_id, post_id, score)
+        pipe.execute()
+
+    def push_entries(self, owner_ids, entries):
+        """add (post_id, score) entries to the already built indexes of `owner_ids`"""
+        pipe = self.connection.pipeline(transaction=False)
+        for owner_id in owner_ids:
+            for post_id, score in entries:
+                self._push(pipe, owner_id, post_id, score)
+        pipe.execute()
+
+    def _push(self, pipe, owner_id, post_id, score):
+        script = self.connection.register_script(PUSH_SCRIPT)
+        script(keys=(self.key(owner_id), self.built_key(owner_id)), args=(score, post_id, self.size), client=pipe)
+
+    def remove(self, owner_ids, post_ids):
+        """remove posts from the indexes of `owner_ids`"""
+        post_ids = list(post_ids)
+        if not post_ids:
+            return
+
+        pipe = self.connection.pipeline(transaction=False)
+        for owner_id in owner_ids:
+            pipe.zrem(self.key(owner_id), *post_ids)
+        pipe.execute()
+
+    def entries(self, owner_id):
+        """all (post_id, score) entries in the index of `owner_id`"""
+        self.ensure(owner_id)
+        entries = self.connection.zrange(self.key(owner_id), 0, -1, withscores=True)
+        return [(int(post_id), score) for post_id, score in entries]
+
+    def page(self, owner_id, before=None, count=20):
+        """
+        return up to `count` (post_id, score) entries ordered newest first, strictly older than the
+        `before` (score, post_id) position.
+        """
+        return self.pages((owner_id,), before, count)[0]
+
+    def pages(self, owner_ids, before=None, count=20):
+        """read the same page window from the indexes of several owners in one round trip"""
+        self.ensure_many(owner_ids)
+
+        pipe = self.connection.pipeline(transaction=False)
+        for owner_id in owner_ids:
+            queue_range(pipe, self.key(owner_id), before, count)
+        results = iter(pipe.execute())
+
+        # each range is read by one command, or two when a cursor is given
+        commands = 1 if before is None else 2
+        return [collect_range([next(results) for _ in range(commands)], before, count) for _ in owner_ids]
+
+
+def queue_range(pipe, key, before, count):
+    """queue the commands reading a page of a post index, ties on the score are broken by post id"""
+    if before is None:
+        pipe.zrevrangebyscore(key, '+inf', '-inf', start=0, num=count, withscores=True)
+    else:
+        score, post_id = before
+        pipe.zrevrangebyscore(key, score, score, withscores=True)
+        pipe.zrevrangebyscore(key, f'({score}', '-inf', start=0, num=count, withscores=True)
+
+
+def collect_range(results, before, count):
+    """turn the results of `queue_range` into (post_id, score) entries ordered newest first"""
+    entries = [(int(member), member_score) for result in results for member, member_score in result]
+    if before is not None:
+        entries = [entry for entry in entries if entry[1] < before[0] or entry[0] < before[1]]
+
+    entries.sort(key=entry_position, reverse=True)
+    return entries[:count]
+
+
+def entry_position(entry):
+    """the (score, post_id) position of a timeline entry"""
+    post_id, score = entry
+    return score, post_id
+
+
+def _load_home_timeline(user_id, size):
+    """recent posts of the accounts `user_id` follows"""
+    from .models import Post
+
+    return Post.objects.feed_for(user_id).order_by('-created_at').values_list('id', 'created_at')[:size]
+
+
+def _load_author_posts(author_id, size):
+    """recent posts of `author_id`"""
+    from .models import Post
+
+    return Post.objects.filter(user_id=author_id).order_by('-created_at').values_list('id', 'created_at')[:size]
+
+
+def _load_tag_posts(tag_id, size):
+    """recent posts tagged with `tag_id`"""
+    from .models import Post
+
+    return Post.objects.filter(tags__tag_id=tag_id).order_by('-created_at').values_list('id', 'created_at')[:size]
+
+
+def _load_top_tag_posts(tag_id, size):
+    """
+    the recent posts tagged with `tag_id` that gather engagement the fastest, scored by their position.
+    redis orders equal scores by member bytes rather than by post id, so scores are kept distinct.
+    """
+    from activities.counters import post_counters
+    from .models import Post
+    from .ranking import engagement_velocity
+
+    candidates = list(
+        Post.objects.filter(tags__tag_id=tag_id).order_by('-created_at').values_list('id', 'created_at')
+        [:settings.TAG_TOP_CANDIDATES]
+    )
+    post_ids = [post_id for post_id, created_at in candidates]
+    counters = post_counters.get_many(post_ids)
+
+    now = time.time()
+    age_hours = np.array([max(now - created_at.timestamp(), 0) / 3600 for _, created_at in candidates])
+    scores = engagement_velocity(
+        np.array([counters[post_id]['like_count'] for post_id in post_ids], dtype=np.float64),
+        np.array([counters[post_id]['comment_count'] for post_id in post_ids], dtype=np.float64),
+        age_hours,
+        settings.TAG_TOP_WEIGHTS
+    )
+
+    best = np.argsort(-scores, kind='stable')[:size]
+    return [(post_ids[i], len(best) - position) for position, i in enumerate(best.tolist())]
+
+
+# the materialized home feed of each user
+home_timelines = PostIndex('timeline', _load_home_timeline)
+
+# recent posts of each author, used to backfill and clean up home timelines
+# and to merge the posts of high-follower authors into feeds at read time
+author_timelines = PostIndex('author', _load_author_posts)
+
+# recent posts of each tag, pushed as posts get tagged
+tag_timelines = PostIndex('tag', _load_tag_posts)
+
+# posts of each tag ranked by engagement velocity, recomputed periodically while the tag is visited
+tag_top_posts = PostIndex(
+    'tag-top', _load_top_tag_posts, size=settings.TAG_TOP_SIZE, ttl=settings.TAG_TOP_TTL, score=float
+)
+
+# authors with more followers than FEED_FANOUT_FOLLOWER_THRESHOLD, their posts are not fanned out
+FANOUT_EXEMPT_AUTHORS_KEY = 'timeline:fanout-exempt'
+
+
+def is_fanout_exempt(author_id):
+    return bool(get_redis_connection().sismember(FANOUT_EXEMPT_AUTHORS_KEY, author_id))
+
+
+def set_fanout_exempt(author_id, exempt):
+    """flag or unflag an author as exempt from fan-out, return whether the flag changed"""
+    conn = get_redis_connection()
+    if exempt:
+        return bool(conn.sadd(FANOUT_EXEMPT_AUTHORS_KEY, author_id))
+    return bool(conn.srem(FANOUT_EXEMPT_AUTHORS_KEY, author_id))
+
+
+def followed_exempt_authors(user_id):
+    """the fan-out exempt authors `user_id` follows"""
+    from relations.models import FollowRelation
+
+    exempt_ids = [int(author_id) for author_id in get_redis_connection().smembers(FANOUT_EXEMPT_AUTHORS_KEY)]
+    if not exempt_ids:
+        return []
+
+    return list(FollowRelation.objects.filter(
+        from_user_id=user_id, to_user_id__in=exempt_ids, is_accepted=True
+    ).values_list('to_user_id', flat=True))
+
+
+def read_feed(user_id, before=None, count=20):
+    """
+    read a page of the home feed of `user_id`: the precomputed timeline k-way merged by creation time
+    with the recent posts of the high-follower authors the user follows.
+    """
+    page = home_timelines.page(user_id, before, count)
+
+    author_ids = followed_exempt_authors(user_id)
+    if not author_ids:
+        return page
+
+    merged = heapq.merge(page, *author_timelines.pages(author_ids, before, count), key=entry_position, reverse=True)
+
+    entries, seen = [], set()
+    for entry in merged:
+        if entry[0] not in seen:
+            seen.add(entry[0])
+            entries.append(entry)
+            if len(entries) == count:
+                break
+    return entries
+
+
+def feed_updates(user_id, since=None, author_ids=()):
+    """
+    return the number of feed posts newer than the `since` score and the score of the newest feed post,
+    the head of the feed. this only reads the built timeline and author indexes, one round trip.
+    """
+    keys = [home_timelines.key(user_id)] + [author_timelines.key(author_id) for author_id in author_ids]
+
+    pipe = get_redis_connection().pipeline(transaction=False)
+    for key in keys:
+        pipe.zrevrange(key, 0, 0, withscores=True)
+        if since is not None:
+            pipe.zcount(key, f'({since}', '+inf')
+    results = pipe.execute()
+
+    step = 1 if since is None else 2
+    heads = [result[0][1] for result in results[::step] if result]
+    count = sum(results[1::2]) if since is not None else 0
+    return count, max(heads, default=None)
+
+
+def read_visible(index, owner_id, user, before=None, count=20):
+    """
+    read a page of a shared post index (a tag...) keeping only the posts `user` is allowed to see.
+    the index is read further until the page is full, visibility is checked by primary key in one query per read.
+    """
+    from .models import Post
+
+    entries = []
+    while len(entries) < count:
+        page = index.page(owner_id, before, count)
+        visible = set(
+            Post.objects.filter(id__in=[post_id for post_id, score in page]).visible_to(user)
+            .values_list('id', flat=True)
+        )
+        entries += [entry for entry in page if entry[0] in visible]
+
+        if len(page) < count:
+            break
+        before = entry_position(page[-1])
+    return entries[:count]
+
+
+def hydrate_posts(post_ids):
+    """load the posts for a list of ids in one query, keeping the order of `post_ids`"""
+    from .models import Post
+
+    posts = Post.objects.filter(
+        id__in=post_ids, user__is_active=True
+    ).select_related('user', 'location').prefetch_related('media').in_bulk()
+
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
@@ -0,0 +1,103 @@
+import time
+from hashlib import blake2b
+
+from django.conf import settings
+
+from custom_lib.redis_client import get_redis_connection
+
+# count a tag use in the count-min sketch of a bucket and keep the tag in the bucket's heavy hitters
+# if its estimated count ranks among the TRENDING_TOP_SIZE best. one saturating 32-bit counter is
+# incremented per sketch row, the estimate is the smallest of them.
+RECORD_SCRIPT = """
+local args = {'OVERFLOW', 'SAT'}
+for i = 5, #ARGV do
+    table.insert(args, 'INCRBY')
+    table.insert(args, 'u32')
+    table.insert(args, '#' .. ARGV[i])
+    table.insert(args, ARGV[2])
+end
+local counts = redis.call('BITFIELD', KEYS[1], unpack(args))
+local estimate = counts[1]
+for i = 2, #counts do
+    estimate = math.min(estimate, counts[i])
+end
+
+redis.call('ZADD', KEYS[2], estimate, ARGV[1])
+redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -tonumber(ARGV[3]) - 1)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+return estimate
+"""
+
+
+def current_bucket(now=None):
+    return int((now or time.time()) // settings.TRENDING_BUCKET.total_seconds())
+
+
+def sketch_key(bucket):
+    return f'trending:sketch:{bucket}'
+
+
+def top_key(bucket):
+    return f'trending:top:{bucket}'
+
+
+def sketch_cells(tag_id):
+    """the counter of `tag_id` in each row of the sketch, as indexes into the flat array of counters"""
+    depth, width = settings.TRENDING_SKETCH_DEPTH, settings.TRENDING_SKETCH_WIDTH
+    digest = blake2b(str(tag_id).encode(), digest_size=4 * depth).digest()
+    return [
+        row * width + int.from_bytes(digest[row * 4:row * 4 + 4], 'little') % width
+        for row in range(depth)
+    ]
+
+
+def record_tag_uses(tag_ids, amount=1):
+    """count a use of each of `tag_ids` in the current time bucket, one round trip"""
+    if not tag_ids:
+        return
+
+    conn = get_redis_connection()
+    script = conn.register_script(RECORD_SCRIPT)
+    bucket = current_bucket()
+    ttl = int(settings.TRENDING_BUCKET.total_seconds()) * (settings.TRENDING_WINDOW_BUCKETS + 1)
+
+    pipe = conn.pipeline(transaction=False)
+    for tag_id in tag_ids:
+        script(
+            keys=(sketch_key(bucket), top_key(bucket)),
+            args=(tag_id, amount, settings.TRENDING_TOP_SIZE, ttl, *sketch_cells(tag_id)),
+            client=pipe
+        )
+    pipe.execute()
+
+
+def estimate_tag_uses(tag_id, bucket=None):
+    """estimated number of uses of `tag_id` in a time bucket, never lower than the real count"""
+    cells = sketch_cells(tag_id)
+    args = [arg for cell in cells for arg in ('GET', 'u32', f'#{cell}')]
+    counts = get_redis_connection().execute_command('BITFIELD', sketch_key(bucket or current_bucket()), *args)
+    return min(counts)
+
+
+def trending_tags():
+    """
+    (tag_id, score) of the current trending tags, best first: the heavy hitters of the buckets in the
+    window, each older bucket weighted down by TRENDING_DECAY. the result is cached for TRENDING_CACHE_TTL.
+    """
+    conn = get_redis_connection()
+    bucket = current_bucket()
+    key = f'trending:tags:{bucket}'
+
+    if not conn.exists(key):
+        weights = {
+            top_key(bucket - age): settings.TRENDING_DECAY ** age for age in range(settings.TRENDING_WINDOW_BUCKETS)
+        }
+        pipe = conn.pipeline()
+        pipe.zunionstore(key, weights)
+        pipe.zremrangebyrank(key, 0, -settings.TRENDING_TOP_SIZE - 1)
+        pipe.expire(key, int(settings.TRENDING_CACHE_TTL.total_seconds()))
+        pipe.execute()
+
+    entries = [(int(tag_id), score) for tag_id, score in conn.zrange(key, 0, -1, withscores=True)]
+    return sorted(entries, key=lambda entry: (entry[1], entry[0]), reverse=True)
@@ -11,6 +11,14 @@ user_post_list = views.UserPostViewSet.as_view(
     {'get': 'list', 'post': 'create'}
 )
 
+user_post_similar = views.UserPostViewSet.as_view(
+    {'get': 'similar'}
+)
+
+tag_related = views.TagViewSet.as_view(
+    {'get': 'related'}
+)
+
 post_comment_detail = views.PostCommentViewSet.as_view(
     {'get': 'retrieve', 'put': 'update', 'delete': 'destroy', 'post': 'create'}
 )
@@ -35,6 +43,7 @@ post_save_list = views.PostSaveViewSet.as_view(
 router = DefaultRouter()
 router.register('tags', views.TagViewSet, basename='tag')
 router.register('feed', views.FeedViewSet, basename='feed')
+router.register('explore', views.ExploreViewSet, basename='explore')
 router.register('posts', views.UserPostViewSet, 'user-posts')
 
 tags_router = routers.NestedDefaultRouter(router, 'tags', lookup='tag')
@@ -42,10 +51,15 @@ tags_router.register('posts', views.TagPostsViewSet, basename='tag-posts')
 
 
 urlpatterns = [
+    path('feed/updates/', views.feed_updates_view, name='feed-updates'),
+    path('feed/updates/stream/', views.feed_updates_stream_view, name='feed-updates-stream'),
+    path('seen/', views.SeenPostsAPIView.as_view(), name='seen-posts'),
+    path('tags/<int:pk>/related/', tag_related, name='tag-related'),
     path('', include(router.urls)),
     path('', include(tags_router.urls)),
     path('<str:username>/posts/', user_post_list, name='user-post-list'),
     path('<str:username>/posts/<int:pk>/', user_post_detail, name='user-post-detail'),
+    path('<str:username>/posts/<int:pk>/similar/', user_post_similar, name='user-post-similar'),
     path('<str:username>/posts/<int:post_id>/comments/', post_comment_list, name='post-comment-list'),
     path('<str:username>/posts/<int:post_id>/comments/<int:pk>/', post_comment_detail, name='post-comment-detail'),
     path('<str:username>/posts/<int:post_id>/likes/', post_like_list, name='post-like-list'),
@@ -1,20 +1,67 @@
-from django.db.models import Q
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import CreateAPIView
+from rest_framework.mixins import ListModelMixin
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.viewsets import GenericViewSet, ModelViewSet
 from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
 
 from activities.models import Comment, Like, Save
 from activities.serializers import CommentCreateLightSerializer, CommentUpdateSerializer, \
     CommentDetailSerializer, CommentListLightSerializer, LikeListSerializer, LikeCreateLightSerializer, \
     SaveListSerializer, SaveCreateLightSerializer
+from contents.cooccurrence import related_tags, similar_posts
+from contents.explore import current_explore_version, read_explore, excluded_authors
 from contents.models import Tag, Post
-from contents.serializers import TagSerializer, PostSerializer, PostCreateSerializer
+from contents.pagination import TimelineCursorPagination, SnapshotCursorPagination
+from contents.ranking import rank_feed, snapshot_key
+from contents.seen import seen_post_ids
+from contents.serializers import TagSerializer, PostSerializer, PostCreateSerializer, SeenPostsSerializer
+from contents.snapshots import read_snapshot
+from contents.tasks import refresh_explore
+from contents.timelines import read_feed, read_visible, hydrate_posts, home_timelines, tag_timelines, \
+    tag_top_posts, followed_exempt_authors, feed_updates, entry_position
+from contents.trending import trending_tags
+from custom_lib.authentication import aauthenticate
+from custom_lib.prefetch import PrefetchNextPageMixin
+from custom_lib.query_planner import QueryPlannerMixin
+from custom_lib.viewer import get_viewer
+from users.resolvers import resolve_username
 from custom_lib.common_permissions import IsAdminOrReadOnly, ReadOnly, CanViewUserPermission, IsOwnerOrReadOnly
-from relations.models import BlockRelation, FollowRelation
 
 
-class TagViewSet(ModelViewSet):
+class SeenPostsMixin:
+    """
+    `?seen=hide` drops the posts the user has already seen from each page of the list,
+    `?seen=last` keeps them but moves them after the unseen ones.
+    """
+
+    def arrange_seen(self, posts):
+        mode = self.request.query_params.get('seen')
+        if mode not in ('hide', 'last'):
+            return posts
+
+        seen = seen_post_ids(self.request.user.id, [post.id for post in posts])
+        unseen_posts = [post for post in posts if post.id not in seen]
+        if mode == 'hide':
+            return unseen_posts
+        return unseen_posts + [post for post in posts if post.id in seen]
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        return self.arrange_seen(page) if page is not None else None
+
+
+class TagViewSet(QueryPlannerMixin, ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
@@ -24,8 +71,34 @@ class TagViewSet(ModelViewSet):
     permission_classes = (IsAuthenticated, IsAdminOrReadOnly)
     search_fields = ('name__istartswith',)
 
+    def list(self, request, *args, **kwargs):
+        """`?ordering=trending` lists the tags used the most lately, read from the trending counters"""
+        if request.query_params.get('ordering') != 'trending':
+            return super().list(request, *args, **kwargs)
+
+        trending = trending_tags()
+
+        def fetch(before, count):
+            return [entry for entry in trending if before is None or entry_position(entry) < before][:count]
+
+        paginator = TimelineCursorPagination()
+        entries = paginator.paginate_entries(fetch, request)
+        tags = Tag.objects.in_bulk([tag_id for tag_id, score in entries])
+
+        serializer = self.get_serializer([tags[tag_id] for tag_id, score in entries if tag_id in tags], many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def related(self, request, *args, **kwargs):
+        """the tags most often used together with this one, read from the tag co-occurrence index"""
+        tag = self.get_object()
+        tag_ids = [tag_id for tag_id, score in related_tags(tag.id, _limit(request))]
+        tags = Tag.objects.in_bulk(tag_ids)
 
-class TagPostsViewSet(ModelViewSet):
+        serializer = self.get_serializer([tags[tag_id] for tag_id in tag_ids if tag_id in tags], many=True)
+        return Response(serializer.data)
+
+
+class TagPostsViewSet(SeenPostsMixin, QueryPlannerMixin, ModelViewSet):
     serializer_class = PostSerializer
 
     ordering = ('-created_at',)
@@ -39,28 +112,37 @@ class TagPostsViewSet(ModelViewSet):
         retrieves posts that contain a specific tag while considering the user's visibility permissions
         and relationships, including follow status and blocking.
         """
-        tag_id = self.kwargs['tag_pk']
-        user = self.request.user
+        return Post.objects.filter(tags__tag_id=self.get_tag_id()).visible_to(self.request.user)
 
-        # filter posts that are tagged with the specific tag
-        queryset = Post.objects.filter(tags__tag_id=tag_id)
+    def get_tag_id(self):
+        try:
+            return int(self.kwargs['tag_pk'])
+        except ValueError:
+            raise NotFound()
 
-        # filter posts based on visibility and follow relationship
-        queryset = queryset.filter(
-            Q(user=user) |
-            Q(user__followers__from_user=user, user__followers__is_accepted=True) |
-            Q(user__is_private=False)
-        ).distinct()
+    def list(self, request, *args, **kwargs):
+        """
+        serve the tag's posts from its precomputed index, the most recent first or the top ones with
+        `?ranking=top`, keeping those the user is allowed to see. searching and custom ordering fall back
+        to querying the posts table.
+        """
+        if not settings.FEED_TIMELINE_ENABLED or {'search', 'ordering'} & set(request.query_params):
+            return super().list(request, *args, **kwargs)
 
-        # exclude posts from blocked users and accounts that have blocked the user
-        blocked_users = BlockRelation.objects.filter(blocker=user).values_list('blocked', flat=True)
-        blocker_users = BlockRelation.objects.filter(blocked=user).values_list('blocker', flat=True)
-        queryset = queryset.exclude(user_id__in=blocked_users).exclude(user_id__in=blocker_users)
+        tag_id = self.get_tag_id()
+        index = tag_top_posts if request.query_params.get('ranking') == 'top' else tag_timelines
 
-        return queryset
+        paginator = TimelineCursorPagination()
+        entries = paginator.paginate_entries(
+            lambda before, count: read_visible(index, tag_id, request.user, before, count), request
+        )
+        posts = self.arrange_seen(hydrate_posts([post_id for post_id, score in entries]))
 
+        serializer = self.get_serializer(posts, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
-class FeedViewSet(ModelViewSet):
+
+class FeedViewSet(SeenPostsMixin, PrefetchNextPageMixin, QueryPlannerMixin, ModelViewSet):
     serializer_class = PostSerializer
 
     ordering = ('-created_at',)
@@ -70,16 +152,72 @@ class FeedViewSet(ModelViewSet):
     search_fields = ('user__username__istartswith',)
 
     def get_queryset(self):
-        user = self.request.user
+        return Post.objects.feed_for(self.request.user)
+
+    def list_page(self, request, *args, **kwargs):
+        """
+        serve the feed from the user's precomputed home timeline, newest first or ranked by relevance
+        with `?ranking=relevance`. searching and custom ordering fall back to querying the posts table.
+        """
+        if not settings.FEED_TIMELINE_ENABLED or {'search', 'ordering'} & set(request.query_params):
+            return super().list_page(request, *args, **kwargs)
+
+        user_id = request.user.id
+        if request.query_params.get('ranking') == 'relevance':
+            paginator = SnapshotCursorPagination()
+            post_ids = paginator.paginate_snapshot(
+                lambda: rank_feed(user_id),
+                lambda snapshot_id, offset, count: read_snapshot(snapshot_key(user_id, snapshot_id), offset, count),
+                request
+            )
+        else:
+            paginator = TimelineCursorPagination()
+            entries = paginator.paginate_entries(lambda before, count: read_feed(user_id, before, count), request)
+            post_ids = [post_id for post_id, score in entries]
 
-        queryset = Post.objects.filter(
-            user__in=FollowRelation.objects.filter(from_user=user).values_list('to_user', flat=True)
+        posts = self.arrange_seen(hydrate_posts(post_ids))
+
+        serializer = self.get_serializer(posts, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class ExploreViewSet(SeenPostsMixin, PrefetchNextPageMixin, ListModelMixin, GenericViewSet):
+    serializer_class = PostSerializer
+
+    permission_classes = (IsAuthenticated, ReadOnly,)
+
+    def get_queryset(self):
+        return Post.objects.filter(user__is_private=False).visible_to(self.request.user)
+
+    def list_page(self, request, *args, **kwargs):
+        """
+        page through the precomputed explore ranking, skipping the posts of authors the user follows,
+        has blocked or is blocked by. the ranking is refreshed periodically by the refresh_explore task.
+        """
+        paginator = SnapshotCursorPagination()
+        # read once, the pointer may expire or move on between two reads
+        version = current_explore_version()
+        if 'cursor' not in request.query_params and version is None:
+            # nothing ranked yet, serve an empty page while the first ranking is computed
+            refresh_explore.delay()
+            paginator.base_url, paginator.has_next = request.build_absolute_uri(), False
+            return paginator.get_paginated_response([])
+
+        excluded = excluded_authors(request.user.id)
+        entries = paginator.paginate_snapshot(
+            lambda: version, read_explore, request,
+            keep=lambda entry: entry[1] not in excluded
         )
 
-        return queryset
+        # authors may have gone private since the ranking was computed
+        posts = hydrate_posts([post_id for post_id, author_id in entries])
+        posts = self.arrange_seen([post for post in posts if not post.user.is_private])
+
+        serializer = self.get_serializer(posts, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 
-class UserPostViewSet(ModelViewSet):
+class UserPostViewSet(QueryPlannerMixin, ModelViewSet):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
 
@@ -89,8 +227,11 @@ class UserPostViewSet(ModelViewSet):
     permission_classes = (IsAuthenticated, IsOwnerOrReadOnly, CanViewUserPermission)
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-        return queryset.filter(user__username=self.kwargs['username'])
+        user = resolve_username(self.request, self.kwargs['username'])
+        if user is None:
+            return Post.objects.none()
+
+        return super().get_queryset().filter(user_id=user.id)
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -101,8 +242,29 @@ class UserPostViewSet(ModelViewSet):
         # automatically set the user to the currently authenticated user
         serializer.save(user=self.request.user)
 
+    def similar(self, request, *args, **kwargs):
+        """recent posts sharing the most (rare) tags with this post, that the user is allowed to see"""
+        post = self.get_object()
+        count = _limit(request)
+
+        # over-fetch, some of the candidates may not be visible to the user
+        candidate_ids = similar_posts(post.id, post.tags.values_list('tag_id', flat=True), count * 3)
+        visible = set(Post.objects.filter(id__in=candidate_ids).visible_to(request.user).values_list('id', flat=True))
+        posts = hydrate_posts([post_id for post_id in candidate_ids if post_id in visible][:count])
+
+        serializer = self.get_serializer(posts, many=True)
+        return Response(serializer.data)
 
-class PostCommentViewSet(ModelViewSet):
+
+def _limit(request, default=10, maximum=50):
+    """the number of items asked for with `?limit`"""
+    try:
+        return min(max(int(request.query_params.get('limit', default)), 1), maximum)
+    except ValueError:
+        return default
+
+
+class PostCommentViewSet(QueryPlannerMixin, ModelViewSet):
     serializer_class = CommentListLightSerializer
 
     ordering = ('-created_at',)
@@ -113,14 +275,11 @@ class PostCommentViewSet(ModelViewSet):
 
     def get_queryset(self):
         post_id = self.kwargs['post_id']
-        user = self.request.user
 
         queryset = Comment.objects.filter(post=post_id, reply_to__isnull=True)
 
         # exclude comments from blocked users and accounts that have blocked the user
-        blocked_users = BlockRelation.objects.filter(blocker=user).values_list('blocked', flat=True)
-        blocker_users = BlockRelation.objects.filter(blocked=user).values_list('blocker', flat=True)
-        queryset = queryset.exclude(user_id__in=blocked_users).exclude(user_id__in=blocker_users)
+        queryset = queryset.exclude(user_id__in=get_viewer(self.request).hidden_ids)
 
         return queryset
 
@@ -145,7 +304,7 @@ class PostCommentViewSet(ModelViewSet):
         serializer.save(user=self.request.user, post=post)
 
 
-class PostLikeViewSet(ModelViewSet):
+class PostLikeViewSet(QueryPlannerMixin, ModelViewSet):
     serializer_class = LikeListSerializer
 
     ordering = ('-created_at',)
@@ -156,14 +315,11 @@ class PostLikeViewSet(ModelViewSet):
 
     def get_queryset(self):
         post_id = self.kwargs['post_id']
-        user = self.request.user
 
         queryset = Like.objects.filter(post=post_id)
 
         # exclude comments from blocked users and accounts that have blocked the user
-        blocked_users = BlockRelation.objects.filter(blocker=user).values_list('blocked', flat=True)
-        blocker_users = BlockRelation.objects.filter(blocked=user).values_list('blocker', flat=True)
-        queryset = queryset.exclude(user_id__in=blocked_users).exclude(user_id__in=blocker_users)
+        queryset = queryset.exclude(user_id__in=get_viewer(self.request).hidden_ids)
 
         return queryset
 
@@ -178,7 +334,7 @@ class PostLikeViewSet(ModelViewSet):
         return context
 
 
-class PostSaveViewSet(ModelViewSet):
+class PostSaveViewSet(QueryPlannerMixin, ModelViewSet):
     serializer_class = SaveListSerializer
 
     ordering = ('-created_at',)
@@ -189,14 +345,11 @@ class PostSaveViewSet(ModelViewSet):
 
     def get_queryset(self):
         post_id = self.kwargs['post_id']
-        user = self.request.user
 
         queryset = Save.objects.filter(post=post_id)
 
         # exclude comments from blocked users and accounts that have blocked the user
-        blocked_users = BlockRelation.objects.filter(blocker=user).values_list('blocked', flat=True)
-        blocker_users = BlockRelation.objects.filter(blocked=user).values_list('blocker', flat=True)
-        queryset = queryset.exclude(user_id__in=blocked_users).exclude(user_id__in=blocker_users)
+        queryset = queryset.exclude(user_id__in=get_viewer(self.request).hidden_ids)
 
         return queryset
 
@@ -209,3 +362,90 @@ class PostSaveViewSet(ModelViewSet):
         context = super().get_serializer_context()
         context['post_id'] = self.kwargs['post_id']
         return context
+
+
+class SeenPostsAPIView(CreateAPIView):
+    serializer_class = SeenPostsSerializer
+
+    permission_classes = (IsAuthenticated,)
+
+
+def _parse_since(value):
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _prepare_feed_updates(user_id):
+    """build the user's timeline if needed and return the fan-out exempt authors merged into it"""
+    home_timelines.ensure(user_id)
+    return followed_exempt_authors(user_id)
+
+
+async def feed_updates_view(request):
+    """
+    number of feed posts newer than the `since` head, and the current head of the feed.
+    with `wait` (seconds) the request is held as a long-poll until new posts arrive or the wait is over.
+    only the redis timelines are read, so polling never touches the posts table.
+    """
+    user = await aauthenticate(request)
+    if user is None:
+        return JsonResponse({'detail': _('Authentication credentials were not provided.')}, status=401)
+
+    since = _parse_since(request.GET.get('since'))
+    try:
+        wait = min(max(float(request.GET.get('wait', 0)), 0), settings.FEED_UPDATES_MAX_WAIT)
+    except ValueError:
+        wait = 0
+
+    author_ids = await sync_to_async(_prepare_feed_updates)(user.id)
+    deadline = time.monotonic() + wait
+    while True:
+        count, head = await sync_to_async(feed_updates)(user.id, since, author_ids)
+        if count or since is None or time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(settings.FEED_UPDATES_POLL_INTERVAL)
+
+    # the head is a number, or null while the feed is empty
+    return JsonResponse({'count': count, 'head': head if head is not None else since})
+
+
+async def feed_updates_stream_view(request):
+    """
+    server-sent events stream of the number of feed posts newer than the `since` head (or the
+    `Last-Event-ID` of a reconnecting client). an event is sent whenever the count changes.
+    """
+    user = await aauthenticate(request)
+    if user is None:
+        return JsonResponse({'detail': _('Authentication credentials were not provided.')}, status=401)
+
+    since = _parse_since(request.headers.get('Last-Event-ID') or request.GET.get('since'))
+    author_ids = await sync_to_async(_prepare_feed_updates)(user.id)
+
+    async def events():
+        nonlocal since
+        if since is None:
+            count, since = await sync_to_async(feed_updates)(user.id, None, author_ids)
+
+        yield f'retry: {settings.FEED_UPDATES_POLL_INTERVAL * 1000:.0f}\n\n'
+        last_count, last_event = 0, time.monotonic()
+        # streams are closed after a while, clients reconnect with their Last-Event-ID
+        deadline = time.monotonic() + settings.FEED_UPDATES_STREAM_DURATION
+        while time.monotonic() < deadline:
+            # on an empty feed every post is new, there is no head to resume from yet
+            count, head = await sync_to_async(feed_updates)(user.id, since if since is not None else 0, author_ids)
+            if count != last_count:
+                data = json.dumps({'count': count, 'head': head})
+                event_id = f'id: {since}\n' if since is not None else ''
+                yield f'{event_id}event: new-posts\ndata: {data}\n\n'
+                last_count, last_event = count, time.monotonic()
+            elif time.monotonic() - last_event > settings.FEED_UPDATES_HEARTBEAT:
+                yield ': keep-alive\n\n'
+                last_event = time.monotonic()
+            await asyncio.sleep(settings.FEED_UPDATES_POLL_INTERVAL)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
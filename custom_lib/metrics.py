@@ -0,0 +1,29 @@
+from custom_lib.redis_client import get_redis_connection
+
+
+def _key(namespace):
+    return f'metrics:{namespace}'
+
+
+def incr(namespace, name, amount=1):
+    """increment a counter shared by all processes"""
+    if isinstance(amount, float):
+        get_redis_connection().hincrbyfloat(_key(namespace), name, amount)
+    else:
+        get_redis_connection().hincrby(_key(namespace), name, amount)
+
+
+def set_value(namespace, name, value):
+    """set a gauge shared by all processes"""
+    get_redis_connection().hset(_key(namespace), name, value)
+
+
+def get_metrics(namespace):
+    """all counters and gauges of a namespace"""
+    values = get_redis_connection().hgetall(_key(namespace))
+    return {name.decode(): float(value) for name, value in sorted(values.items())}
+
+
+def namespaces():
+    """namespaces that have recorded metrics"""
+    return sorted(key.decode().split(':', 1)[1] for key in get_redis_connection().scan_iter(match=_key('*')))
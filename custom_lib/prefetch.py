@@ -0,0 +1,137 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from copy import copy
+from hashlib import md5
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection
+from django.http import QueryDict
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from custom_lib import metrics
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """the pool of threads computing next pages, started on first use so only web processes get one"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.PREFETCH_WORKERS, thread_name_prefix='prefetch')
+    return _executor
+
+
+def viewer_epoch_key(user_id):
+    return f'prefetch:epoch:{user_id}'
+
+
+def forget_prefetched(user_ids):
+    """drop the pages prefetched for `user_ids` after they liked, saved or unliked a post"""
+    epoch = time.time_ns()
+    cache.set_many({viewer_epoch_key(user_id): epoch for user_id in user_ids}, timeout=None)
+
+
+class PrefetchNextPageMixin:
+    """
+    speculative prefetch for cursor paginated lists. once a page is served, the next page is computed in a
+    background thread and cached under its cursor for PREFETCH_TTL, so following the `next` link is a cache
+    hit. hits, misses, stored pages and the time spent prefetching are recorded in the `prefetch` metrics.
+
+    prefetched pages are keyed on the viewer's relationship epoch and on their own epoch, bumped by their
+    likes and saves, so a page computed before a block, a follow or a like is never served.
+    """
+    is_prefetching = False
+
+    def list(self, request, *args, **kwargs):
+        """serve the page from the prefetch cache if it is there, otherwise compute it with `list_page`"""
+        if self.is_prefetching or not settings.PREFETCH_ENABLED:
+            return self.list_page(request, *args, **kwargs)
+
+        name = self.get_prefetch_name()
+        key = self.get_prefetch_key(request.get_full_path(), self.get_viewer_epochs())
+        data = cache.get(key)
+        if data is not None:
+            cache.delete(key)
+            metrics.incr('prefetch', f'{name}.hits')
+            response = Response(data)
+        else:
+            metrics.incr('prefetch', f'{name}.misses')
+            response = self.list_page(request, *args, **kwargs)
+
+        paginated = response.status_code == 200 and isinstance(response.data, dict)
+        next_link = response.data.get('next') if paginated else None
+        if next_link:
+            get_executor().submit(self.prefetch, next_link, args, kwargs)
+        return response
+
+    def list_page(self, request, *args, **kwargs):
+        """compute a page of the list, views that don't paginate a queryset override this"""
+        return super().list(request, *args, **kwargs)
+
+    def get_prefetch_name(self):
+        return self.__class__.__name__
+
+    def get_viewer_epochs(self):
+        from relations.visibility import epoch_key
+
+        user_id = self.request.user.id
+        epochs = cache.get_many((epoch_key(user_id), viewer_epoch_key(user_id)))
+        return epochs.get(epoch_key(user_id)), epochs.get(viewer_epoch_key(user_id))
+
+    def get_prefetch_key(self, full_path, epochs):
+        digest = md5(f'{full_path}:{epochs}'.encode()).hexdigest()
+        return f'prefetch:{self.get_prefetch_name()}:{self.request.user.id}:{digest}'
+
+    def prefetch(self, next_link, args, kwargs):
+        """compute the page behind `next_link` like the current request would and cache it"""
+        name = self.get_prefetch_name()
+        started = time.perf_counter()
+        close_old_connections()
+        try:
+            # read before computing, a change made meanwhile leaves the page under a stale key
+            epochs = self.get_viewer_epochs()
+            url = urlsplit(next_link)
+            django_request = copy(self.request._request)
+            django_request.GET = QueryDict(url.query)
+            django_request.META = {**django_request.META, 'QUERY_STRING': url.query}
+
+            request = Request(django_request)
+            request.user = self.request.user
+            request.auth = self.request.auth
+
+            # a copy of this view keeps its action and url kwargs, but gets its own paginator
+            view = copy(self)
+            view.__dict__.pop('_paginator', None)
+            view.request, view.headers = request, {}
+            view.is_prefetching = True
+
+            response = view.list(request, *args, **kwargs)
+            if response.status_code == 200:
+                timeout = settings.PREFETCH_TTL.total_seconds()
+                cache.set(self.get_prefetch_key(django_request.get_full_path(), epochs), response.data, timeout)
+                metrics.incr('prefetch', f'{name}.stored')
+        except Exception:
+            metrics.incr('prefetch', f'{name}.errors')
+        finally:
+            metrics.incr('prefetch', f'{name}.seconds', time.perf_counter() - started)
+            connection.close()
+
+
+def prefetch_report():
+    """hit rate and wasted work (pages prefetched but never requested) of each prefetching view"""
+    report = {}
+    for metric, value in metrics.get_metrics('prefetch').items():
+        name, counter = metric.rsplit('.', 1)
+        report.setdefault(name, {'hits': 0, 'misses': 0, 'stored': 0, 'errors': 0, 'seconds': 0})[counter] = value
+
+    for values in report.values():
+        requests = values['hits'] + values['misses']
+        values['hit_rate'] = values['hits'] / requests if requests else 0
+        values['wasted'] = max(values['stored'] - values['hits'], 0)
+    return report
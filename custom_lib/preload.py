@@ -0,0 +1,77 @@
+from functools import lru_cache
+
+from django.db.models.manager import BaseManager
+from rest_framework import serializers
+
+
+def preload(serializer, instances):
+    """
+    let `serializer` and the serializers nested in it load what they need for all `instances` at once,
+    through their `preload(instances)` method, before any instance is represented.
+    """
+    instances = [instance for instance in instances if instance is not None]
+    if not instances:
+        return
+
+    if hasattr(serializer, 'preload'):
+        serializer.preload(instances)
+
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+
+        if isinstance(field, serializers.ListSerializer):
+            if not _preloads(type(field.child)):
+                continue
+            nested = []
+            for instance in instances:
+                related = field.get_attribute(instance)
+                if isinstance(related, BaseManager):
+                    related = related.all()
+                    if related._result_cache is None:
+                        # not prefetched, its instances are loaded when represented
+                        continue
+                nested.extend(related or ())
+            preload(field.child, nested)
+        elif isinstance(field, serializers.BaseSerializer) and _preloads(type(field)):
+            preload(field, [field.get_attribute(instance) for instance in instances])
+
+
+@lru_cache(maxsize=None)
+def _preloads(serializer_class):
+    """whether a serializer or one of the serializers nested in it has a `preload` method"""
+    if hasattr(serializer_class, 'preload'):
+        return True
+
+    for field in serializer_class().fields.values():
+        child = field.child if isinstance(field, serializers.ListSerializer) else field
+        if isinstance(child, serializers.BaseSerializer) and not field.write_only and _preloads(type(child)):
+            return True
+    return False
+
+
+class PreloadListSerializer(serializers.ListSerializer):
+    """a list serializer preloading the data of the whole list, set as `Meta.list_serializer_class`"""
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, BaseManager) else data)
+        preload(self.child, items)
+        return super().to_representation(items)
+
+
+class PreloadMixin:
+    """
+    serializers reading values loaded in bulk by their `preload(instances)` method, falling back to
+    loading them for the single instance being represented when the serializer is not used in a list.
+    """
+
+    def preload_values(self, name, instances, load):
+        """store the {pk: value} mapping `load(instances)` returns as the `name` values"""
+        self.__dict__.setdefault('_preloaded', {}).setdefault(name, {}).update(load(instances))
+
+    def preloaded(self, name, instance, load):
+        """the `name` value of `instance`, loaded with `load([instance])` if it was not preloaded"""
+        values = self.__dict__.setdefault('_preloaded', {}).setdefault(name, {})
+        if instance.pk not in values:
+            values.update(load([instance]))
+        return values.get(instance.pk)
@@ -0,0 +1,207 @@
+"""
+the query planner derives from a serializer's field tree what its querysets should load, so a list is
+represented in a bounded number of queries whatever its length.
+
+forward relations are joined with `select_related`, reverse and many to many relations (and whatever is
+reached through them) are prefetched with `prefetch_related`, and for lists only the columns the fields read
+are loaded with `only()`. the planner can't see inside method fields: a serializer with method fields lists
+the model fields they read as `Meta.read_fields`, a path ending on a relation reading its key only.
+without it every column of its model is loaded.
+"""
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import QuerySet
+from rest_framework import serializers
+from rest_framework.filters import OrderingFilter
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import PrimaryKeyRelatedField
+
+ALL_COLUMNS = None
+
+
+class QueryPlan:
+    """the relations to join and prefetch and the columns read, of a model and the models joined to it"""
+
+    def __init__(self, model):
+        self.select_related = set()
+        self.prefetch_related = set()
+        # {relation path: columns read there or ALL_COLUMNS}, '' being the model itself
+        self.columns = {'': set()}
+        self.models = {'': model}
+
+    def read(self, path, column):
+        if self.columns.setdefault(path, set()) is not ALL_COLUMNS:
+            self.columns[path].add(column)
+
+    def read_all(self, path):
+        self.columns[path] = ALL_COLUMNS
+
+    def join(self, path, model, prefetched):
+        if prefetched:
+            self.prefetch_related.add(path)
+        else:
+            self.select_related.add(path)
+            self.columns.setdefault(path, set())
+            self.models[path] = model
+
+    def apply(self, queryset):
+        """`queryset` joining and prefetching the planned relations"""
+        if self.select_related:
+            queryset = queryset.select_related(*sorted(self.select_related))
+        prefetch = self.prefetch_related.difference(queryset._prefetch_related_lookups)
+        if prefetch:
+            queryset = queryset.prefetch_related(*sorted(prefetch))
+        return queryset
+
+    def only(self, queryset, columns=()):
+        """`queryset` deferring the columns the plan doesn't read, `columns` of the model being read anyway"""
+        joined = queryset.query.select_related
+        if joined is True:
+            # joins of every relation, the plan can't tell what they read
+            return queryset
+
+        if any(path not in self.models for path in _paths(joined)):
+            # a relation joined by the view, the plan doesn't know what is read there
+            return queryset
+        if all(self.columns[path] is ALL_COLUMNS for path in self.models):
+            return queryset
+
+        fields = set()
+        for path, model in self.models.items():
+            level = self.columns[path]
+            names = {field.name for field in model._meta.concrete_fields} if level is ALL_COLUMNS else level
+            names = names | {model._meta.pk.name}
+            if not path:
+                names = names | {name for name in columns if _concrete_field(model, name)}
+            fields.update(f'{path}__{name}' if path else name for name in names)
+        return queryset.only(*sorted(fields))
+
+
+def _paths(joined, prefix=''):
+    """the relation paths of a `query.select_related` tree"""
+    for name, nested in (joined or {}).items():
+        path = f'{prefix}__{name}' if prefix else name
+        yield path
+        yield from _paths(nested, path)
+
+
+def _concrete_field(model, name):
+    try:
+        return model._meta.get_field(name).concrete
+    except FieldDoesNotExist:
+        return False
+
+
+def _model_field(model, attr):
+    """the model field an attribute reads, `get_<field>_display` reading <field>"""
+    if attr.startswith('get_') and attr.endswith('_display'):
+        attr = attr[4:-8]
+    try:
+        return model._meta.get_field(attr)
+    except FieldDoesNotExist:
+        return None
+
+
+def plan(serializer, model=None):
+    """the query plan of the instances of `model` (the serializer's `Meta.model` by default) `serializer` reads"""
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    model = model or serializer.Meta.model
+
+    query_plan = QueryPlan(model)
+    _plan_serializer(query_plan, serializer, model, '', False)
+    return query_plan
+
+
+@lru_cache(maxsize=None)
+def plan_for(serializer_class):
+    """the query plan of a serializer class, computed once"""
+    return plan(serializer_class())
+
+
+def _plan_serializer(query_plan, serializer, model, path, prefetched):
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+
+    read_fields = getattr(getattr(serializer, 'Meta', None), 'read_fields', None)
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.SerializerMethodField):
+            if read_fields is None:
+                query_plan.read_all(path)
+        elif field.source == '*':
+            if isinstance(field, serializers.BaseSerializer):
+                _plan_serializer(query_plan, field, model, path, prefetched)
+            else:
+                query_plan.read_all(path)
+        else:
+            _plan_source(query_plan, field, field.source_attrs, model, path, prefetched)
+
+    for name in read_fields or ():
+        _plan_source(query_plan, None, name.split('__'), model, path, prefetched)
+
+
+def _plan_source(query_plan, field, attrs, model, path, prefetched):
+    """plan the relations followed by the source `attrs` of `field` (`None` for a key read by a method field)"""
+    for index, attr in enumerate(attrs):
+        model_field = _model_field(model, attr)
+        if model_field is None:
+            # a property or a method of the model, anything may be read
+            query_plan.read_all(path)
+            return
+        if not model_field.is_relation:
+            query_plan.read(path, model_field.name)
+            return
+
+        last = index == len(attrs) - 1
+        if model_field.concrete and not model_field.many_to_many:
+            query_plan.read(path, model_field.name)
+            if last and (field is None or isinstance(field, PrimaryKeyRelatedField)):
+                # the key of the related object, stored on this model
+                return
+
+        path = f'{path}__{model_field.name}' if path else model_field.name
+        model = model_field.related_model
+        prefetched = prefetched or model_field.one_to_many or model_field.many_to_many
+        query_plan.join(path, model, prefetched)
+
+    if isinstance(field, serializers.BaseSerializer):
+        _plan_serializer(query_plan, field, model, path, prefetched)
+    elif not isinstance(getattr(field, 'child_relation', field), PrimaryKeyRelatedField):
+        # a related object represented by one of its methods, such as `__str__`
+        query_plan.read_all(path)
+
+
+class QueryPlannerMixin:
+    """
+    views loading what their serializer reads as planned from its field tree: for reads the relations it
+    follows are joined or prefetched, and the pages of a list load only the columns it reads.
+    """
+
+    def get_query_plan(self):
+        return plan_for(self.get_serializer_class())
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method in SAFE_METHODS and isinstance(queryset, QuerySet):
+            queryset = self.get_query_plan().apply(queryset)
+        return queryset
+
+    def paginate_queryset(self, queryset):
+        if self.request.method in SAFE_METHODS and isinstance(queryset, QuerySet):
+            # the fields the page is ordered by are read to build the cursors
+            ordering = self.get_page_ordering(queryset)
+            queryset = self.get_query_plan().only(queryset, [name.lstrip('-') for name in ordering])
+        return super().paginate_queryset(queryset)
+
+    def get_page_ordering(self, queryset):
+        """the fields a cursor paginator orders the page by: the ordering filter's choice, or its own ordering"""
+        ordering = None
+        for backend in self.filter_backends:
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(self.request, queryset, self)
+                break
+        ordering = ordering or getattr(self.paginator, 'ordering', None) or ()
+        return (ordering,) if isinstance(ordering, str) else ordering
@@ -0,0 +1,12 @@
+import redis
+from django.conf import settings
+
+_connection = None
+
+
+def get_redis_connection():
+    """return the process-wide redis client used for feeds, counters and other derived data"""
+    global _connection
+    if _connection is None:
+        _connection = redis.Redis.from_url(settings.REDIS_URL)
+    return _connection
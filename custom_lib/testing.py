@@ -0,0 +1,62 @@
+from unittest import mock
+
+import fakeredis
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from aura.celery import app
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    PREFETCH_ENABLED=False,
+)
+class RedisTestCase(TransactionTestCase):
+    """
+    tests against a fresh in-memory redis and cache, with celery tasks run eagerly. transactions commit
+    for real so the work deferred with `transaction.on_commit` (fan-out, counters...) runs as in production.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch('custom_lib.redis_client._connection', self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        eager = app.conf.task_always_eager
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', eager)
+        cache.clear()
+
+    @staticmethod
+    def client_for(user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    @staticmethod
+    def create_user(username, **kwargs):
+        from users.models import User
+        return User.objects.create_user(username=username, email=f'{username}@example.com', password='x', **kwargs)
+
+    @staticmethod
+    def follow(from_user, to_user, accepted=True):
+        from relations.models import FollowRelation
+        return FollowRelation.objects.create(from_user=from_user, to_user=to_user, is_accepted=accepted)
+
+    @staticmethod
+    def create_post(user, caption='post'):
+        from contents.models import Post
+        return Post.objects.create(user=user, caption=caption)
+
+    def walk(self, client, url):
+        """the results of every page of a cursor paginated list, following the next links"""
+        results = []
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200, response.data)
+            results += response.data['results']
+            url = response.data['next']
+        return results
@@ -0,0 +1,83 @@
+from functools import cached_property
+
+from relations.blocks import block_sets
+from relations.models import FollowRelation
+from relations.visibility import cached_decision
+
+
+class ViewerContext:
+    """
+    the relationships of the requesting user, shared by the views, permissions and serializers of a request.
+    each set is loaded on first use, at most once per request.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.user_id = user.id if user.is_authenticated else None
+
+    @cached_property
+    def _blocks(self):
+        """(blocked ids, blocker ids), read from the block cache"""
+        if self.user_id is None:
+            return frozenset(), frozenset()
+        return block_sets(self.user_id)
+
+    @property
+    def blocked_ids(self):
+        """the users the viewer has blocked"""
+        return self._blocks[0]
+
+    @property
+    def blocker_ids(self):
+        """the users who have blocked the viewer"""
+        return self._blocks[1]
+
+    @cached_property
+    def hidden_ids(self):
+        """the users on either side of a block with the viewer"""
+        return self.blocked_ids | self.blocker_ids
+
+    @cached_property
+    def following_ids(self):
+        """the users the viewer follows with an accepted request"""
+        if self.user_id is None:
+            return frozenset()
+        return frozenset(
+            FollowRelation.objects.filter(from_user_id=self.user_id, is_accepted=True)
+            .order_by().values_list('to_user_id', flat=True)
+        )
+
+    def is_blocked(self, user_id):
+        """whether the viewer and `user_id` are separated by a block, in either direction"""
+        return user_id in self.hidden_ids
+
+    def follows(self, user_id):
+        return user_id in self.following_ids
+
+    def can_view(self, user):
+        """
+        whether the viewer may see the profile and posts of `user`: their own, or an active account not
+        separated from them by a block that is public or followed with an accepted request.
+        decisions are cached across requests until a relationship of either user changes.
+        """
+        if not user.is_active:
+            return False
+        if user.id == self.user_id:
+            return True
+        if self.user_id is None:
+            return self._can_view(user)
+        return cached_decision(self.user_id, user.id, lambda: self._can_view(user))
+
+    def _can_view(self, user):
+        if self.is_blocked(user.id):
+            return False
+        return not user.is_private or self.follows(user.id)
+
+
+def get_viewer(request):
+    """the viewer context of `request`, created on first use. accepts rest framework and plain django requests"""
+    request = getattr(request, '_request', request)
+    viewer = getattr(request, 'viewer', None)
+    if viewer is None or viewer.user is not request.user:
+        viewer = request.viewer = ViewerContext(request.user)
+    return viewer
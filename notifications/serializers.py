@@ -15,6 +15,7 @@ class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = ('notification_type', 'sender', 'post', 'is_read', 'time_since', 'created_at')
+        read_fields = ('created_at',)
 
     @staticmethod
     def get_time_since(obj):
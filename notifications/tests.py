@@ -1,3 +1,59 @@
-from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-# Create your tests here.
+from custom_lib.query_planner import plan_for
+from custom_lib.testing import RedisTestCase
+from notifications.models import Notification
+from notifications.serializers import NotificationSerializer
+
+
+class NotificationListTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('user')
+        self.client = self.client_for(self.user)
+
+    def notify(self, count):
+        for i in range(count):
+            sender = self.create_user(f'sender{Notification.objects.count()}')
+            Notification.objects.create(
+                sender=sender, receiver=self.user, notification_type=Notification.LIKE,
+                post=self.create_post(self.user)
+            )
+
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_pages_and_filters(self):
+        self.notify(25)
+        Notification.objects.create(
+            sender=self.user, receiver=self.create_user('other'), notification_type=Notification.LIKE
+        )
+        Notification.objects.filter(sender__username='sender0').update(is_read=True)
+
+        response = self.client.get('/notifications/')
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertEqual(len(self.walk(self.client, '/notifications/')), 25)
+        self.assertEqual(len(self.walk(self.client, '/notifications/?is_read=false')), 24)
+        self.assertEqual(len(self.walk(self.client, '/notifications/?ordering=created_at')), 25)
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        self.notify(2)
+        few = self.queries('/notifications/')
+        self.notify(18)
+        self.assertEqual(self.queries('/notifications/'), few)
+        self.assertEqual(self.queries('/notifications/?ordering=created_at'), few)
+
+    def test_only_the_columns_read_are_loaded(self):
+        query_plan = plan_for(NotificationSerializer)
+        self.assertEqual(query_plan.select_related, {'sender', 'post', 'post__location'})
+        self.assertEqual(query_plan.prefetch_related, {'post__media'})
+
+        self.notify(1)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/notifications/')
+        page, = (query['sql'] for query in queries if 'notifications_notification' in query['sql'])
+        self.assertNotIn('password', page)
+        self.assertIn('created_at', page)
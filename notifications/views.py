@@ -2,11 +2,13 @@ from rest_framework.generics import ListAPIView
 from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated
 
+from custom_lib.prefetch import PrefetchNextPageMixin
+from custom_lib.query_planner import QueryPlannerMixin
 from notifications.models import Notification
 from notifications.serializers import NotificationSerializer
 
 
-class NotificationListAPIView(ListAPIView):
+class NotificationListAPIView(PrefetchNextPageMixin, QueryPlannerMixin, ListAPIView):
     serializer_class = NotificationSerializer
 
     filterset_fields = ('notification_type', 'is_read')
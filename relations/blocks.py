@@ -0,0 +1,213 @@
+from django.conf import settings
+from django.db.models import Q
+from redis.exceptions import RedisError, WatchError
+
+from custom_lib.redis_client import get_redis_connection
+
+# count the change in the version of the user's sets, then add a member to, or remove it from, a block set
+# only if the sets of its user have been built, keeping the set aligned with the ttl of the "built" flag
+UPDATE_SCRIPT = """
+redis.call('INCR', KEYS[3])
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    return 0
+end
+redis.call(ARGV[1], KEYS[1], ARGV[2])
+local ttl = redis.call('PTTL', KEYS[2])
+if ttl > 0 then
+    redis.call('PEXPIRE', KEYS[1], ttl)
+end
+return 1
+"""
+
+
+def blocked_key(user_id):
+    """the users `user_id` has blocked"""
+    return f'blocks:{user_id}:out'
+
+
+def blockers_key(user_id):
+    """the users who have blocked `user_id`"""
+    return f'blocks:{user_id}:in'
+
+
+def built_key(user_id):
+    return f'blocks:{user_id}:built'
+
+
+def version_key(user_id):
+    """changes whenever a block of `user_id` is made or lifted, a build racing with one is not kept"""
+    return f'blocks:{user_id}:version'
+
+
+def load_block_sets(user_ids):
+    """{user_id: (blocked ids, blocker ids)} read from the database, one query"""
+    from relations.models import BlockRelation
+
+    user_ids = set(user_ids)
+    sets = {user_id: (set(), set()) for user_id in user_ids}
+    if not user_ids:
+        return sets
+
+    rows = BlockRelation.objects.filter(
+        Q(blocker_id__in=user_ids) | Q(blocked_id__in=user_ids)
+    ).order_by().values_list('blocker_id', 'blocked_id')
+
+    for blocker_id, blocked_id in rows:
+        if blocker_id in user_ids:
+            sets[blocker_id][0].add(blocked_id)
+        if blocked_id in user_ids:
+            sets[blocked_id][1].add(blocker_id)
+    return sets
+
+
+def build(user_id):
+    """
+    load the block sets of `user_id` from the database into redis, return them. the sets and the "built" flag
+    are written at once, readers never see the flag with sets still being written.
+    """
+    conn = get_redis_connection()
+    ttl = int(settings.BLOCK_CACHE_TTL.total_seconds())
+
+    version = conn.get(version_key(user_id))
+    blocked, blockers = load_block_sets((user_id,))[user_id]
+
+    with conn.pipeline() as pipe:
+        try:
+            pipe.watch(version_key(user_id))
+            if pipe.get(version_key(user_id)) != version:
+                # a block was made or lifted while loading, the next reader builds again
+                return blocked, blockers
+
+            pipe.multi()
+            for key, members in ((blocked_key(user_id), blocked), (blockers_key(user_id), blockers)):
+                if members:
+                    building_key = f'{key}:building'
+                    pipe.delete(building_key)
+                    pipe.sadd(building_key, *members)
+                    pipe.expire(building_key, ttl)
+                    pipe.rename(building_key, key)
+                else:
+                    pipe.delete(key)
+            pipe.set(built_key(user_id), 1, ex=ttl)
+            pipe.execute()
+        except WatchError:
+            pass
+    return blocked, blockers
+
+
+def block_sets(user_id):
+    """
+    (blocked ids, blocker ids) of `user_id`, read from redis and built from the database on first use.
+    the database is read directly while redis is unavailable.
+    """
+    try:
+        pipe = get_redis_connection().pipeline(transaction=False)
+        pipe.exists(built_key(user_id))
+        pipe.smembers(blocked_key(user_id))
+        pipe.smembers(blockers_key(user_id))
+        is_built, blocked, blockers = pipe.execute()
+        if not is_built:
+            blocked, blockers = build(user_id)
+    except RedisError:
+        blocked, blockers = load_block_sets((user_id,))[user_id]
+
+    return frozenset(int(member) for member in blocked), frozenset(int(member) for member in blockers)
+
+
+def is_blocked(user_id, other_id):
+    """whether either of the two users has blocked the other, two set lookups"""
+    return bool(blocked_among(user_id, (other_id,)))
+
+
+def blocked_among(user_id, user_ids):
+    """the ids among `user_ids` on either side of a block with `user_id`, one round trip to redis"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return set()
+
+    try:
+        pipe = get_redis_connection().pipeline(transaction=False)
+        pipe.exists(built_key(user_id))
+        pipe.smismember(blocked_key(user_id), user_ids)
+        pipe.smismember(blockers_key(user_id), user_ids)
+        is_built, blocked, blockers = pipe.execute()
+        if is_built:
+            return {other_id for other_id, out, into in zip(user_ids, blocked, blockers) if out or into}
+        blocked, blockers = build(user_id)
+    except RedisError:
+        blocked, blockers = load_block_sets((user_id,))[user_id]
+
+    return (blocked | blockers) & set(user_ids)
+
+
+def add_block(blocker_id, blocked_id):
+    """record a new block in the sets of both users, if they are built"""
+    _update('SADD', blocker_id, blocked_id)
+
+
+def remove_block(blocker_id, blocked_id):
+    """forget a deleted block in the sets of both users, if they are built"""
+    _update('SREM', blocker_id, blocked_id)
+
+
+def _update(command, blocker_id, blocked_id):
+    conn = get_redis_connection()
+    script = conn.register_script(UPDATE_SCRIPT)
+    pipe = conn.pipeline(transaction=False)
+    ttl = int(settings.BLOCK_CACHE_TTL.total_seconds())
+    script(
+        keys=(blocked_key(blocker_id), built_key(blocker_id), version_key(blocker_id)),
+        args=(command, blocked_id, ttl), client=pipe
+    )
+    script(
+        keys=(blockers_key(blocked_id), built_key(blocked_id), version_key(blocked_id)),
+        args=(command, blocker_id, ttl), client=pipe
+    )
+    try:
+        pipe.execute()
+    except RedisError:
+        # the block is committed already, the sets of both users are rebuilt from the database on next use
+        forget(blocker_id, blocked_id)
+
+
+def forget(*user_ids):
+    """drop the built flag of `user_ids`, their sets are rebuilt on next use, if redis can be reached"""
+    try:
+        get_redis_connection().delete(*(built_key(user_id) for user_id in user_ids))
+    except RedisError:
+        pass
+
+
+def built_users():
+    """ids of the users whose block sets are built"""
+    pattern = built_key('*')
+    return [int(key.decode().split(':')[1]) for key in get_redis_connection().scan_iter(match=pattern, count=1000)]
+
+
+def check_consistency(user_ids, fix=False):
+    """
+    compare the cached block sets of `user_ids` with the database and return the ids of the users whose
+    sets differ. with `fix` their sets are rebuilt.
+    """
+    user_ids = list(user_ids)
+    expected = load_block_sets(user_ids)
+
+    pipe = get_redis_connection().pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.exists(built_key(user_id))
+        pipe.smembers(blocked_key(user_id))
+        pipe.smembers(blockers_key(user_id))
+    results = pipe.execute()
+
+    inconsistent = []
+    for index, user_id in enumerate(user_ids):
+        is_built, blocked, blockers = results[index * 3:index * 3 + 3]
+        cached = ({int(member) for member in blocked}, {int(member) for member in blockers})
+        if is_built and cached != expected[user_id]:
+            inconsistent.append(user_id)
+
+    if fix:
+        for user_id in inconsistent:
+            build(user_id)
+    return inconsistent
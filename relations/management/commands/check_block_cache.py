@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from relations.blocks import built_users, check_consistency
+
+
+class Command(BaseCommand):
+    help = 'Compare the block sets cached in redis with the database, and rebuild the stale ones with --fix.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='rebuild the sets that differ from the database')
+        parser.add_argument('--batch-size', type=int, default=1000, help='users checked per database query')
+        parser.add_argument('users', nargs='*', type=int, help='ids of the users to check, every cached user by default')
+
+    def handle(self, *args, **options):
+        user_ids = options['users'] or built_users()
+        batch_size = options['batch_size']
+
+        inconsistent = []
+        for start in range(0, len(user_ids), batch_size):
+            inconsistent += check_consistency(user_ids[start:start + batch_size], fix=options['fix'])
+
+        if not inconsistent:
+            self.stdout.write(self.style.SUCCESS(f'The block sets of {len(user_ids)} users are consistent.'))
+            return
+
+        action = 'Rebuilt' if options['fix'] else 'Found'
+        self.stdout.write(self.style.WARNING(
+            f'{action} {len(inconsistent)} inconsistent block sets out of {len(user_ids)}: '
+            + ', '.join(map(str, inconsistent[:20])) + (' ...' if len(inconsistent) > 20 else '')
+        ))
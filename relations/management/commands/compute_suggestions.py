@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from relations.suggestions import compute_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Compute the people you may know of every user from a snapshot of the follow graph.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='processes to use, one per cpu by default')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = compute_suggestions(workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored suggestions for {count} users in {time.perf_counter() - started:.1f}s.'
+        ))
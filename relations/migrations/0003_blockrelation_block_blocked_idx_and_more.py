@@ -0,0 +1,25 @@
+# Generated by Django 4.2.15 on 2026-10-18 20:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relations', '0002_alter_blockrelation_blocked'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blockrelation',
+            index=models.Index(fields=['blocked', 'blocker'], name='block_blocked_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='followrelation',
+            index=models.Index(condition=models.Q(('is_accepted', True)), fields=['from_user', 'to_user'], name='follow_accepted_out_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='followrelation',
+            index=models.Index(condition=models.Q(('is_accepted', True)), fields=['to_user', 'from_user'], name='follow_accepted_in_idx'),
+        ),
+    ]
@@ -33,6 +33,15 @@ class FollowRelation(BaseModel):
         verbose_name_plural = _("follow relations")
         unique_together = ('from_user', 'to_user')
         ordering = ('-created_at',)
+        indexes = [
+            # accounts a user follows and followers of a user, counting only accepted requests
+            models.Index(
+                fields=('from_user', 'to_user'), condition=models.Q(is_accepted=True), name='follow_accepted_out_idx'
+            ),
+            models.Index(
+                fields=('to_user', 'from_user'), condition=models.Q(is_accepted=True), name='follow_accepted_in_idx'
+            ),
+        ]
 
 
 class BlockRelation(models.Model):
@@ -52,3 +61,7 @@ class BlockRelation(models.Model):
         verbose_name_plural = _("block relations")
         unique_together = ('blocker', 'blocked')
         ordering = ('-created_at',)
+        indexes = [
+            # users who blocked a user, the unique constraint covers the other direction
+            models.Index(fields=('blocked', 'blocker'), name='block_blocked_idx'),
+        ]
@@ -0,0 +1,296 @@
+"""
+propagation jobs apply a block or a (de)activation to the data derived from relationships,
+in the background so the request making the change stays fast.
+
+a job is a sequence of steps and each step works through its items in chunks of PROPAGATION_CHUNK_SIZE,
+one chunk per celery task. the position of a job is saved in redis after every chunk, and chunks are
+idempotent, so a job that is interrupted or runs a chunk twice resumes without harm.
+"""
+import json
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.db.models import Q
+
+from custom_lib import metrics
+from custom_lib.redis_client import get_redis_connection
+
+PENDING_KEY = 'propagation:pending'
+
+JOBS = {}
+
+
+def job_key(job_id):
+    return f'propagation:job:{job_id}'
+
+
+def lock_key(job_id):
+    return f'propagation:job:{job_id}:lock'
+
+
+def register(cls):
+    JOBS[cls.name] = cls
+    return cls
+
+
+class PropagationJob:
+    """
+    `steps` names the methods run in turn. a step receives the id of the last item it processed
+    (0 at first) and returns how many items it processed and the id to resume from, or `None` once done.
+    `still_applies` is checked before every chunk, a job whose trigger was undone meanwhile ends there.
+    """
+    name = None
+    steps = ()
+
+    def __init__(self, user_id, *args):
+        self.user_id = user_id
+        self.args = args
+
+    def still_applies(self):
+        return True
+
+    @property
+    def chunk_size(self):
+        return settings.PROPAGATION_CHUNK_SIZE
+
+    def chunk(self, queryset, cursor):
+        """the next chunk of a queryset ordered by id, and the cursor following it"""
+        items = list(queryset.filter(id__gt=cursor).order_by('id')[:self.chunk_size])
+        return items, items[-1].id if len(items) == self.chunk_size else None
+
+
+def _followers(user_id):
+    from relations.models import FollowRelation
+
+    return FollowRelation.objects.filter(to_user_id=user_id, is_accepted=True)
+
+
+def _is_active(user_id):
+    """whether the user is active, `None` if they no longer exist"""
+    from users.models import User
+
+    return User.objects.filter(id=user_id).values_list('is_active', flat=True).first()
+
+
+def _post_tags(user_id):
+    from contents.models import PostTag
+
+    return PostTag.objects.filter(post__user_id=user_id).select_related('post').only(
+        'id', 'tag_id', 'post__id', 'post__created_at'
+    )
+
+
+@register
+class BlockJob(PropagationJob):
+    """a block ends the follows between the two users and drops each one's posts from the other's home feed"""
+    name = 'block'
+    steps = ('delete_follows', 'clean_home_timelines')
+
+    def still_applies(self):
+        from relations.models import BlockRelation
+
+        # unblocked since, follows made after the unblock must stay
+        blocked_id, = self.args
+        return BlockRelation.objects.filter(blocker_id=self.user_id, blocked_id=blocked_id).exists()
+
+    def delete_follows(self, cursor):
+        from relations.models import FollowRelation
+
+        blocked_id, = self.args
+        # deleted row by row by the orm, the follow counters and timelines follow the delete signals
+        count = FollowRelation.objects.filter(
+            Q(from_user_id=self.user_id, to_user_id=blocked_id) | Q(from_user_id=blocked_id, to_user_id=self.user_id)
+        ).delete()[0]
+        return count, None
+
+    def clean_home_timelines(self, cursor):
+        from contents.tasks import remove_author_from_timeline
+
+        blocked_id, = self.args
+        remove_author_from_timeline(self.user_id, blocked_id)
+        remove_author_from_timeline(blocked_id, self.user_id)
+        return 2, None
+
+
+@register
+class DeactivateJob(PropagationJob):
+    """the posts of a deactivated user leave the home feeds of their followers and the tag indexes"""
+    name = 'deactivate'
+    steps = ('clean_home_timelines', 'clean_tag_indexes')
+
+    def still_applies(self):
+        return _is_active(self.user_id) is False
+
+    def clean_home_timelines(self, cursor):
+        from contents.timelines import author_timelines, home_timelines
+
+        follows, cursor = self.chunk(_followers(self.user_id), cursor)
+        post_ids = [post_id for post_id, score in author_timelines.entries(self.user_id)]
+        home_timelines.remove([follow.from_user_id for follow in follows], post_ids)
+        return len(follows), cursor
+
+    def clean_tag_indexes(self, cursor):
+        from contents.timelines import tag_timelines, tag_top_posts
+
+        post_tags, cursor = self.chunk(_post_tags(self.user_id), cursor)
+        for post_tag in post_tags:
+            tag_timelines.remove((post_tag.tag_id,), (post_tag.post_id,))
+            tag_top_posts.remove((post_tag.tag_id,), (post_tag.post_id,))
+        return len(post_tags), cursor
+
+
+@register
+class ReactivateJob(PropagationJob):
+    """the posts of a reactivated user return to the home feeds of their followers and the recent tag indexes"""
+    name = 'reactivate'
+    steps = ('restore_home_timelines', 'restore_tag_indexes')
+
+    def still_applies(self):
+        return _is_active(self.user_id) is True
+
+    def restore_home_timelines(self, cursor):
+        from contents.timelines import author_timelines, home_timelines, is_fanout_exempt
+
+        if is_fanout_exempt(self.user_id):
+            # their posts are merged into feeds at read time
+            return 0, None
+
+        follows, cursor = self.chunk(_followers(self.user_id), cursor)
+        home_timelines.push_entries([follow.from_user_id for follow in follows], author_timelines.entries(self.user_id))
+        return len(follows), cursor
+
+    def restore_tag_indexes(self, cursor):
+        from contents.timelines import tag_timelines, post_score
+
+        # the top indexes catch up on their next periodic refresh
+        post_tags, cursor = self.chunk(_post_tags(self.user_id), cursor)
+        for post_tag in post_tags:
+            tag_timelines.push((post_tag.tag_id,), post_tag.post_id, post_score(post_tag.post.created_at))
+        return len(post_tags), cursor
+
+
+def start_job(name, user_id, *args):
+    """record a new propagation job and queue its first chunk, return its id"""
+    from relations.tasks import run_propagation_job
+
+    job_id = uuid4().hex[:12]
+    created = time.time()
+
+    pipe = get_redis_connection().pipeline()
+    pipe.hset(job_key(job_id), mapping={
+        'name': name, 'args': json.dumps([user_id, *args]), 'created': created, 'touched': created,
+        'step': 0, 'cursor': 0, 'processed': 0,
+    })
+    pipe.zadd(PENDING_KEY, {job_id: created})
+    pipe.execute()
+    metrics.incr('propagation', f'{name}.started')
+
+    run_propagation_job.delay(job_id)
+    return job_id
+
+
+def run_chunk(job_id):
+    """run the next chunk of a job, return whether the job has chunks left"""
+    conn = get_redis_connection()
+
+    # a chunk queued twice runs once at a time
+    if not conn.set(lock_key(job_id), 1, nx=True, ex=settings.PROPAGATION_CHUNK_TIMEOUT):
+        return False
+
+    try:
+        state = job_progress(job_id)
+        if state is None:
+            return False
+
+        job = JOBS[state['name']](*state['args'])
+        if not job.still_applies():
+            metrics.incr('propagation', f"{state['name']}.cancelled")
+            _finish(job_id, state, completed=False)
+            return False
+
+        step, cursor = state['step'], state['cursor']
+
+        started = time.perf_counter()
+        processed, cursor = getattr(job, job.steps[step])(cursor)
+        metrics.incr('propagation', 'chunks')
+        metrics.incr('propagation', 'items', processed)
+        metrics.incr('propagation', 'chunk_seconds', time.perf_counter() - started)
+
+        if cursor is None:
+            step, cursor = step + 1, 0
+        if step == len(job.steps):
+            _finish(job_id, state)
+            return False
+
+        pipe = conn.pipeline()
+        pipe.hset(job_key(job_id), mapping={'step': step, 'cursor': cursor, 'touched': time.time()})
+        pipe.hincrby(job_key(job_id), 'processed', processed)
+        pipe.execute()
+        return True
+    finally:
+        conn.delete(lock_key(job_id))
+
+
+def _finish(job_id, state, completed=True):
+    pipe = get_redis_connection().pipeline()
+    pipe.delete(job_key(job_id))
+    pipe.zrem(PENDING_KEY, job_id)
+    pipe.execute()
+    if not completed:
+        return
+
+    metrics.incr('propagation', f"{state['name']}.completed")
+    metrics.set_value('propagation', f"{state['name']}.last_lag_seconds", round(time.time() - state['created'], 3))
+
+
+def job_progress(job_id):
+    """
+    the state of a pending job: its name and arguments, when it was created and last advanced,
+    its current step and cursor and the number of items processed so far.
+    """
+    state = get_redis_connection().hgetall(job_key(job_id))
+    if not state:
+        return None
+
+    state = {field.decode(): value.decode() for field, value in state.items()}
+    return {
+        'name': state['name'],
+        'args': json.loads(state['args']),
+        'created': float(state['created']),
+        'touched': float(state['touched']),
+        'step': int(state['step']),
+        'cursor': int(state['cursor']),
+        'processed': int(state['processed']),
+    }
+
+
+def pending_jobs():
+    """ids of the jobs not completed yet, the oldest first"""
+    return [job_id.decode() for job_id in get_redis_connection().zrange(PENDING_KEY, 0, -1)]
+
+
+def resume_stalled_jobs():
+    """
+    queue again the jobs whose chunk task was lost, those not advanced for PROPAGATION_STALL_TIMEOUT,
+    and report how many jobs are pending and how late the oldest one is. return the resumed ids.
+    """
+    from relations.tasks import run_propagation_job
+
+    conn = get_redis_connection()
+    now = time.time()
+    pending = conn.zrange(PENDING_KEY, 0, -1, withscores=True)
+
+    metrics.set_value('propagation', 'pending', len(pending))
+    metrics.set_value('propagation', 'oldest_pending_seconds', round(now - pending[0][1], 3) if pending else 0)
+
+    stalled = []
+    for job_id, created in pending:
+        job_id = job_id.decode()
+        state = job_progress(job_id)
+        if state is None:
+            conn.zrem(PENDING_KEY, job_id)
+        elif now - state['touched'] > settings.PROPAGATION_STALL_TIMEOUT.total_seconds():
+            stalled.append(job_id)
+            run_propagation_job.delay(job_id)
+    return stalled
@@ -0,0 +1,42 @@
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+from relations.models import FollowRelation
+
+NO_RELATIONSHIP = {'follows_you': False, 'you_follow': False, 'requested': False}
+
+
+def resolve_relationships(viewer_id, user_ids):
+    """
+    {user_id: flags} of the follow relations between the viewer and each of `user_ids`, in one query:
+    `follows_you` and `you_follow` for accepted follows, `requested` for the viewer's pending request.
+    """
+    user_ids = set(user_ids)
+    relationships = {user_id: dict(NO_RELATIONSHIP) for user_id in user_ids}
+    if viewer_id is None or not user_ids:
+        return relationships
+
+    edges = FollowRelation.objects.filter(
+        Q(from_user_id=viewer_id, to_user_id__in=user_ids) | Q(from_user_id__in=user_ids, to_user_id=viewer_id)
+    ).order_by().values_list('from_user_id', 'to_user_id', 'is_accepted')
+
+    for from_user_id, to_user_id, is_accepted in edges:
+        if from_user_id == viewer_id:
+            relationships[to_user_id]['you_follow' if is_accepted else 'requested'] = True
+        if to_user_id == viewer_id and is_accepted:
+            relationships[from_user_id]['follows_you'] = True
+    return relationships
+
+
+def resolve_follow_back(pairs):
+    """the (user_id, other_id) pairs among `pairs` where user_id follows or requested to follow other_id, one query"""
+    by_user = {}
+    for user_id, other_id in pairs:
+        by_user.setdefault(user_id, set()).add(other_id)
+    if not by_user:
+        return set()
+
+    condition = reduce(or_, (Q(from_user_id=user_id, to_user_id__in=others) for user_id, others in by_user.items()))
+    return set(FollowRelation.objects.filter(condition).order_by().values_list('from_user_id', 'to_user_id'))
@@ -4,36 +4,68 @@ from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
+from custom_lib.preload import PreloadMixin, PreloadListSerializer
+from custom_lib.viewer import get_viewer
 from relations.models import FollowRelation, BlockRelation
+from relations.resolvers import resolve_relationships, resolve_follow_back
 from users.serializers import UserLightSerializer
 
 User = get_user_model()
 
 
-class FollowerSerializer(serializers.ModelSerializer):
-    from_user = UserLightSerializer()
+class RelationListSerializer(PreloadMixin, serializers.ModelSerializer):
+    """
+    a follow relation listed on behalf of one of its users, the `listed_user_field` other one is shown with
+    `follow_back` (the reverse relation exists) and their relationship with the viewer, loaded per page.
+    """
+    listed_user_field = None
+
     follow_back = serializers.SerializerMethodField()
+    relationship = serializers.SerializerMethodField()
 
     class Meta:
+        list_serializer_class = PreloadListSerializer
+
+    def preload(self, relations):
+        self.preload_values('follow_back', relations, _load_follow_back)
+        self.preload_values('relationship', relations, self._load_relationships)
+
+    def get_follow_back(self, obj):
+        return self.preloaded('follow_back', obj, _load_follow_back)
+
+    def get_relationship(self, obj):
+        return self.preloaded('relationship', obj, self._load_relationships)
+
+    def _load_relationships(self, relations):
+        request = self.context.get('request')
+        listed_ids = {relation.pk: getattr(relation, f'{self.listed_user_field}_id') for relation in relations}
+        relationships = resolve_relationships(request.user.id if request else None, listed_ids.values())
+        return {pk: relationships[user_id] for pk, user_id in listed_ids.items()}
+
+
+def _load_follow_back(relations):
+    follow_back = resolve_follow_back((relation.to_user_id, relation.from_user_id) for relation in relations)
+    return {relation.pk: (relation.to_user_id, relation.from_user_id) in follow_back for relation in relations}
+
+
+class FollowerSerializer(RelationListSerializer):
+    listed_user_field = 'from_user'
+
+    from_user = UserLightSerializer()
+
+    class Meta(RelationListSerializer.Meta):
         model = FollowRelation
-        fields = ('from_user', 'follow_back', 'created_at')
+        fields = ('from_user', 'follow_back', 'relationship', 'created_at')
 
-    @staticmethod
-    def get_follow_back(obj):
-        return FollowRelation.objects.filter(from_user=obj.to_user, to_user=obj.from_user).exists()
 
+class FollowingSerializer(RelationListSerializer):
+    listed_user_field = 'to_user'
 
-class FollowingSerializer(serializers.ModelSerializer):
     to_user = UserLightSerializer()
-    follow_back = serializers.SerializerMethodField()
 
-    class Meta:
+    class Meta(RelationListSerializer.Meta):
         model = FollowRelation
-        fields = ('to_user', 'follow_back', 'created_at')
-
-    @staticmethod
-    def get_follow_back(obj):
-        return FollowRelation.objects.filter(from_user=obj.to_user, to_user=obj.from_user).exists()
+        fields = ('to_user', 'follow_back', 'relationship', 'created_at')
 
 
 class BlockedSerializer(serializers.ModelSerializer):
@@ -68,12 +100,8 @@ class FollowSerializer(serializers.ModelSerializer):
         if FollowRelation.objects.filter(from_user=from_user, to_user=to_user).exists():
             raise ValidationError(_("You are already following this user."))
 
-        # check if the user has been blocked
-        if BlockRelation.objects.filter(blocker=to_user, blocked=from_user).exists():
-            raise ValidationError(_("You cannot follow this user."))
-
-        # check if the from_user has blocked the to_user
-        if BlockRelation.objects.filter(blocker=from_user, blocked=to_user).exists():
+        # check if either user has blocked the other
+        if get_viewer(self.context['request']).is_blocked(to_user.id):
             raise ValidationError(_("You cannot follow this user."))
 
         # attach the resolved to_user to the attrs
@@ -121,7 +149,7 @@ class BlockSerializer(serializers.ModelSerializer):
             raise ValidationError(_("You cannot block yourself."))
 
         # prevent duplicate blocking
-        if BlockRelation.objects.filter(blocker=blocker, blocked=blocked).exists():
+        if blocked.id in get_viewer(self.context['request']).blocked_ids:
             raise ValidationError(_("You have already blocked this user."))
 
         return attrs
@@ -1,12 +1,68 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
 
+from relations.blocks import add_block, remove_block
 from relations.models import BlockRelation, FollowRelation
+from relations.propagation import start_job
+from relations.visibility import bump_epochs
+from users.stats import add_to_stats
+from users.summary import bump_profile_epochs
 
 
 @receiver(post_save, sender=BlockRelation)
 def delete_follow_on_block(sender, instance, created, **kwargs):
     if created:
-        # delete any follow relations involving the blocker and blocked user
-        FollowRelation.objects.filter(from_user=instance.blocker, to_user=instance.blocked).delete()
-        FollowRelation.objects.filter(from_user=instance.blocked, to_user=instance.blocker).delete()
+        # delete any follow relations involving the blocker and blocked user, and clean their feeds, in the background
+        transaction.on_commit(lambda: start_job('block', instance.blocker_id, instance.blocked_id))
+
+
+@receiver(post_save, sender=BlockRelation)
+def cache_created_block(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: add_block(instance.blocker_id, instance.blocked_id))
+
+
+@receiver(post_delete, sender=BlockRelation)
+def uncache_deleted_block(sender, instance, **kwargs):
+    transaction.on_commit(lambda: remove_block(instance.blocker_id, instance.blocked_id))
+
+
+@receiver(post_init, sender=FollowRelation)
+def remember_follow_state(sender, instance, **kwargs):
+    # the accepted state as loaded, to tell when a request gets accepted
+    instance.was_accepted = instance.is_accepted if instance.pk else False
+
+
+@receiver(post_save, sender=FollowRelation)
+def count_accepted_follow(sender, instance, **kwargs):
+    if instance.is_accepted != instance.was_accepted:
+        amount = 1 if instance.is_accepted else -1
+        transaction.on_commit(lambda: _count_follow(instance.from_user_id, instance.to_user_id, amount))
+    instance.was_accepted = instance.is_accepted
+
+
+@receiver(post_delete, sender=FollowRelation)
+def count_deleted_follow(sender, instance, **kwargs):
+    # deleted follows include unfollows, declined requests, removed followers and blocks
+    if instance.was_accepted:
+        transaction.on_commit(lambda: _count_follow(instance.from_user_id, instance.to_user_id, -1))
+
+
+def _count_follow(from_user_id, to_user_id, amount):
+    add_to_stats(from_user_id, 'followings_count', amount)
+    add_to_stats(to_user_id, 'followers_count', amount)
+    bump_profile_epochs((from_user_id, to_user_id))
+
+
+@receiver(post_save, sender=FollowRelation)
+@receiver(post_delete, sender=FollowRelation)
+def bump_epoch_on_follow_change(sender, instance, **kwargs):
+    # follows, accepted requests and unfollows only change what the follower can see
+    transaction.on_commit(lambda: bump_epochs((instance.from_user_id,)))
+
+
+@receiver(post_save, sender=BlockRelation)
+@receiver(post_delete, sender=BlockRelation)
+def bump_epochs_on_block_change(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_epochs((instance.blocker_id, instance.blocked_id)))
@@ -0,0 +1,140 @@
+import multiprocessing
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from scipy import sparse
+
+from custom_lib.redis_client import get_redis_connection
+
+User = get_user_model()
+
+# the graph shared with the worker processes, set once per process by `_init_worker`
+_graph = {}
+
+
+def suggestions_key(user_id):
+    return f'suggestions:{user_id}'
+
+
+def load_graph():
+    """
+    snapshot the follow graph into integer indexed sparse matrices over the active users:
+    `follows` holds accepted follows, `excluded` every pair that must not be suggested
+    (follows and follow requests, blocks in both directions).
+    """
+    from relations.models import FollowRelation, BlockRelation
+
+    user_ids = np.array(sorted(User.objects.filter(is_active=True).values_list('id', flat=True)), dtype=np.int64)
+
+    def matrix(pairs):
+        pairs = np.array(list(pairs), dtype=np.int64).reshape(-1, 2)
+        if not len(user_ids):
+            # no active users, whatever the pairs
+            return sparse.csr_matrix((0, 0), dtype=np.float64)
+        rows, columns = np.searchsorted(user_ids, pairs[:, 0]), np.searchsorted(user_ids, pairs[:, 1])
+        # drop the pairs involving inactive users
+        rows, columns = np.minimum(rows, len(user_ids) - 1), np.minimum(columns, len(user_ids) - 1)
+        known = (user_ids[rows] == pairs[:, 0]) & (user_ids[columns] == pairs[:, 1])
+        data = np.ones(known.sum(), dtype=np.float64)
+        shape = (len(user_ids), len(user_ids))
+        return sparse.csr_matrix((data, (rows[known], columns[known])), shape=shape)
+
+    follow_pairs = FollowRelation.objects.values_list('from_user_id', 'to_user_id', 'is_accepted')
+    follow_pairs = list(follow_pairs.iterator(chunk_size=10000))
+    follows = matrix((from_user, to_user) for from_user, to_user, is_accepted in follow_pairs if is_accepted)
+    requested = matrix((from_user, to_user) for from_user, to_user, is_accepted in follow_pairs)
+    blocks = matrix(BlockRelation.objects.values_list('blocker_id', 'blocked_id').iterator(chunk_size=10000))
+
+    excluded = requested + blocks + blocks.T
+    excluded.data[:] = 1
+    return user_ids, follows, excluded
+
+
+def compute_suggestions(workers=None):
+    """
+    rank the friends of friends of every user and store the best SUGGESTIONS_SIZE for each one.
+    a candidate reached through a followed account `v` scores 1 / log(2 + followers of v), so mutual
+    connections add up while popular accounts, which connect everyone, weigh little (adamic-adar).
+    users are scored in shards of bounded size, across a pool of processes unless running inside a daemonic
+    process (a celery worker) which can't have children. return the number of users with suggestions.
+    """
+    user_ids, follows, excluded = load_graph()
+    if not len(user_ids):
+        return 0
+
+    followers_count = np.asarray(follows.sum(axis=0)).ravel()
+    weights = sparse.diags(1 / np.log(2 + followers_count))
+    graph = (user_ids, follows, (weights @ follows).tocsr(), excluded)
+
+    shards = _shards(follows, settings.SUGGESTIONS_SHARD_SIZE, settings.SUGGESTIONS_SHARD_PATHS)
+
+    if multiprocessing.current_process().daemon or workers == 1:
+        _init_worker(*graph)
+        results = map(_score_shard, shards)
+        return sum(_store(shard) for shard in results)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=graph) as executor:
+        return sum(_store(shard) for shard in executor.map(_score_shard, shards))
+
+
+def _shards(follows, max_users, max_paths):
+    """
+    [start, end) ranges of matrix rows of at most `max_users` users and `max_paths` friend of friend paths,
+    unless a single user has more, so the memory a shard is scored in stays bounded however the
+    followed accounts are connected.
+    """
+    # paths from each user: the follows of each account they follow
+    paths = follows @ np.diff(follows.indptr)
+
+    shards, start, total = [], 0, 0
+    for row, count in enumerate(paths.tolist()):
+        if row > start and (row - start == max_users or total + count > max_paths):
+            shards.append((start, row))
+            start, total = row, 0
+        total += count
+    shards.append((start, len(paths)))
+    return shards
+
+
+def _init_worker(user_ids, follows, weighted_follows, excluded):
+    _graph.update(user_ids=user_ids, follows=follows, weighted_follows=weighted_follows, excluded=excluded)
+
+
+def _score_shard(shard):
+    """(user_id, suggested user ids) of the users in a [start, end) range of matrix rows"""
+    start, end = shard
+    user_ids, excluded = _graph['user_ids'], _graph['excluded']
+
+    # scores of the friends of friends, without the followed, requested, blocked and the users themselves
+    scores = (_graph['follows'][start:end] @ _graph['weighted_follows']).tocsr()
+    scores = scores - scores.multiply(excluded[start:end])
+    scores.setdiag(0, k=start)
+    scores.eliminate_zeros()
+
+    results = []
+    for row in range(end - start):
+        row_start, row_end = scores.indptr[row], scores.indptr[row + 1]
+        if row_start == row_end:
+            continue
+        columns, values = scores.indices[row_start:row_end], scores.data[row_start:row_end]
+        best = np.lexsort((columns, -values))[:settings.SUGGESTIONS_SIZE]
+        results.append((int(user_ids[start + row]), user_ids[columns[best]].tolist()))
+    return results
+
+
+def _store(results):
+    ttl = int(settings.SUGGESTIONS_TTL.total_seconds())
+    pipe = get_redis_connection().pipeline(transaction=False)
+    for user_id, suggested_ids in results:
+        pipe.set(suggestions_key(user_id), array('q', suggested_ids).tobytes(), ex=ttl)
+    pipe.execute()
+    return len(results)
+
+
+def get_suggestions(user_id):
+    """the user ids suggested to `user_id` by the last computation, best first"""
+    data = get_redis_connection().get(suggestions_key(user_id))
+    return array('q', data).tolist() if data else []
@@ -0,0 +1,26 @@
+from celery import shared_task
+
+
+@shared_task
+def compute_suggestions():
+    """recompute the people you may know of every user, run periodically by celery beat"""
+    from . import suggestions
+
+    return suggestions.compute_suggestions()
+
+
+@shared_task
+def run_propagation_job(job_id):
+    """run the next chunk of a propagation job, then queue the following one"""
+    from . import propagation
+
+    if propagation.run_chunk(job_id):
+        run_propagation_job.delay(job_id)
+
+
+@shared_task
+def resume_propagation_jobs():
+    """queue again the propagation jobs that stopped advancing, run periodically by celery beat"""
+    from . import propagation
+
+    return propagation.resume_stalled_jobs()
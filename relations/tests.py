@@ -1,3 +1,236 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import override_settings
+
+from contents.models import Tag
+from contents.timelines import home_timelines, tag_timelines
+from custom_lib import metrics
+from custom_lib.testing import RedisTestCase
+from custom_lib.viewer import ViewerContext
+from relations import blocks, propagation
+from relations.models import BlockRelation, FollowRelation
+from relations.suggestions import compute_suggestions, get_suggestions, load_graph
+from relations.visibility import bump_epochs, cached_decision
+
+
+class BlockCacheTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, self.other, self.third = (self.create_user(name) for name in ('user', 'other', 'third'))
+
+    def test_sets_follow_blocks_and_unblocks(self):
+        self.assertFalse(blocks.is_blocked(self.user.id, self.other.id))
+
+        block = BlockRelation.objects.create(blocker=self.other, blocked=self.user)
+        self.assertTrue(blocks.is_blocked(self.user.id, self.other.id))
+        self.assertTrue(blocks.is_blocked(self.other.id, self.user.id))
+        self.assertEqual(blocks.blocked_among(self.user.id, [self.other.id, self.third.id]), {self.other.id})
+        self.assertEqual(blocks.block_sets(self.other.id), (frozenset({self.user.id}), frozenset()))
+
+        block.delete()
+        self.assertFalse(blocks.is_blocked(self.user.id, self.other.id))
+        self.assertEqual(blocks.check_consistency([self.user.id, self.other.id]), [])
+
+    def test_sets_are_built_from_the_database(self):
+        BlockRelation.objects.create(blocker=self.user, blocked=self.other)
+        self.redis.flushall()
+
+        self.assertEqual(blocks.block_sets(self.user.id), (frozenset({self.other.id}), frozenset()))
+        self.assertTrue(self.redis.exists(blocks.built_key(self.user.id)))
+
+    def test_a_block_made_while_building_is_not_lost(self):
+        load_block_sets = blocks.load_block_sets
+
+        def block_meanwhile(user_ids):
+            sets = load_block_sets(user_ids)
+            BlockRelation.objects.create(blocker=self.user, blocked=self.third)
+            return sets
+
+        with mock.patch('relations.blocks.load_block_sets', side_effect=block_meanwhile):
+            blocks.build(self.user.id)
+
+        self.assertFalse(self.redis.exists(blocks.built_key(self.user.id)))
+        self.assertTrue(blocks.is_blocked(self.user.id, self.third.id))
+
+
+class PropagationTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, self.other = self.create_user('user'), self.create_user('other')
+
+    def test_block_ends_follows_and_cleans_feeds(self):
+        self.follow(self.user, self.other)
+        self.follow(self.other, self.user)
+        post = self.create_post(self.other)
+        self.assertEqual([post_id for post_id, score in home_timelines.entries(self.user.id)], [post.id])
+
+        BlockRelation.objects.create(blocker=self.user, blocked=self.other)
+
+        self.assertFalse(FollowRelation.objects.exists())
+        self.assertEqual(home_timelines.entries(self.user.id), [])
+        self.assertEqual(propagation.pending_jobs(), [])
+        self.assertEqual(metrics.get_metrics('propagation')['block.completed'], 1)
+
+    def test_jobs_undone_meanwhile_are_cancelled(self):
+        self.follow(self.user, self.other)
+        with mock.patch('relations.tasks.run_propagation_job.delay'):
+            job_id = propagation.start_job('block', self.user.id, self.other.id)
+
+        propagation.run_chunk(job_id)
+        self.assertTrue(FollowRelation.objects.exists())
+        self.assertIsNone(propagation.job_progress(job_id))
+        self.assertEqual(metrics.get_metrics('propagation')['block.cancelled'], 1)
+
+    @override_settings(PROPAGATION_CHUNK_SIZE=2)
+    def test_deactivation_and_reactivation_in_chunks(self):
+        followers = [self.create_user(f'follower{i}') for i in range(5)]
+        for follower in followers:
+            self.follow(follower, self.user)
+        post = self.create_post(self.user, '#cat')
+        tag = Tag.objects.get(name='cat')
+        for follower in followers:
+            home_timelines.ensure(follower.id)
+        tag_timelines.ensure(tag.id)
+
+        self.user.is_active = False
+        self.user.save()
+        for follower in followers:
+            self.assertEqual(home_timelines.entries(follower.id), [])
+        self.assertEqual(tag_timelines.entries(tag.id), [])
+        self.assertGreater(metrics.get_metrics('propagation')['chunks'], 3)
+
+        self.user.is_active = True
+        self.user.save()
+        for follower in followers:
+            self.assertEqual([post_id for post_id, score in home_timelines.entries(follower.id)], [post.id])
+        self.assertEqual([post_id for post_id, score in tag_timelines.entries(tag.id)], [post.id])
+
+    def test_stalled_jobs_are_resumed(self):
+        self.follow(self.user, self.other)
+        with mock.patch('relations.tasks.run_propagation_job.delay'):
+            BlockRelation.objects.create(blocker=self.user, blocked=self.other)
+        job_id, = propagation.pending_jobs()
+        self.assertEqual(propagation.job_progress(job_id)['step'], 0)
+
+        with override_settings(PROPAGATION_STALL_TIMEOUT=mock.Mock(total_seconds=lambda: -1)):
+            self.assertEqual(propagation.resume_stalled_jobs(), [job_id])
+        self.assertFalse(FollowRelation.objects.exists())
+        self.assertEqual(propagation.pending_jobs(), [])
+
+
+class VisibilityTests(RedisTestCase):
+    def test_decisions_are_cached_until_an_epoch_changes(self):
+        decide = mock.Mock(return_value=True)
+        self.assertTrue(cached_decision(1, 2, decide))
+        self.assertTrue(cached_decision(1, 2, decide))
+        self.assertEqual(decide.call_count, 1)
+
+        bump_epochs((2,))
+        decide.return_value = False
+        self.assertFalse(cached_decision(1, 2, decide))
+        self.assertEqual(decide.call_count, 2)
+
+    def test_private_profile_posts(self):
+        viewer, private = self.create_user('viewer'), self.create_user('private', is_private=True)
+        self.create_post(private)
+        client = self.client_for(viewer)
+        self.assertEqual(client.get('/contents/private/posts/').status_code, 403)
+
+        follow = self.follow(viewer, private, accepted=False)
+        self.assertEqual(client.get('/contents/private/posts/').status_code, 403)
+
+        follow.is_accepted = True
+        follow.save()
+        self.assertEqual(client.get('/contents/private/posts/').status_code, 200)
+
+        BlockRelation.objects.create(blocker=private, blocked=viewer)
+        self.assertEqual(client.get('/contents/private/posts/').status_code, 403)
+
+
+class ViewerContextTests(RedisTestCase):
+    def test_sets_and_decisions(self):
+        viewer = self.create_user('viewer')
+        followed, requested = self.create_user('followed'), self.create_user('requested', is_private=True)
+        blocked, blocker = self.create_user('blocked'), self.create_user('blocker')
+        self.follow(viewer, followed)
+        self.follow(viewer, requested, accepted=False)
+        BlockRelation.objects.create(blocker=viewer, blocked=blocked)
+        BlockRelation.objects.create(blocker=blocker, blocked=viewer)
+
+        context = ViewerContext(viewer)
+        self.assertEqual(context.hidden_ids, {blocked.id, blocker.id})
+        self.assertTrue(context.follows(followed.id))
+        self.assertFalse(context.follows(requested.id))
+        self.assertTrue(context.can_view(followed))
+        self.assertFalse(context.can_view(requested))
+        self.assertFalse(context.can_view(blocker))
+        self.assertTrue(context.can_view(viewer))
+
+
+class RelationListTests(RedisTestCase):
+    def test_follow_back_and_relationship_flags(self):
+        viewer, user = self.create_user('viewer'), self.create_user('user')
+        mutual, fan = self.create_user('mutual'), self.create_user('fan')
+        self.follow(mutual, user)
+        self.follow(user, mutual)
+        self.follow(fan, user)
+        self.follow(viewer, mutual)
+        self.follow(fan, viewer)
+
+        followers = self.walk(self.client_for(viewer), '/relations/followers/user/')
+        flags = {follower['from_user']['username']: follower for follower in followers}
+        self.assertTrue(flags['mutual']['follow_back'])
+        self.assertFalse(flags['fan']['follow_back'])
+        self.assertTrue(flags['mutual']['relationship']['you_follow'])
+        self.assertTrue(flags['fan']['relationship']['follows_you'])
+
+    def test_follower_pages(self):
+        user = self.create_user('user')
+        for i in range(25):
+            self.follow(self.create_user(f'follower{i}'), user)
+
+        client = self.client_for(user)
+        response = client.get('/relations/followers/user/')
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertEqual(len(self.walk(client, '/relations/followers/user/')), 25)
+
+
+class SuggestionsTests(RedisTestCase):
+    def test_friends_of_friends_ranked_by_mutual_connections(self):
+        users = {name: self.create_user(name) for name in 'abcdefg'}
+        self.follow(users['a'], users['b'])
+        self.follow(users['a'], users['c'])
+        self.follow(users['b'], users['d'])
+        self.follow(users['c'], users['d'])
+        self.follow(users['b'], users['e'])
+        # requested, blocked and inactive users are never suggested
+        self.follow(users['c'], users['f'])
+        self.follow(users['a'], users['f'], accepted=False)
+        self.follow(users['b'], users['g'])
+        BlockRelation.objects.create(blocker=users['g'], blocked=users['a'])
+        inactive = self.create_user('inactive', is_active=False)
+        self.follow(users['b'], inactive)
+
+        self.assertEqual(compute_suggestions(workers=1), 1)
+        self.assertEqual(get_suggestions(users['a'].id), [users['d'].id, users['e'].id])
+
+        response = self.client_for(users['a']).get('/relations/suggestions/')
+        self.assertEqual([user['username'] for user in response.data], ['d', 'e'])
+
+    @override_settings(SUGGESTIONS_SHARD_SIZE=2, SUGGESTIONS_SHARD_PATHS=1)
+    def test_small_shards(self):
+        users = [self.create_user(f'user{i}') for i in range(6)]
+        for user, other in zip(users, users[1:]):
+            self.follow(user, other)
+
+        self.assertEqual(compute_suggestions(workers=1), 4)
+        self.assertEqual(get_suggestions(users[0].id), [users[2].id])
+
+    def test_no_active_users(self):
+        user, other = self.create_user('user'), self.create_user('other')
+        self.follow(user, other)
+        type(user).objects.update(is_active=False)
+
+        user_ids, follows, excluded = load_graph()
+        self.assertEqual((len(user_ids), follows.nnz), (0, 0))
+        self.assertEqual(compute_suggestions(workers=1), 0)
@@ -14,6 +14,7 @@ urlpatterns = [
         name='received-request-detail'
     ),
     path('blocked-users/', views.BlockedUsersListAPIView.as_view(), name='blocked-users'),
+    path('suggestions/', views.SuggestionListAPIView.as_view(), name='suggestions'),
     path('follow/<str:username>/', views.FollowCreateDestroyAPIView.as_view(), name='follow'),
     path('block/<str:username>/', views.BlockCreateDestroyAPIView.as_view(), name='block'),
     path('remove-follower/<str:username>/', views.FollowerDestroyAPIView.as_view(), name='remove-follower'),
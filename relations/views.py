@@ -7,14 +7,20 @@ from rest_framework.generics import ListAPIView, CreateAPIView, DestroyAPIView
 from rest_framework.response import Response
 
 from custom_lib.common_permissions import ReadOnly, CanViewUserPermission
+from custom_lib.prefetch import PrefetchNextPageMixin
+from custom_lib.query_planner import QueryPlannerMixin
+from custom_lib.viewer import get_viewer
 from relations.models import FollowRelation, BlockRelation
 from relations.serializers import FollowerSerializer, FollowingSerializer, BlockedSerializer, FollowSerializer, \
     RequestSerializer, BlockSerializer, RemoveFollowerSerializer
+from relations.suggestions import get_suggestions
+from users.resolvers import resolve_username
+from users.serializers import UserListSerializer
 
 User = get_user_model()
 
 
-class FollowerListAPIView(ListAPIView):
+class FollowerListAPIView(PrefetchNextPageMixin, QueryPlannerMixin, ListAPIView):
     serializer_class = FollowerSerializer
 
     ordering = ('-created_at',)
@@ -24,20 +30,19 @@ class FollowerListAPIView(ListAPIView):
     search_fields = ('from_user__username__istartswith',)
 
     def get_queryset(self):
-        username = self.kwargs.get('username')
-        user = self.request.user
+        user = resolve_username(self.request, self.kwargs.get('username'))
+        if user is None:
+            return FollowRelation.objects.none()
 
-        queryset = FollowRelation.objects.filter(to_user__username=username, is_accepted=True)
+        queryset = FollowRelation.objects.filter(to_user_id=user.id, is_accepted=True)
 
         # exclude users from blocked users and accounts that have blocked the user
-        blocked_users = BlockRelation.objects.filter(blocker=user).values_list('blocked', flat=True)
-        blocker_users = BlockRelation.objects.filter(blocked=user).values_list('blocker', flat=True)
-        queryset = queryset.exclude(from_user_id__in=blocked_users).exclude(from_user_id__in=blocker_users)
+        queryset = queryset.exclude(from_user_id__in=get_viewer(self.request).hidden_ids)
 
         return queryset
 
 
-class FollowingListAPIView(ListAPIView):
+class FollowingListAPIView(PrefetchNextPageMixin, QueryPlannerMixin, ListAPIView):
     serializer_class = FollowingSerializer
 
     ordering = ('-created_at',)
@@ -47,20 +52,19 @@ class FollowingListAPIView(ListAPIView):
     search_fields = ('to_user__username__istartswith',)
 
     def get_queryset(self):
-        username = self.kwargs.get('username')
-        user = self.request.user
+        user = resolve_username(self.request, self.kwargs.get('username'))
+        if user is None:
+            return FollowRelation.objects.none()
 
-        queryset = FollowRelation.objects.filter(from_user__username=username, is_accepted=True)
+        queryset = FollowRelation.objects.filter(from_user_id=user.id, is_accepted=True)
 
         # exclude users from blocked users and accounts that have blocked the user
-        blocked_users = BlockRelation.objects.filter(blocker=user).values_list('blocked', flat=True)
-        blocker_users = BlockRelation.objects.filter(blocked=user).values_list('blocker', flat=True)
-        queryset = queryset.exclude(to_user_id__in=blocked_users).exclude(to_user_id__in=blocker_users)
+        queryset = queryset.exclude(to_user_id__in=get_viewer(self.request).hidden_ids)
 
         return queryset
 
 
-class SentRequestListAPIView(ListAPIView):
+class SentRequestListAPIView(QueryPlannerMixin, ListAPIView):
     serializer_class = FollowingSerializer
 
     ordering = ('-created_at',)
@@ -75,7 +79,7 @@ class SentRequestListAPIView(ListAPIView):
         return FollowRelation.objects.filter(from_user=user, is_accepted=False)
 
 
-class ReceivedRequestListAPIView(ListAPIView):
+class ReceivedRequestListAPIView(QueryPlannerMixin, ListAPIView):
     serializer_class = FollowerSerializer
 
     ordering = ('-created_at',)
@@ -90,7 +94,7 @@ class ReceivedRequestListAPIView(ListAPIView):
         return FollowRelation.objects.filter(to_user=user, is_accepted=False)
 
 
-class BlockedUsersListAPIView(ListAPIView):
+class BlockedUsersListAPIView(QueryPlannerMixin, ListAPIView):
     serializer_class = BlockedSerializer
 
     ordering = ('-created_at',)
@@ -210,3 +214,23 @@ class FollowerDestroyAPIView(DestroyAPIView):
         follow_relation = get_object_or_404(FollowRelation, from_user=from_user, to_user=to_user)
         return follow_relation
 
+
+class SuggestionListAPIView(ListAPIView):
+    serializer_class = UserListSerializer
+
+    permission_classes = (IsAuthenticated, ReadOnly)
+
+    def list(self, request, *args, **kwargs):
+        """
+        people the user may know, as computed by the last compute_suggestions run. accounts followed,
+        requested or blocked since then are left out.
+        """
+        user = request.user
+        suggested_ids = get_suggestions(user.id)
+
+        users = User.objects.filter(id__in=suggested_ids, is_active=True).exclude(
+            id__in=FollowRelation.objects.filter(from_user=user).values('to_user')
+        ).exclude(id__in=get_viewer(request).hidden_ids).in_bulk()
+
+        serializer = self.get_serializer([users[user_id] for user_id in suggested_ids if user_id in users], many=True)
+        return Response(serializer.data)
@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def epoch_key(user_id):
+    return f'visibility:epoch:{user_id}'
+
+
+def decision_key(viewer_id, owner_id):
+    return f'visibility:{viewer_id}:{owner_id}'
+
+
+def bump_epochs(user_ids):
+    """
+    start a new relationship epoch for `user_ids` after one of their follows, blocks or their privacy
+    changed, so every decision cached in an older epoch is ignored from now on.
+    """
+    epoch = time.time_ns()
+    cache.set_many({epoch_key(user_id): epoch for user_id in user_ids}, timeout=None)
+
+
+def cached_decision(viewer_id, owner_id, decide):
+    """
+    whether `viewer_id` may see `owner_id`, as cached when it was last decided unless the relationship epoch
+    of either user has changed since, otherwise as returned by `decide()`. a cached decision costs one read.
+    """
+    keys = decision_key(viewer_id, owner_id), epoch_key(viewer_id), epoch_key(owner_id)
+    values = cache.get_many(keys)
+
+    # the epochs are read before deciding, a change made meanwhile leaves the stored decision stale at once
+    epochs = values.get(keys[1]), values.get(keys[2])
+    decision = values.get(keys[0])
+    if decision is not None and decision[:2] == epochs:
+        return decision[2]
+
+    allowed = decide()
+    cache.set(keys[0], (*epochs, allowed), int(settings.VISIBILITY_CACHE_TTL.total_seconds()))
+    return allowed
@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.stats import refresh_user_stats
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Recount the accepted followers, followings and posts of every user and overwrite their stats.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='users recounted per transaction')
+
+    def handle(self, *args, **options):
+        user_ids = User.objects.order_by('id').values_list('id', flat=True)
+        total, last_id = 0, 0
+        while batch := list(user_ids.filter(id__gt=last_id)[:options['batch_size']]):
+            with transaction.atomic():
+                refresh_user_stats(batch)
+            total, last_id = total + len(batch), batch[-1]
+
+        self.stdout.write(self.style.SUCCESS(f'Reconciled the stats of {total} users.'))
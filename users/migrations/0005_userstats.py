@@ -0,0 +1,27 @@
+# Generated by Django 4.2.15 on 2026-10-18 20:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_alter_user_avatar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='user')),
+                ('followers_count', models.IntegerField(default=0, verbose_name='followers count')),
+                ('followings_count', models.IntegerField(default=0, verbose_name='followings count')),
+            ],
+            options={
+                'verbose_name': 'user stats',
+                'verbose_name_plural': 'users stats',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.15 on 2026-10-18 20:50
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_posts(apps, schema_editor):
+    # stats rows stored before posts were counted, in one statement
+    Post = apps.get_model('contents', 'Post')
+    UserStats = apps.get_model('users', 'UserStats')
+
+    posts = Post.objects.filter(user_id=OuterRef('user_id')).order_by().values('user_id').annotate(n=Count('id'))
+    UserStats.objects.update(posts_count=Coalesce(Subquery(posts.values('n')), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_userstats'),
+        ('contents', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='posts_count',
+            field=models.IntegerField(default=0, verbose_name='posts count'),
+        ),
+        migrations.RunPython(count_posts, migrations.RunPython.noop),
+    ]
@@ -15,3 +15,23 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.username
+
+
+class UserStats(models.Model):
+    """denormalized counters of a user, kept up to date by users.stats"""
+    user = models.OneToOneField(
+        User, related_name="stats", on_delete=models.CASCADE, primary_key=True, verbose_name=_("user")
+    )
+    followers_count = models.IntegerField(_("followers count"), default=0)
+    followings_count = models.IntegerField(_("followings count"), default=0)
+    posts_count = models.IntegerField(_("posts count"), default=0)
+
+    def __str__(self):
+        return (
+            f"{self.user_id}: {self.followers_count} followers, {self.followings_count} followings, "
+            f"{self.posts_count} posts"
+        )
+
+    class Meta:
+        verbose_name = _("user stats")
+        verbose_name_plural = _("users stats")
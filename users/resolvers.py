@@ -0,0 +1,43 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+ResolvedUser = namedtuple('ResolvedUser', ('id', 'is_private', 'is_active'))
+
+
+def cache_key(username):
+    return f'users:resolved:{username}'
+
+
+def resolve_username(request, username):
+    """
+    (id, is_private, is_active) of the user named `username`, or `None` if there is none. resolved once
+    per request, from a shared cache invalidated whenever the user is saved or deleted.
+    """
+    request = getattr(request, '_request', request)
+    if not hasattr(request, 'resolved_users'):
+        request.resolved_users = {}
+
+    if username not in request.resolved_users:
+        request.resolved_users[username] = _resolve(username)
+    return request.resolved_users[username]
+
+
+def _resolve(username):
+    from users.models import User
+
+    resolved = cache.get(cache_key(username))
+    if resolved is not None:
+        return ResolvedUser(*resolved)
+
+    resolved = User.objects.filter(username=username).values_list('id', 'is_private', 'is_active').first()
+    if resolved is None:
+        return None
+
+    cache.set(cache_key(username), resolved, int(settings.USERNAME_CACHE_TTL.total_seconds()))
+    return ResolvedUser(*resolved)
+
+
+def forget_usernames(usernames):
+    cache.delete_many([cache_key(username) for username in usernames])
@@ -2,6 +2,10 @@ from django.contrib.auth import get_user_model
 from djoser.serializers import UserSerializer as BaseUserSerializer, UserCreateSerializer as BaseUserCreateSerializer
 from rest_framework import serializers
 
+from custom_lib.preload import PreloadMixin, PreloadListSerializer
+from relations.resolvers import resolve_relationships
+from users.stats import get_user_stats
+
 User = get_user_model()
 
 
@@ -10,23 +14,30 @@ class UserCreateSerializer(BaseUserCreateSerializer):
         fields = ('email', 'username', 'password')
 
 
-class UserSerializer(BaseUserSerializer):
+class UserStatsMixin(serializers.Serializer):
     followers_count = serializers.SerializerMethodField()
     followings_count = serializers.SerializerMethodField()
-
-    class Meta(BaseUserSerializer.Meta):
-        fields = (
-            'id', 'email', 'username', 'avatar', 'first_name', 'last_name',
-            'bio', 'is_verified', 'is_private', 'followers_count', 'followings_count'
-        )
+    posts_count = serializers.SerializerMethodField()
 
     @staticmethod
     def get_followers_count(user):
-        return user.followers.count()
+        return get_user_stats(user).followers_count
 
     @staticmethod
     def get_followings_count(user):
-        return user.followings.count()
+        return get_user_stats(user).followings_count
+
+    @staticmethod
+    def get_posts_count(user):
+        return get_user_stats(user).posts_count
+
+
+class UserSerializer(UserStatsMixin, BaseUserSerializer):
+    class Meta(BaseUserSerializer.Meta):
+        fields = (
+            'id', 'email', 'username', 'avatar', 'first_name', 'last_name',
+            'bio', 'is_verified', 'is_private', 'followers_count', 'followings_count', 'posts_count'
+        )
 
 
 class UserLightSerializer(serializers.ModelSerializer):
@@ -35,6 +46,35 @@ class UserLightSerializer(serializers.ModelSerializer):
         fields = ('username', 'avatar', 'is_verified')
 
 
+class UserListSerializer(PreloadMixin, UserLightSerializer):
+    """a user in a list, with their relationship with the viewer loaded for the whole page"""
+    relationship = serializers.SerializerMethodField()
+
+    class Meta(UserLightSerializer.Meta):
+        fields = UserLightSerializer.Meta.fields + ('relationship',)
+        list_serializer_class = PreloadListSerializer
+
+    def preload(self, users):
+        self.preload_values('relationship', users, self._load_relationships)
+
+    def get_relationship(self, user):
+        return self.preloaded('relationship', user, self._load_relationships)
+
+    def _load_relationships(self, users):
+        request = self.context.get('request')
+        return resolve_relationships(request.user.id if request else None, [user.id for user in users])
+
+
+class UserSummarySerializer(UserStatsMixin, UserListSerializer):
+    """the card of a profile, with its counters and its relationship with the viewer"""
+
+    class Meta(UserListSerializer.Meta):
+        fields = (
+            'username', 'avatar', 'first_name', 'last_name', 'bio', 'is_verified', 'is_private',
+            'followers_count', 'followings_count', 'posts_count', 'relationship'
+        )
+
+
 class UserDeactivateSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
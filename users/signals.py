@@ -0,0 +1,52 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from relations.propagation import start_job
+from relations.visibility import bump_epochs
+from users.resolvers import forget_usernames
+from users.summary import bump_profile_epochs
+
+User = get_user_model()
+
+
+@receiver(post_init, sender=User)
+def remember_loaded_state(sender, instance, **kwargs):
+    # the username and visibility as loaded, to tell what a save changes. read without loading them when deferred
+    instance.loaded_username = instance.__dict__.get('username')
+    instance.loaded_visibility = instance.__dict__.get('is_private'), instance.__dict__.get('is_active')
+
+
+@receiver(post_save, sender=User)
+def forget_saved_username(sender, instance, **kwargs):
+    # privacy and activity may have changed, or the username itself
+    usernames = {instance.username, instance.loaded_username} - {None}
+    transaction.on_commit(lambda: forget_usernames(usernames))
+    instance.loaded_username = instance.username
+
+
+@receiver(post_save, sender=User)
+def bump_profile_epoch_on_save(sender, instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(lambda: bump_profile_epochs((instance.id,)))
+
+
+@receiver(post_save, sender=User)
+def propagate_visibility_change(sender, instance, created, **kwargs):
+    visibility = instance.is_private, instance.is_active
+    if not created and visibility != instance.loaded_visibility:
+        # going private or public, or being deactivated, changes what everyone can see of the user
+        transaction.on_commit(lambda: bump_epochs((instance.id,)))
+
+        was_active = instance.loaded_visibility[1]
+        if was_active is True and not instance.is_active:
+            transaction.on_commit(lambda: start_job('deactivate', instance.id))
+        elif was_active is False and instance.is_active:
+            transaction.on_commit(lambda: start_job('reactivate', instance.id))
+    instance.loaded_visibility = visibility
+
+
+@receiver(post_delete, sender=User)
+def forget_deleted_username(sender, instance, **kwargs):
+    transaction.on_commit(lambda: forget_usernames((instance.username,)))
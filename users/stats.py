@@ -0,0 +1,61 @@
+from django.db import transaction
+from django.db.models import Count, F
+
+from users.models import User, UserStats
+
+
+def count_user_stats(user_ids):
+    """{user_id: UserStats} recounted from the accepted follow relations and the posts of `user_ids`"""
+    from contents.models import Post
+    from relations.models import FollowRelation
+
+    accepted = FollowRelation.objects.filter(is_accepted=True).order_by()
+    followers = dict(
+        accepted.filter(to_user_id__in=user_ids).values('to_user_id').annotate(n=Count('id'))
+        .values_list('to_user_id', 'n')
+    )
+    followings = dict(
+        accepted.filter(from_user_id__in=user_ids).values('from_user_id').annotate(n=Count('id'))
+        .values_list('from_user_id', 'n')
+    )
+    posts = dict(
+        Post.objects.filter(user_id__in=user_ids).order_by().values('user_id').annotate(n=Count('id'))
+        .values_list('user_id', 'n')
+    )
+    return {
+        user_id: UserStats(
+            user_id=user_id, followers_count=followers.get(user_id, 0), followings_count=followings.get(user_id, 0),
+            posts_count=posts.get(user_id, 0)
+        )
+        for user_id in user_ids
+    }
+
+
+def refresh_user_stats(user_ids):
+    """recount and store the stats of `user_ids`, return them as {user_id: UserStats}"""
+    stats = count_user_stats(user_ids)
+    UserStats.objects.bulk_create(
+        stats.values(),
+        update_conflicts=True,
+        unique_fields=('user',),
+        update_fields=('followers_count', 'followings_count', 'posts_count'),
+    )
+    return stats
+
+
+def add_to_stats(user_id, field, amount):
+    """add `amount` to a counter of `user_id`, a missing stats row is recounted instead"""
+    with transaction.atomic():
+        if not UserStats.objects.filter(user_id=user_id).update(**{field: F(field) + amount}):
+            # unless the user is gone, their follows and posts are deleted along with them
+            if User.objects.filter(id=user_id).exists():
+                refresh_user_stats([user_id])
+
+
+def get_user_stats(user):
+    """the stats of `user`, usually loaded along with the user, recounted if they were never stored"""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        user.stats = refresh_user_stats([user.id])[user.id]
+        return user.stats
@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from relations.visibility import epoch_key
+
+
+def profile_epoch_key(user_id):
+    return f'profile:epoch:{user_id}'
+
+
+def summary_key(viewer_id, user_id):
+    return f'profile:summary:{viewer_id}:{user_id}'
+
+
+def bump_profile_epochs(user_ids):
+    """start a new profile epoch for `user_ids` after their profile, counters or posts changed"""
+    epoch = time.time_ns()
+    cache.set_many({profile_epoch_key(user_id): epoch for user_id in user_ids}, timeout=None)
+
+
+def cached_summary(viewer_id, user_id, build):
+    """
+    the profile summary of `user_id` seen by `viewer_id`, as cached unless the relationship epoch of either
+    user or the profile epoch of `user_id` changed since, otherwise as returned by `build()`. the engagement
+    of the posts in it may lag behind by up to PROFILE_SUMMARY_TTL.
+    """
+    keys = summary_key(viewer_id, user_id), epoch_key(viewer_id), epoch_key(user_id), profile_epoch_key(user_id)
+    values = cache.get_many(keys)
+
+    epochs = tuple(values.get(key) for key in keys[1:])
+    summary = values.get(keys[0])
+    if summary is not None and summary[0] == epochs:
+        return summary[1]
+
+    data = build()
+    cache.set(keys[0], (epochs, data), int(settings.PROFILE_SUMMARY_TTL.total_seconds()))
+    return data
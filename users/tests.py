@@ -1,3 +1,176 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import RequestFactory
+
+from custom_lib.testing import RedisTestCase
+from relations.models import BlockRelation
+from users.models import User, UserStats
+from users.resolvers import resolve_username
+from users.stats import get_user_stats
+from users.views import UserSummaryAPIView
+
+
+class UserStatsTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, self.other = self.create_user('user'), self.create_user('other')
+
+    def counts(self, user):
+        stats = UserStats.objects.get(user=user)
+        return stats.followers_count, stats.followings_count, stats.posts_count
+
+    def test_follows_are_counted_once_accepted(self):
+        follow = self.follow(self.user, self.other, accepted=False)
+        self.assertFalse(UserStats.objects.exists())
+
+        follow.is_accepted = True
+        follow.save()
+        self.assertEqual(self.counts(self.user), (0, 1, 0))
+        self.assertEqual(self.counts(self.other), (1, 0, 0))
+
+        follow.delete()
+        self.assertEqual(self.counts(self.user), (0, 0, 0))
+        self.assertEqual(self.counts(self.other), (0, 0, 0))
+
+    def test_posts_are_counted(self):
+        post = self.create_post(self.user)
+        self.create_post(self.user)
+        self.assertEqual(self.counts(self.user), (0, 0, 2))
+
+        post.delete()
+        self.assertEqual(self.counts(self.user), (0, 0, 1))
+
+    def test_missing_stats_are_recounted(self):
+        self.follow(self.other, self.user)
+        UserStats.objects.all().delete()
+
+        stats = get_user_stats(User.objects.get(id=self.user.id))
+        self.assertEqual((stats.followers_count, stats.followings_count), (1, 0))
+        self.assertEqual(self.counts(self.user), (1, 0, 0))
+
+    def test_reconcile_overwrites_drifted_stats(self):
+        self.follow(self.other, self.user)
+        self.create_post(self.user)
+        UserStats.objects.update(followers_count=99, posts_count=99)
+
+        call_command('reconcile_user_stats', batch_size=1, stdout=mock.Mock())
+        self.assertEqual(self.counts(self.user), (1, 0, 1))
+        self.assertEqual(self.counts(self.other), (0, 1, 0))
+
+
+class UsernameResolverTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('user', is_private=True)
+
+    def resolve(self, username):
+        return resolve_username(RequestFactory().get('/'), username)
+
+    def test_resolved_once_and_cached(self):
+        request = RequestFactory().get('/')
+        resolved = resolve_username(request, 'user')
+        self.assertEqual(resolved, (self.user.id, True, True))
+
+        with self.assertNumQueries(0):
+            self.assertIs(resolve_username(request, 'user'), resolved)
+            self.assertEqual(self.resolve('user'), resolved)
+
+    def test_unknown_usernames(self):
+        self.assertIsNone(self.resolve('nobody'))
+        self.create_user('nobody')
+        self.assertIsNotNone(self.resolve('nobody'))
+
+    def test_saves_and_deletes_are_forgotten(self):
+        self.resolve('user')
+
+        self.user.is_private = False
+        self.user.save()
+        self.assertEqual(self.resolve('user'), (self.user.id, False, True))
+
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertIsNone(self.resolve('user'))
+        self.assertEqual(self.resolve('renamed').id, self.user.id)
+
+        self.user.delete()
+        self.assertIsNone(self.resolve('renamed'))
+
+
+class UserSummaryTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.viewer, self.user = self.create_user('viewer'), self.create_user('user')
+        self.client = self.client_for(self.viewer)
+
+    def test_card_relationship_and_first_page_of_posts(self):
+        self.follow(self.viewer, self.user)
+        self.follow(self.user, self.viewer)
+        posts = [self.create_post(self.user) for i in range(25)]
+
+        summary = self.client.get('/users/user/summary/').data
+        self.assertEqual((summary['followers_count'], summary['followings_count'], summary['posts_count']), (1, 1, 25))
+        self.assertEqual(summary['relationship'], {'follows_you': True, 'you_follow': True, 'requested': False})
+        self.assertEqual(len(summary['posts']['results']), 20)
+
+        # the next pages come from the user's posts list
+        self.assertIn('/contents/user/posts/', summary['posts']['next'])
+        rest = self.walk(self.client, summary['posts']['next'])
+        seen = [post['id'] for post in summary['posts']['results'] + rest]
+        self.assertEqual(sorted(seen), sorted(post.id for post in posts))
+
+    def test_cursors_are_ignored(self):
+        for i in range(25):
+            self.create_post(self.user)
+
+        first = self.client.get('/users/user/summary/').data
+        cursor = first['posts']['next'].split('cursor=')[1]
+        response = self.client.get(f'/users/user/summary/?cursor={cursor}')
+        self.assertEqual(response.data['posts'], first['posts'])
+        self.assertEqual(self.client.get('/users/user/summary/?cursor=invalid').status_code, 200)
+
+    def test_cached_until_something_changes(self):
+        build_summary = UserSummaryAPIView.build_summary
+        with mock.patch.object(
+                UserSummaryAPIView, 'build_summary', autospec=True, side_effect=build_summary
+        ) as build:
+            self.client.get('/users/user/summary/')
+            self.assertEqual(self.client.get('/users/user/summary/').data['posts_count'], 0)
+            self.assertEqual(build.call_count, 1)
+
+            self.create_post(self.user)
+            self.assertEqual(self.client.get('/users/user/summary/').data['posts_count'], 1)
+
+            self.follow(self.viewer, self.user)
+            self.assertTrue(self.client.get('/users/user/summary/').data['relationship']['you_follow'])
+            self.assertEqual(build.call_count, 3)
+
+    def test_private_blocked_and_unknown_users(self):
+        private = self.create_user('private', is_private=True)
+        self.create_post(private)
+        summary = self.client.get('/users/private/summary/').data
+        self.assertEqual(summary['posts_count'], 1)
+        self.assertIsNone(summary['posts'])
+
+        BlockRelation.objects.create(blocker=self.user, blocked=self.viewer)
+        self.assertEqual(self.client.get('/users/user/summary/').status_code, 404)
+        self.assertEqual(self.client.get('/users/nobody/summary/').status_code, 404)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client_for(private).get('/users/user/summary/').status_code, 404)
+
+
+class UserListTests(RedisTestCase):
+    def test_pages_skip_blockers_and_inactive_users(self):
+        viewer = self.create_user('viewer')
+        for i in range(25):
+            self.create_user(f'user{i}')
+        blocker = self.create_user('blocker')
+        BlockRelation.objects.create(blocker=blocker, blocked=viewer)
+        self.create_user('inactive', is_active=False)
+
+        client = self.client_for(viewer)
+        self.assertEqual(len(client.get('/users/').data['results']), 20)
+        usernames = {user['username'] for user in self.walk(client, '/users/')}
+        self.assertEqual(usernames, {f'user{i}' for i in range(25)} | {'viewer'})
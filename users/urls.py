@@ -6,4 +6,5 @@ from users import views
 urlpatterns = [
     path('', views.UsersListAPIView.as_view(), name='user-list'),
     path('deactivate/', views.UserDeactivateUpdateAPIView.as_view(), name='user-deactivate'),
+    path('<str:username>/summary/', views.UserSummaryAPIView.as_view(), name='user-summary'),
 ]
@@ -1,28 +1,32 @@
-from rest_framework.generics import ListAPIView, UpdateAPIView
+from django.urls import reverse
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import ListAPIView, UpdateAPIView, RetrieveAPIView
 from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 
-from relations.models import BlockRelation
-from users.serializers import UserLightSerializer, UserDeactivateSerializer
+from contents.models import Post
+from contents.serializers import PostSerializer
+from custom_lib.viewer import get_viewer
+from users.resolvers import resolve_username
+from users.serializers import UserListSerializer, UserDeactivateSerializer, UserSummarySerializer
+from users.summary import cached_summary
 from users.models import User
 
 
 class UsersListAPIView(ListAPIView):
-    serializer_class = UserLightSerializer
+    serializer_class = UserListSerializer
 
     filterset_fields = ('is_verified', 'is_private')
+    ordering = ('-date_joined',)
     pagination_class = CursorPagination
     permission_classes = (IsAuthenticated,)
     search_fields = ('username__istartswith',)
 
     def get_queryset(self):
-        user = self.request.user
-
         queryset = User.objects.filter(is_active=True)
 
-        blocker_users = BlockRelation.objects.filter(blocked=user).values_list('blocker', flat=True)
-
-        queryset.exclude(id__in=blocker_users)
+        queryset = queryset.exclude(id__in=get_viewer(self.request).blocker_ids)
 
         return queryset
 
@@ -34,3 +38,49 @@ class UserDeactivateUpdateAPIView(UpdateAPIView):
 
     def get_object(self):
         return self.request.user
+
+
+class FirstPageCursorPagination(CursorPagination):
+    """the first page of a cursor paginated list, whatever cursor the request carries"""
+
+    def decode_cursor(self, request):
+        return None
+
+
+class UserSummaryAPIView(RetrieveAPIView):
+    serializer_class = UserSummarySerializer
+
+    ordering = ('-created_at',)
+    # the summary is cached per viewer and profile, it always holds the first page
+    pagination_class = FirstPageCursorPagination
+    permission_classes = (IsAuthenticated,)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        everything a profile screen shows at once: the user card and counters, the viewer's relationship with
+        the user and the first page of their posts when the viewer may see them, with the link to the next one.
+        cached per viewer and profile until a relationship, the profile or its posts change.
+        """
+        user = resolve_username(request, self.kwargs['username'])
+        if user is None or not user.is_active or user.id in get_viewer(request).blocker_ids:
+            raise NotFound()
+
+        return Response(cached_summary(request.user.id, user.id, lambda: self.build_summary(user.id)))
+
+    def build_summary(self, user_id):
+        user = User.objects.select_related('stats').get(id=user_id)
+        summary = self.get_serializer(user).data
+        summary['posts'] = None
+
+        if get_viewer(self.request).can_view(user):
+            posts = Post.objects.filter(user_id=user.id).select_related('user', 'location').prefetch_related('media')
+            paginator = self.paginator
+            page = paginator.paginate_queryset(posts, self.request, view=self)
+
+            # the next pages are read from the user's posts list
+            paginator.base_url = self.request.build_absolute_uri(reverse('user-post-list', args=(user.username,)))
+            summary['posts'] = {
+                'next': paginator.get_next_link(),
+                'results': PostSerializer(page, many=True, context=self.get_serializer_context()).data,
+            }
+        return summary